@@ -63,6 +63,23 @@ def get_mean_df(df):
     return df.groupby(['Date']).mean().reset_index()
 
 
+def get_daily_df(adj_close_df, returns_df):
+    """
+    Gets a dataframe containing each trading day's adjusted close and returns for each stock, in the same column layout
+    as the monthly data, for running the strategy with daily rebalancing
+    :param adj_close_df: Daily adjusted close values, indexed by date
+    :param returns_df: Daily returns with a 'Date' column
+    :return:
+    """
+    daily_df = merge_dfs(adj_close_df.reset_index(), returns_df)
+    # Drops the exchange timezone and time of day, leaving one YYYY-MM-DD date per trading day
+    dates = pd.to_datetime(daily_df['Date'])
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    daily_df['Date'] = dates.dt.strftime('%Y-%m-%d')
+    return daily_df
+
+
 def group_df(df, type):
     """
     Groups a dataframe by month, and gets either the monthly average returns, or the monthly first-day adjusted close
@@ -92,6 +109,10 @@ if __name__ == "__main__":
 
     # Gets a dataframe contain each stocks daily returns
     returns_df = calc_returns(adj_close_df, columns)
+
+    # Keeps the daily resolution for daily and weekly rebalancing, before grouping converts dates in place
+    daily_df = get_daily_df(adj_close_df, returns_df.copy())
+    daily_df.to_csv("daily_stock_data.csv", index=False)
     monthly_returns_df = group_df(returns_df, "returns")
 
     # Gets a dataframe containing each month's first day adjusted close value
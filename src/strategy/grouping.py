@@ -0,0 +1,123 @@
+"""
+Ranking within groups of tickers (E.g., sectors or countries) for sector- or country-neutral momentum. Every month's
+winners and losers are the top and bottom deciles of each group, rather than of the whole universe, so the strategy
+does not simply bet on the groups that did best. All groups are ranked in one segmented sort per chunk of months,
+with no Python loop over groups or months.
+
+Groups with fewer eligible tickers in a month than `MIN_GROUP_SIZE` are skipped that month. Otherwise every tiny
+group (E.g., a country with a single listing) would get a winner and a loser, as many as a large group with a decile
+of 1, and a group of one would buy and short the same stock.
+"""
+import numpy as np
+import pandas as pd
+from typing import Collection, Dict, Tuple
+
+from sharding import selection_counts
+
+# Fewest eligible tickers a group needs in a month to have winners and losers selected from it: one full decile
+MIN_GROUP_SIZE = 10
+
+
+def group_codes(tickers: Collection[str], groups: Dict[str, str]) -> np.ndarray:
+    """
+    Turns each ticker's group label into an integer code, in order of first appearance. Tickers without a label are
+    put in a group of their own, so they are still ranked against each other
+
+    Parameters:
+        - tickers (Collection[str]): Ticker of each column of the stock data
+        - groups (Dict[str, str]): Mapping from ticker to group label (see `utils.screener.load_groups()`)
+
+    Returns:
+        - np.ndarray: Group code of each ticker, from 0 to the number of groups - 1
+    """
+    labels = pd.Series([groups.get(ticker) for ticker in tickers], dtype=object)
+    codes, uniques = pd.factorize(labels)
+    # Unlabelled tickers (-1 from factorize) share the code after every labelled group
+    return np.where(codes < 0, len(uniques), codes).astype(np.int64)
+
+
+def group_selection_counts(eligible: np.ndarray, codes: np.ndarray, min_group_size: int = MIN_GROUP_SIZE) -> \
+        Tuple[np.ndarray, np.ndarray]:
+    """
+    Counts the eligible tickers of each group in each month, and how many of them are selected as winners (and
+    losers): none for a group with fewer than min_group_size eligible tickers
+
+    Parameters:
+        - eligible (np.ndarray): (months x tickers) eligibility mask
+        - codes (np.ndarray): Group code of each ticker, as given by `group_codes()`
+        - min_group_size (int): Fewest eligible tickers a group needs to have winners and losers selected from it
+
+    Returns:
+        - np.ndarray: (months x groups + 1) eligible tickers per group. The last column, for ineligible tickers, is 0
+        - np.ndarray: (months x groups + 1) winners (and losers) per group
+
+    Raises:
+        - ValueError: If min_group_size is less than 2, which would let a group of one buy and short the same stock
+    """
+    if min_group_size < 2:
+        raise ValueError(f"Minimum group size {min_group_size} invalid. Must be at least 2")
+    groups = int(codes.max(initial=-1)) + 1
+    # Multiplying the eligibility mask by a (tickers x groups) one-hot matrix of codes sums each group's columns in
+    # one BLAS call. Counts are far below 2^53, so they are exact in float64
+    membership = np.zeros((len(codes), groups + 1), dtype=np.float64)
+    membership[np.arange(len(codes)), codes] = 1
+    sizes = (eligible.astype(np.float64) @ membership).astype(np.int64)
+    return sizes, np.where(sizes >= min_group_size, selection_counts(sizes), 0)
+
+
+def select_grouped(scores: np.ndarray, eligible: np.ndarray, codes: np.ndarray,
+                   min_group_size: int = MIN_GROUP_SIZE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Selects the winners and losers of a chunk of months within each group: the top and bottom deciles of each group's
+    eligible tickers, or its single best and worst stock when it has fewer than 10 (see
+    `sharding.selection_counts()`). Groups with fewer than min_group_size eligible tickers are skipped. With every
+    ticker in one group and a min_group_size of 2 this is the same as `SignalTable.select()` whenever 2 or more
+    tickers are eligible
+
+    Each month is sorted by (group, score, column), which lays out every group's eligible tickers as a segment in
+    ascending order of returns, with ties in column order. A ticker's rank within its group is then its position minus
+    the start of its group's segment.
+
+    Parameters:
+        - scores (np.ndarray): (months x tickers) average J-month returns
+        - eligible (np.ndarray): (months x tickers) eligibility mask
+        - codes (np.ndarray): Group code of each ticker, as given by `group_codes()`
+        - min_group_size (int): Fewest eligible tickers a group needs, see `group_selection_counts()`
+
+    Returns:
+        - np.ndarray: (months x max count) ticker indexes of winners, grouped by group and in ascending order of
+                      returns within each, -1 padded
+        - np.ndarray: (months x max count) ticker indexes of losers, in the same order, -1 padded
+        - np.ndarray: Number of winners (and losers) in each month, summed over groups
+    """
+    months, tickers = scores.shape
+    groups = int(codes.max(initial=-1)) + 1
+    # Ineligible tickers are put in an extra group after every real one, so they sort to the end of each row
+    row_groups = np.where(eligible, codes[None, :], groups)
+    # Sorts by score, then stably by group. Group codes are small integers, so the second sort is a radix sort and
+    # the pair costs little more than the single sort of ungrouped ranking
+    by_score = np.argsort(np.where(eligible, scores, np.inf), axis=1, kind='stable')
+    group_dtype = np.int16 if groups < np.iinfo(np.int16).max else np.int64
+    by_group = np.argsort(np.take_along_axis(row_groups, by_score, axis=1).astype(group_dtype), axis=1,
+                          kind='stable')
+    order = np.take_along_axis(by_score, by_group, axis=1)
+
+    sizes, group_counts = group_selection_counts(eligible, codes, min_group_size)
+    starts = np.cumsum(sizes, axis=1) - sizes
+    counts = group_counts.sum(axis=1)
+    # Losers are the first group_counts positions of each group's segment and winners the last, so the selected
+    # positions are built from the (months x groups) counts alone, in month then group order
+    selected = group_counts.ravel()
+    total = int(selected.sum())
+    rows = np.repeat(np.repeat(np.arange(months), groups + 1), selected)
+    offsets = np.arange(total) - np.repeat(np.cumsum(selected) - selected, selected)
+    columns = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    loser_positions = np.repeat(starts.ravel(), selected) + offsets
+    winner_positions = np.repeat((starts + sizes - group_counts).ravel(), selected) + offsets
+
+    width = max(int(counts.max(initial=0)), 1)
+    winners = np.full((months, width), -1, dtype=np.int64)
+    losers = np.full((months, width), -1, dtype=np.int64)
+    winners[rows, columns] = order[rows, winner_positions]
+    losers[rows, columns] = order[rows, loser_positions]
+    return winners, losers, counts
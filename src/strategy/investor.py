@@ -1,9 +1,8 @@
 from enum import Enum
 from typing import Collection, Tuple
 from copy import deepcopy
-from datetime import datetime
+import numpy as np
 import pandas as pd
-from pandas.tseries.offsets import DateOffset
 
 from utils.stock import Stock
 from utils.portfolio import Portfolio
@@ -13,6 +12,9 @@ class Investor:
     """
     Class to manage cash and positions created from Strategy. Handles creation of winner and loser portfolios, as well
     as settling of long and short portfolios (after K months). Tracks the cash to assess profitability of strategy.
+
+    Portfolios are keyed by the index of the month they were created in (see `utils.month_calendar.MonthCalendar`), so
+    the portfolios to settle are found K indexes back.
     """
 
     def __init__(self, starting_cash: float, investment_ratio: float):
@@ -27,7 +29,7 @@ class Investor:
     """ CREATING POSITION """
 
 
-    def create_position(self, winners: Collection[Stock], losers: Collection[Stock], date: datetime):
+    def create_position(self, winners: Collection[Stock], losers: Collection[Stock], month: int):
         """
         Creates long and short portfolios out of winner and loser stocks respectively. Assumes equal weight for
         each security across both portfolios. Includes updating of cash to simulate longing and shorting of stock
@@ -35,6 +37,7 @@ class Investor:
         Parameters:
             - winners (list[Stock]): List of Stock objects to create winner portfolio from
             - losers (list[Stock]): List of Stock objects to create loser portfolio from
+            - month (int): Index of the current month
         """
         # Check we have portfolios to create a position with
         if len(winners) + len(losers) > 0:
@@ -43,8 +46,8 @@ class Investor:
             # Cash to invest per stock, assuming equally weighted portfolios
             cash_per_stock = (self.__cash * self.__investment_ratio) / (len(winners) + len(losers))
             # Creates portfolios for long and short stocks
-            portfolio_l = Portfolio(date, PortfolioType.LONG)
-            portfolio_s = Portfolio(date, PortfolioType.SHORT)
+            portfolio_l = Portfolio(month, PortfolioType.LONG)
+            portfolio_s = Portfolio(month, PortfolioType.SHORT)
 
             for short_stock, long_stock in zip(losers, winners):
                 # Add stock to long portfolio
@@ -52,8 +55,8 @@ class Investor:
                 # Add stock to short portfolio
                 self.add_to_portfolio(short_stock, cash_per_stock, portfolio_s)
             # Saves portfolios for when we settle the position in K months
-            self.__portfolios_short[date] = portfolio_s
-            self.__portfolios_long[date] = portfolio_l
+            self.__portfolios_short[month] = portfolio_s
+            self.__portfolios_long[month] = portfolio_l
 
     def add_to_portfolio(self, stock: Stock, cash_per_stock: float, portfolio: Portfolio):
         """
@@ -98,9 +101,9 @@ class Investor:
         stocks_s, stocks_l = portfolio_s.get_stocks(), portfolio_l.get_stocks()
         stocks_s, stocks_l = self.correct_portfolio_length(stocks_s, stocks_l)
         for s, l in zip(stocks_s, stocks_l):
-            # Gets the price of the stocks in the current month
-            current_price_s = current_stocks[str(s)]
-            current_price_l = current_stocks[str(l)]
+            # Gets the price of the stocks in the current month, as float64 so cash is never held in float32
+            current_price_s = float(current_stocks[str(s)])
+            current_price_l = float(current_stocks[str(l)])
             prev_cash1 = deepcopy(self.__cash)
             # Buys back shorted stock
             # TODO: Implement transaction costs
@@ -123,25 +126,31 @@ class Investor:
 
 
 
-    def settle_position(self, current_date: datetime, current_stocks: pd.Series, K: int):
+    def settle_position(self, current_month: int, current_stocks: pd.Series, K: int):
         """
-        Method to settle the position from K months ago
+        Method to settle the position from K months ago. Settled portfolios are removed, so only open portfolios are
+        valued by `update_trackers()`
 
         Parameters:
-            - current_data (datetime): Current date
+            - current_month (int): Index of the current month
             - current_stocks (pd.Series): Series containing the current price of the stocks
             - K (int): Look-back period, used to retrieve portfolios from K months ago to settle them
+
+        Raises:
+            - KeyError: If no portfolios were created K months ago
         """
-        # Date from K months ago
-        K_date = current_date - DateOffset(months=K)
+        # Month index from K months ago
+        K_month = current_month - K
         try:
             # Gets long and short portfolios from K months ago
-            portfolio_longed = self.__portfolios_long[K_date]
-            portfolio_shorted = self.__portfolios_short[K_date]
-            # Settles portfolios
-            self.settle_long_and_short(portfolio_longed, portfolio_shorted, current_stocks)
+            portfolio_longed = self.__portfolios_long[K_month]
+            portfolio_shorted = self.__portfolios_short[K_month]
         except KeyError:
-            raise KeyError(f"No portfolio's found for date {K_date} with current date {current_date}")
+            raise KeyError(f"No portfolio's found for month {K_month} with current month {current_month}")
+        del self.__portfolios_long[K_month]
+        del self.__portfolios_short[K_month]
+        # Settles portfolios
+        self.settle_long_and_short(portfolio_longed, portfolio_shorted, current_stocks)
 
 
 
@@ -158,20 +167,73 @@ class Investor:
         self.__cash_tracker += [self.__cash for x in range(size_to_fill)]
 
     def update_trackers(self, current_stocks: pd.Series):
+        """
+        Records the current cash, and the net market value of the open portfolios: the value of the stock longed less
+        the value of the stock shorted and not yet bought back. Cash plus this is the equity of the Investor
+        """
         if isinstance(self.__cash, float) or isinstance(self.__cash, int):
             self.__cash_tracker.append(self.__cash)
         else:
             raise TypeError("Unexpected type in cash")
 
-        portfolios_position = 0
+        portfolios_position = 0.0
         for portfolio in self.__portfolios_long.values():
-            portfolios_position += portfolio.get_value(current_stocks)
+            portfolios_position += portfolio.get_market_value(current_stocks)
         for portfolio in self.__portfolios_short.values():
-            portfolios_position -= portfolio.get_value(current_stocks)
+            portfolios_position -= portfolio.get_market_value(current_stocks)
         self.__position_tracker.append(portfolios_position)
 
 
 
+    """ CHECKPOINTING """
+
+
+
+    def get_state(self) -> dict:
+        """
+        Gets the Investor's state as scalars and flat arrays, for saving with `utils.checkpoint.save_checkpoint()`.
+        The stocks of every portfolio are stored one after another, with offsets marking where each portfolio starts
+        """
+        state = {
+            'cash': self.__cash,
+            'investment_ratio': self.__investment_ratio,
+            'cash_tracker': np.array(self.__cash_tracker, dtype=np.float64),
+            'position_tracker': np.array(self.__position_tracker, dtype=np.float64),
+        }
+        for name, portfolios in (('long', self.__portfolios_long), ('short', self.__portfolios_short)):
+            stocks = [stock for portfolio in portfolios.values() for stock in portfolio.get_stocks()]
+            state[f'{name}_keys'] = np.array(list(portfolios.keys()), dtype=np.int64)
+            state[f'{name}_offsets'] = np.cumsum([0] + [len(p) for p in portfolios.values()], dtype=np.int64)
+            state[f'{name}_tickers'] = np.array([stock.get_ticker_code() for stock in stocks], dtype=np.str_)
+            state[f'{name}_returns'] = np.array([stock.get_J_returns() for stock in stocks], dtype=np.float64)
+            state[f'{name}_prices'] = np.array([stock.get_price() for stock in stocks], dtype=np.float64)
+            state[f'{name}_amounts'] = np.array([stock.get_amount() for stock in stocks], dtype=np.float64)
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'Investor':
+        """
+        Recreates an Investor from a state saved with `get_state()`
+        """
+        investor = cls(state['cash'], state['investment_ratio'])
+        investor.__cash_tracker = state['cash_tracker'].tolist()
+        investor.__position_tracker = state['position_tracker'].tolist()
+        for name, portfolio_type, portfolios in (('long', PortfolioType.LONG, investor.__portfolios_long),
+                                                 ('short', PortfolioType.SHORT, investor.__portfolios_short)):
+            offsets = state[f'{name}_offsets']
+            for i, key in enumerate(state[f'{name}_keys'].tolist()):
+                portfolio = Portfolio(key, portfolio_type)
+                rows = slice(offsets[i], offsets[i + 1])
+                stocks = Stock.from_arrays(state[f'{name}_tickers'][rows].tolist(), state[f'{name}_returns'][rows],
+                                           state[f'{name}_prices'][rows])
+                for stock, amount in zip(stocks, state[f'{name}_amounts'][rows].tolist()):
+                    stock.set_amount(amount)
+                    portfolio.add_stock(stock)
+                portfolios[key] = portfolio
+        return investor
+
+
+
     """ GETTERS """
 
 
@@ -0,0 +1,211 @@
+import numpy as np
+from typing import Tuple
+
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    numba = None
+    NUMBA_AVAILABLE = False
+
+
+def kernel(function):
+    """
+    Compiles a step of the simulation with numba if it is installed, so that `simulate_numba()` can call it. The step
+    is left as Python otherwise
+    """
+    if NUMBA_AVAILABLE:
+        return numba.njit(cache=True, nogil=True)(function)
+    return function
+
+
+@kernel
+def create_cohort(prices: np.ndarray, winners: np.ndarray, losers: np.ndarray, n: int, ratio: float, cash: float,
+                  long_amounts: np.ndarray, short_amounts: np.ndarray, long_total: np.ndarray,
+                  short_total: np.ndarray) -> Tuple[float, int]:
+    """
+    Creates one month's cohort: buys each of the n winners and shorts each of the n losers with an equal share of ratio
+    of the cash, with the same operations in the same order as `Investor.create_position()`. The amount bought and
+    shorted of each stock is written to long_amounts and short_amounts, and added to the open amount of its ticker
+
+    Parameters:
+        - prices (np.ndarray): Price of each ticker in the month, float64 or float32
+        - winners (np.ndarray): Ticker indexes to long
+        - losers (np.ndarray): Ticker indexes to short
+        - n (int): Number of winners (and losers) to use
+        - ratio (float): Investment ratio
+        - cash (float): Cash before the cohort is created
+        - long_amounts (np.ndarray): Amount bought of each winner, written in place
+        - short_amounts (np.ndarray): Amount shorted of each loser, written in place
+        - long_total, short_total (np.ndarray): Amount of each ticker held long and short by cohorts not yet
+                                                settled, updated in place
+
+    Returns:
+        - float: Cash after the cohort is created
+        - int: Number of winners (and losers) held, 0 if there was no cash to invest
+    """
+    if n <= 0:
+        return cash, 0
+    cash_per_stock = (cash * ratio) / (n + n)
+    if cash_per_stock <= 0:
+        return cash, 0
+    for k in range(n):
+        w = winners[k]
+        # Prices may be float32, cash is always float64
+        price = float(prices[w])
+        amount = cash_per_stock // price
+        cash_left_over = ((cash_per_stock / price) - amount) * price
+        cash = cash - (cash_per_stock - cash_left_over)
+        long_amounts[k] = amount
+        long_total[w] += amount
+
+        l = losers[k]
+        price = float(prices[l])
+        amount = cash_per_stock // price
+        cash_left_over = ((cash_per_stock / price) - amount) * price
+        cash = cash + (cash_per_stock - cash_left_over)
+        short_amounts[k] = amount
+        short_total[l] += amount
+    return cash, n
+
+
+@kernel
+def settle_cohort(prices: np.ndarray, winners: np.ndarray, losers: np.ndarray, n: int, long_amounts: np.ndarray,
+                  short_amounts: np.ndarray, long_total: np.ndarray, short_total: np.ndarray, cash: float) -> float:
+    """
+    Settles a cohort created by `create_cohort()`: buys back its losers and sells its winners at the month's prices,
+    like `Investor.settle_position()`, and takes its amounts off the open amounts of their tickers
+
+    Returns:
+        - float: Cash after the cohort is settled
+    """
+    for k in range(n):
+        cash -= float(prices[losers[k]]) * short_amounts[k]
+        cash += float(prices[winners[k]]) * long_amounts[k]
+        # Amounts are whole numbers of stock, so the open amounts return exactly to what they were
+        short_total[losers[k]] -= short_amounts[k]
+        long_total[winners[k]] -= long_amounts[k]
+    return cash
+
+
+@kernel
+def value_positions(prices: np.ndarray, long_total: np.ndarray, short_total: np.ndarray) -> float:
+    """
+    Gets the net market value of the open cohorts at the month's prices, from the open amounts kept by
+    `create_cohort()` and `settle_cohort()`, in O(tickers): the value of the stock held long less the value of the
+    stock shorted and not yet bought back. Cash plus this is the run's equity. NaN if a ticker held has no price
+    """
+    value = 0.0
+    for j in range(len(prices)):
+        if long_total[j] != 0:
+            value += float(prices[j]) * long_total[j]
+        if short_total[j] != 0:
+            value -= float(prices[j]) * short_total[j]
+    return value
+
+
+def simulate_python(prices: np.ndarray, winners: np.ndarray, losers: np.ndarray, counts: np.ndarray,
+                    settle_from: np.ndarray, ratio: float, cash: float) -> Tuple[float, np.ndarray, np.ndarray, int]:
+    """
+    Runs the month by month cash simulation of `Investor` over precomputed selections. Each month, a cohort is
+    created from that month's winners and losers, then the cohort from settle_from[t] is settled, then the trackers
+    are updated. Stops once cash drops below 0, like `StrategyController.run()`. The steps of a month are shared with
+    `live.LiveStrategy`, which runs them one month at a time.
+
+    Cash is updated with the same operations in the same order as `Investor` and `Stock.calculate_amount()`, so the
+    cash tally is bit-identical to the object implementation. The position tally is the net market value of the
+    cohorts not yet settled (see `value_positions()`), summed per ticker rather than per portfolio, so it can differ
+    from the object implementation in the last digits.
+
+    Parameters:
+        - prices (np.ndarray): (months x tickers) float64 or float32 prices
+        - winners (np.ndarray): (months x max decile size) ticker indexes to long, -1 padded
+        - losers (np.ndarray): (months x max decile size) ticker indexes to short, -1 padded
+        - counts (np.ndarray): Number of winners (and losers) to use each month, 0 for no position
+        - settle_from (np.ndarray): Month whose position is settled in each month, or -1 for none
+        - ratio (float): Investment ratio
+        - cash (float): Starting cash
+
+    Returns:
+        - float: Final cash
+        - np.ndarray: Cash at each month
+        - np.ndarray: Net market value of open positions at each month, NaN after going bankrupt
+        - int: Month the run went bankrupt, or -1
+    """
+    months, tickers = prices.shape
+    width = winners.shape[1]
+    cash_tally = np.empty(months, dtype=np.float64)
+    position_tally = np.full(months, np.nan, dtype=np.float64)
+    # Amount of each stock bought and shorted by the cohort created in each month
+    long_amounts = np.zeros((months, width), dtype=np.float64)
+    short_amounts = np.zeros((months, width), dtype=np.float64)
+    held = np.zeros(months, dtype=np.int64)
+    # Amount of each ticker held long and short by cohorts not yet settled, used to value them in O(tickers)
+    long_total = np.zeros(tickers, dtype=np.float64)
+    short_total = np.zeros(tickers, dtype=np.float64)
+    bankrupt_month = -1
+
+    for t in range(months):
+        cash, held[t] = create_cohort(prices[t], winners[t], losers[t], counts[t], ratio, cash, long_amounts[t],
+                                      short_amounts[t], long_total, short_total)
+
+        # Settles the cohort from K months ago
+        c = settle_from[t]
+        if c >= 0:
+            cash = settle_cohort(prices[t], winners[c], losers[c], held[c], long_amounts[c], short_amounts[c],
+                                 long_total, short_total, cash)
+
+        # Updates trackers
+        cash_tally[t] = cash
+        position_tally[t] = value_positions(prices[t], long_total, short_total)
+
+        if cash < 0:
+            bankrupt_month = t
+            cash_tally[t + 1:] = cash
+            break
+    return cash, cash_tally, position_tally, bankrupt_month
+
+
+if NUMBA_AVAILABLE:
+    simulate_numba = numba.njit(cache=True, nogil=True)(simulate_python)
+else:
+    simulate_numba = None
+
+
+def simulate(prices: np.ndarray, winners: np.ndarray, losers: np.ndarray, counts: np.ndarray,
+             settle_from: np.ndarray, ratio: float, cash: float, use_numba: bool = True) -> \
+        Tuple[float, np.ndarray, np.ndarray, int]:
+    """
+    Runs `simulate_python()`, compiled with numba if it is installed and use_numba is set
+    """
+    kernel = simulate_numba if use_numba and NUMBA_AVAILABLE else simulate_python
+    # float32 prices are passed as they are rather than copied into float64
+    if prices.dtype != np.float32:
+        prices = prices.astype(np.float64, copy=False)
+    return kernel(np.ascontiguousarray(prices), winners.astype(np.int64), losers.astype(np.int64),
+                  counts.astype(np.int64), settle_from.astype(np.int64), float(ratio), float(cash))
+
+
+def monthly_settle_from(months: int, J: int, K: int) -> np.ndarray:
+    """
+    Gets the month settled in each month by `StrategyController`: the position from K months ago, once t > J + K
+    """
+    t = np.arange(months)
+    return np.where(t > J + K, t - K, -1)
+
+
+def rebalance_settle_from(rebalance: np.ndarray, J: int, K: int) -> np.ndarray:
+    """
+    Gets the row settled in each row when positions are only created on rebalance rows: the position from K rows ago
+    if that row was a rebalance row, once t > J + K. With every row a rebalance row this is `monthly_settle_from()`
+
+    Parameters:
+        - rebalance (np.ndarray): Boolean mask of rebalance rows, see `utils.trading_calendar.rebalance_mask()`
+        - J (int): Look-back period in rows
+        - K (int): Holding period in rows
+    """
+    t = np.arange(len(rebalance))
+    source = t - K
+    settles = (t > J + K) & (source >= 0)
+    settles[settles] = rebalance[source[settles]]
+    return np.where(settles, source, -1)
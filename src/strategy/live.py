@@ -0,0 +1,380 @@
+"""
+Incremental (live) mode of the J-month/K-month strategy, for paper trading. Rather than replaying the whole history
+every month, the state of a run is kept between months and each new monthly bar is appended to it in time and memory
+proportional to the number of tickers, not the length of the history.
+
+    python live.py --state live.npz --J 6 --K 6 --ratio 0.1 --data ../data/stock_data.csv   # replays history once
+    python live.py --state live.npz --bar new_month.csv                                        # appends a month
+"""
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Collection, Dict, Tuple
+
+from signals import SignalTable
+from sharding import selection_counts
+from grouping import group_codes, select_grouped
+from kernels import create_cohort, settle_cohort, value_positions
+from utils import checkpoint
+from utils.exceptions import MissingMonthsError
+from utils.panel import Panel
+from utils.run_result import RunResult
+
+
+class LiveStrategy:
+    """
+    Stateful J-month/K-month strategy that is given one month of prices and returns at a time. Appending a month:
+        1. Ranks every ticker on its average return over the J months before it, from a rolling sum of those months
+           that adds the newest month and subtracts the one leaving the window (with a rolling count of missing
+           returns for eligibility), and selects its winners and losers like `SignalTable.calculate_selections()`
+        2. Creates a position from them, and settles the position created K months ago
+        3. Updates the cash and position tallies
+
+    Positions are created, settled and valued with the steps of the 'array' engine (see `kernels.py`), so replaying a
+    history gives the same selections, cash tally and position tally as `StrategyController.run()`. The rolling sums
+    are rebuilt from the window every J months so rounding from adding and subtracting cannot build up. Ranking a
+    month sorts its tickers, which costs O(tickers log tickers).
+
+    Parameters:
+        - tickers (Collection[str]): Ticker of each column of the prices and returns appended
+        - J (int): J months (look-back period)
+        - K (int): K months (holding period)
+        - ratio (float): Investment ratio
+        - cash (float): Starting cash
+        - groups (Dict[str, str] | None): Group (E.g., sector or country) of each ticker, to take deciles within each
+                                          group (see `grouping.py`)
+    """
+
+    def __init__(self, tickers: Collection[str], J: int, K: int, ratio: float, cash: float,
+                 groups: Dict[str, str] | None = None):
+        if J < 1 or K < 1:
+            raise ValueError("J and K must be at least 1")
+        self.__tickers = list(tickers)
+        self.__J = J
+        self.__K = K
+        self.__ratio = ratio
+        self.__starting_cash = cash
+        self.__cash = float(cash)
+        self.__groups = group_codes(self.__tickers, groups) if groups is not None else None
+        tickers = len(self.__tickers)
+        # Returns of the last J months, in a ring indexed by month % J, with their sum and count of missing values
+        self.__window = np.zeros((J, tickers), dtype=np.float64)
+        self.__window_sum = np.zeros(tickers, dtype=np.float64)
+        self.__window_missing = np.zeros(tickers, dtype=np.int64)
+        # Number of months appended, and the month (as a period ordinal) of the last one
+        self.__month = 0
+        self.__last_period = None
+        # Positions not yet settled, by month created: winners, losers and the amounts bought and shorted of each
+        self.__positions = {}
+        # Amount of each ticker held long and short by positions not yet settled, used to value them in O(tickers).
+        # Kept apart from the positions above, as the position created in month J is never settled
+        self.__long_total = np.zeros(tickers, dtype=np.float64)
+        self.__short_total = np.zeros(tickers, dtype=np.float64)
+        self.__dates = []
+        self.__cash_tally = []
+        self.__position_tally = []
+        self.__bankrupt = False
+
+    @classmethod
+    def from_history(cls, df: pd.DataFrame | Panel, J: int, K: int, ratio: float, cash: float,
+                     groups: Dict[str, str] | None = None) -> 'LiveStrategy':
+        """
+        Creates a live run and appends every month of the stock data to it, E.g., to start paper trading where a
+        backtest ends
+
+        Raises:
+            - MissingMonthsError: If the stock data skips a month
+        """
+        if isinstance(df, Panel):
+            tickers, dates, prices, returns = df.get_tickers(), df.get_dates(), df.get_prices(), df.get_returns()
+        else:
+            tickers = [col[:-7] for col in df.columns if col != 'Date' and col.endswith('Returns')]
+            dates = pd.DatetimeIndex(df['Date'])
+            prices = df[tickers].to_numpy(dtype=np.float64)
+            returns = df[[f"{ticker}Returns" for ticker in tickers]].to_numpy(dtype=np.float64)
+        live = cls(tickers, J, K, ratio, cash, groups)
+        for month, date in enumerate(dates):
+            live.append(date, prices[month], returns[month])
+        return live
+
+
+    """ APPENDING MONTHS """
+
+
+    def append(self, date: pd.Timestamp, prices: np.ndarray, returns: np.ndarray) -> Tuple[list, list]:
+        """
+        Appends the next month and trades it
+
+        Parameters:
+            - date (pd.Timestamp): Date of the month, which must be the month after the last one appended
+            - prices (np.ndarray): Current price of each ticker, in the order of `get_tickers()`
+            - returns (np.ndarray): Return of each ticker over the month, in the same order
+
+        Returns:
+            - list: Tickers of the month's winners, in ascending order of returns (empty if no position is created)
+            - list: Tickers of the month's losers, in ascending order of returns
+
+        Raises:
+            - MissingMonthsError: If date skips a month
+            - ValueError: If date is not after the last month, or prices or returns do not have one value per ticker
+        """
+        period = pd.Timestamp(date).to_period('M').ordinal
+        if self.__last_period is not None:
+            if period <= self.__last_period:
+                raise ValueError(f"Month {date} is not after the last month appended")
+            if period != self.__last_period + 1:
+                raise MissingMonthsError(f"{period - self.__last_period - 1} month(s) missing before {date}")
+        prices = np.asarray(prices, dtype=np.float64)
+        returns = np.asarray(returns, dtype=np.float64)
+        if prices.shape != (len(self.__tickers),) or returns.shape != (len(self.__tickers),):
+            raise ValueError(f"Expected {len(self.__tickers)} prices and returns, one per ticker")
+
+        t = self.__month
+        winners, losers = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        if not self.__bankrupt:
+            if t >= self.__J:
+                winners, losers = self.select(prices)
+                self.create_position(t, prices, winners, losers)
+            if t > self.__J + self.__K:
+                self.settle_position(t - self.__K, prices)
+            # Positions from before t - K are settled (or never will be), so are dropped
+            self.__positions.pop(t - self.__K, None)
+            self.update_trackers(prices)
+        else:
+            self.__cash_tally.append(self.__cash)
+            self.__position_tally.append(np.nan)
+        self.roll_window(t, returns)
+        self.__dates.append(pd.Timestamp(date))
+        self.__month = t + 1
+        self.__last_period = period
+        return [self.__tickers[i] for i in winners], [self.__tickers[i] for i in losers]
+
+    def append_row(self, row: pd.Series) -> Tuple[list, list]:
+        """
+        Appends a month given as a row of stock data ('Date', a price column per ticker and a '<ticker>Returns'
+        column). Tickers missing from the row have no price or return that month
+        """
+        prices = row.reindex(self.__tickers).to_numpy(dtype=np.float64)
+        returns = row.reindex([f"{ticker}Returns" for ticker in self.__tickers]).to_numpy(dtype=np.float64)
+        return self.append(row['Date'], prices, returns)
+
+    def roll_window(self, t: int, returns: np.ndarray):
+        """
+        Adds month t's returns to the rolling window, in place of the returns of month t - J
+        """
+        slot = t % self.__J
+        leaving = self.__window[slot]
+        if t >= self.__J:
+            self.__window_sum -= np.where(np.isnan(leaving), 0, leaving)
+            self.__window_missing -= np.isnan(leaving)
+        self.__window[slot] = returns
+        self.__window_missing += np.isnan(returns)
+        if slot == self.__J - 1:
+            # Rebuilt once per J months, so costs O(tickers) per month on average
+            self.__window_sum = np.where(np.isnan(self.__window), 0, self.__window).sum(axis=0)
+        else:
+            self.__window_sum += np.where(np.isnan(returns), 0, returns)
+
+    def select(self, prices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Selects the current month's winners and losers from the J months in the window and the current prices. A
+        ticker is eligible if none of its J returns are missing and its price is present and above 0
+
+        Returns:
+            - np.ndarray: Ticker indexes of winners, in ascending order of returns
+            - np.ndarray: Ticker indexes of losers, in ascending order of returns
+        """
+        with np.errstate(invalid='ignore'):
+            eligible = (self.__window_missing == 0) & (prices > 0)
+        scores = (self.__window_sum / self.__J)[None, :]
+        eligible = eligible[None, :]
+        if self.__groups is not None:
+            winners, losers, counts = select_grouped(scores, eligible, self.__groups)
+        else:
+            counts = selection_counts(eligible.sum(axis=1))
+            winners, losers = SignalTable.select(scores, eligible, counts)
+        return winners[0, :counts[0]], losers[0, :counts[0]]
+
+    def create_position(self, t: int, prices: np.ndarray, winners: np.ndarray, losers: np.ndarray):
+        """
+        Buys the winners and shorts the losers with ratio of the cash, split evenly, with `kernels.create_cohort()`
+        """
+        n = len(winners)
+        long_amounts = np.zeros(n, dtype=np.float64)
+        short_amounts = np.zeros(n, dtype=np.float64)
+        self.__cash, held = create_cohort(prices, winners, losers, n, self.__ratio, self.__cash, long_amounts,
+                                          short_amounts, self.__long_total, self.__short_total)
+        if held:
+            self.__positions[t] = (winners, losers, long_amounts, short_amounts)
+
+    def settle_position(self, month: int, prices: np.ndarray):
+        """
+        Buys back the losers and sells the winners of the position created in month, if there is one, with
+        `kernels.settle_cohort()`
+        """
+        if month not in self.__positions:
+            return
+        winners, losers, long_amounts, short_amounts = self.__positions[month]
+        self.__cash = settle_cohort(prices, winners, losers, len(winners), long_amounts, short_amounts,
+                                    self.__long_total, self.__short_total, self.__cash)
+
+    def update_trackers(self, prices: np.ndarray):
+        """
+        Records the month's cash and the net market value of its open positions, and stops the run once cash drops
+        below 0
+        """
+        self.__cash_tally.append(self.__cash)
+        self.__position_tally.append(value_positions(prices, self.__long_total, self.__short_total))
+        if self.__cash < 0:
+            print("#####   BANKRUPT   #####")
+            self.__bankrupt = True
+
+
+    """ SAVING STATE """
+
+
+    def save(self, filepath: str):
+        """
+        Saves the state of the run to a compressed binary checkpoint, so it can be carried on next month with `load()`
+        """
+        months = np.array(sorted(self.__positions), dtype=np.int64)
+        width = max([len(self.__positions[month][0]) for month in months] + [1])
+        position_arrays = {name: np.full((len(months), width), fill, dtype=dtype)
+                           for name, fill, dtype in (('winners', -1, np.int64), ('losers', -1, np.int64),
+                                                     ('long_amounts', 0, np.float64),
+                                                     ('short_amounts', 0, np.float64))}
+        for row, month in enumerate(months):
+            for name, values in zip(position_arrays, self.__positions[month]):
+                position_arrays[name][row, :len(values)] = values
+        state = {f'position_{name}': values for name, values in position_arrays.items()}
+        state.update({'J': self.__J, 'K': self.__K, 'ratio': self.__ratio, 'starting_cash': self.__starting_cash,
+                      'cash': self.__cash, 'tickers': np.array(self.__tickers, dtype=str), 'month': self.__month,
+                      'last_period': -1 if self.__last_period is None else self.__last_period,
+                      'window': self.__window, 'window_sum': self.__window_sum,
+                      'window_missing': self.__window_missing, 'position_months': months,
+                      'position_counts': np.array([len(self.__positions[month][0]) for month in months],
+                                                  dtype=np.int64),
+                      'long_total': self.__long_total, 'short_total': self.__short_total,
+                      'dates': np.array(self.__dates, dtype='datetime64[ns]'),
+                      'cash_tally': np.array(self.__cash_tally, dtype=np.float64),
+                      'position_tally': np.array(self.__position_tally, dtype=np.float64),
+                      'bankrupt': self.__bankrupt})
+        if self.__groups is not None:
+            state['groups'] = self.__groups
+        checkpoint.save_checkpoint(filepath, state)
+
+    @classmethod
+    def load(cls, filepath: str) -> 'LiveStrategy':
+        """
+        Restores a run saved with `save()`
+
+        Raises:
+            - ValueError: If the run was saved before open positions were tracked apart from settled ones, so its
+                          position value cannot be carried on
+        """
+        state = checkpoint.load_checkpoint(filepath)
+        if 'short_cost' in state:
+            raise ValueError(f"Live run {filepath} was saved by an older version that valued settled positions too. "
+                             f"Replay it from the history with --data to start a new state file")
+        live = cls(state['tickers'].tolist(), int(state['J']), int(state['K']), float(state['ratio']),
+                   float(state['starting_cash']))
+        live.__groups = state.get('groups')
+        live.__cash = float(state['cash'])
+        live.__month = int(state['month'])
+        live.__last_period = None if int(state['last_period']) < 0 else int(state['last_period'])
+        live.__window = state['window']
+        live.__window_sum = state['window_sum']
+        live.__window_missing = state['window_missing']
+        for row, (month, count) in enumerate(zip(state['position_months'].tolist(),
+                                                 state['position_counts'].tolist())):
+            live.__positions[month] = tuple(state[f'position_{name}'][row, :count] for name in
+                                            ('winners', 'losers', 'long_amounts', 'short_amounts'))
+        live.__long_total = state['long_total']
+        live.__short_total = state['short_total']
+        live.__dates = list(pd.DatetimeIndex(state['dates']))
+        live.__cash_tally = state['cash_tally'].tolist()
+        live.__position_tally = state['position_tally'].tolist()
+        live.__bankrupt = bool(state['bankrupt'])
+        return live
+
+
+    """ GETTERS """
+
+
+    def get_result(self) -> RunResult:
+        """
+        Gets a record of the run so far, like `StrategyController.get_result()`
+        """
+        return RunResult(self.__J, self.__K, self.__ratio, self.__starting_cash, self.__cash, self.__bankrupt,
+                         np.array(self.__cash_tally, dtype=np.float64),
+                         np.array(self.__position_tally, dtype=np.float64))
+
+    def get_tickers(self) -> list:
+        return self.__tickers
+
+    def get_J(self) -> int:
+        return self.__J
+
+    def get_K(self) -> int:
+        return self.__K
+
+    def get_ratio(self) -> float:
+        return self.__ratio
+
+    def get_month(self) -> int:
+        return self.__month
+
+    def get_dates(self) -> list:
+        return self.__dates
+
+    def get_cash(self) -> float:
+        return self.__cash
+
+    def get_bankrupt(self) -> bool:
+        return self.__bankrupt
+
+    def get_cash_tally(self) -> list:
+        return self.__cash_tally
+
+    def get_position_tally(self) -> list:
+        return self.__position_tally
+
+
+def parse_args(args: Collection[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Paper trades the J-month/K-month strategy one month at a time")
+    parser.add_argument("--state", required=True, help="Checkpoint file holding the state of the live run")
+    parser.add_argument("--data", default="../data/stock_data.csv",
+                        help="Monthly stock data CSV to replay when the state file does not exist yet")
+    parser.add_argument("--bar", default=None, help="CSV of new months, in the format of --data, to append")
+    parser.add_argument("--currency", default="../data/code_to_currency.json",
+                        help="JSON mapping ticker codes to currencies")
+    parser.add_argument("--fx", default="../data/fx_rates.csv", help="FX rate CSV for converting prices to USD")
+    parser.add_argument("--J", type=int, default=6, help="J months, when starting a live run")
+    parser.add_argument("--K", type=int, default=6, help="K months, when starting a live run")
+    parser.add_argument("--ratio", type=float, default=0.1, help="Investment ratio, when starting a live run")
+    parser.add_argument("--cash", type=float, default=1000, help="Starting cash, when starting a live run")
+    return parser.parse_args(args)
+
+
+def main(args: Collection[str] | None = None):
+    # Imported here so that importing this module does not import main.py
+    from main import Main
+    args = parse_args(args)
+    if os.path.exists(args.state):
+        live = LiveStrategy.load(args.state)
+    else:
+        data = Main(args.data, args.currency, args.fx).get_data()
+        live = LiveStrategy.from_history(data, args.J, args.K, args.ratio, args.cash)
+    if args.bar is not None:
+        # Converted to USD like the history, with the same currency and FX files
+        bars = Main(args.bar, args.currency, args.fx).get_data()
+        for _, row in bars.iterrows():
+            winners, losers = live.append_row(row)
+            print(f"{row['Date']:%Y-%m}: long {winners}, short {losers}")
+    live.save(args.state)
+    print(f"Month {live.get_month()}, cash: {live.get_cash()}, bankrupt: {live.get_bankrupt()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,98 @@
 import pandas as pd
 import numpy as np
 import json
-import matplotlib.pyplot as plt
+import hashlib
+import os
+import sys
+import time
+import argparse
 import logging
-from concurrent.futures import ProcessPoolExecutor
-from typing import Collection
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Collection, Dict
 
+import plotting
 from strategy_controller import StrategyController
+from kernels import NUMBA_AVAILABLE
+from grouping import MIN_GROUP_SIZE
 from utils.grid import Grid
-from utils.exceptions import InvalidTallyType
+from utils.exceptions import InvalidTallyType, GridMismatchError
+from utils.run_result import RunResult
+from utils.results_store import ResultsStore
+from utils.progress import ProgressReporter
+from utils.work_queue import WorkQueue
+from utils.month_calendar import MonthCalendar
+from utils.trading_calendar import TradingCalendar, REBALANCE_FREQUENCIES, make_calendar
+from utils.panel import Panel
+from utils.screener import GROUP_COLUMNS, find_screener, load_groups
+from utils.universe import add_universe_args, filter_columns, universe_args, universe_from_args
+from utils.memory_profile import MemoryProfile, ConcurrencyLimiter, memory_table
+from utils.executors import EXECUTOR_BACKENDS, make_executor, choose_backend, choose_chunk_size, chunked
+from utils.telemetry import Telemetry, timed_task, task_table, utilization_report, save_chrome_trace
+from utils.performance import MONTHS_PER_YEAR, TRADING_DAYS_PER_YEAR, performance_table
+from utils.precision import DTYPES, cast_stock_data
+from utils.currency import BASE_CURRENCY, load_fx_rates, convert_prices_to_usd
+
+
+# Default parameter grid, as range specs for `Grid.from_specs()`
+DEFAULT_GRID = {"J": "1:13", "K": "1:13", "ratio": "0:0.2:0.01"}
+
+
+def run(strategy_obj: StrategyController, df: pd.DataFrame | Panel, checkpoint_filepath: str | None = None,
+        checkpoint_every: int = 12, profile_months: Collection[int] | None = None) -> RunResult:
+    """
+    Method to run strategy, needed for multiprocessing. Only a compact RunResult is sent back to the parent process,
+    rather than the controller with every portfolio and stock it created
+
+        Parameters:
+            strategy_obj: strategy object to run
+            df: DataFrame containing stock data, or an on-disk Panel (pickled as just its directory)
+            checkpoint_filepath: Where to checkpoint the run, so it can be resumed after a crash
+            checkpoint_every: Months between checkpoints
+            profile_months: Months to take memory snapshots at, or None not to profile memory. With no months, only
+                            the task's peak RSS is measured (see `utils.memory_profile`)
+    :return: Result of the run
+    """
+    profile = MemoryProfile(profile_months) if profile_months is not None else None
+    if profile is not None:
+        profile.start()
+    try:
+        strategy_obj.run(df, checkpoint_filepath, checkpoint_every, profile=profile)
+    finally:
+        if profile is not None:
+            profile.stop()
+    result = strategy_obj.get_result()
+    result.set_memory_profile(profile)
+    return result
+
+
+# Stock data of a process pool worker, sent once by `set_task_data()` rather than pickled with every task
+_TASK_DATA = None
+
+
+def set_task_data(df: pd.DataFrame | Panel):
+    """
+    Initialises a process pool worker with the stock data its tasks run on
+    """
+    global _TASK_DATA
+    _TASK_DATA = df
 
 
-def run(strategy_obj: StrategyController, df: pd.DataFrame, code_to_currency=None):
+def run_batch(tasks: Collection[tuple], df: pd.DataFrame | Panel | None = None, checkpoint_every: int = 12,
+              profile_months: Collection[int] | None = None) -> list[RunResult]:
     """
-    Method to run strategy, needed for multiprocessing
+    Runs a batch of runs one after another as a single task, so pickling and scheduling is paid once per batch
 
         Parameters:
-            strategy_obj: strategy object to run
-            df: DataFrame containing stock data
-    :param code_to_currency: Dictionary mapping from ticker code to currency (not necessary)
-    :return:
+            tasks: (strategy object, checkpoint filepath) of each run
+            df: Stock data to run on, or None for the data the worker was initialised with by `set_task_data()`
+            checkpoint_every: Months between checkpoints
+            profile_months: Months to take memory snapshots at, or None not to profile memory
+    :return: Result of each run, in order
     """
-    strategy_obj.run(df, code_to_currency)
-    return strategy_obj
+    df = df if df is not None else _TASK_DATA
+    return [run(strategy_obj, df, checkpoint_filepath, checkpoint_every, profile_months)
+            for strategy_obj, checkpoint_filepath in tasks]
 
 
 class Main:
@@ -30,11 +100,26 @@ class Main:
     Main class that handles running grid search on parameters and threading the backtest
 
     Parameters:
-        - data_filepath:
-        - currency_filepath:
+        - data_filepath: Path to the monthly stock data CSV
+        - currency_filepath: Path to the JSON mapping each ticker code to its currency
+        - fx_filepath: Path to the FX rate CSV used to convert non-USD prices to USD
+        - panel_dir: Directory of an on-disk Panel to run on instead of loading the CSV into memory. The CSV is
+                     streamed into it (converting prices to USD) if the directory does not hold a panel yet. An
+                     existing panel must have been built from the data, currency and FX files as they are now, in
+                     dtype and with the tickers universe (see `Panel.validate()`)
+        - dtype: Precision prices and returns are stored and ranked in, 'float64' or 'float32' (see
+                 `utils.precision`). Cash is accounted in float64 either way
+        - tickers: Universe of tickers to load (see `utils.universe`), or None for every ticker. Columns of other
+                   tickers are never read, so no run or ranking touches them. An existing panel must have been built
+                   with the same universe
     """
-    def __init__(self, data_filepath="../data/stock_data.csv", currency_filepath="../data/code_to_currency.json"):
+    def __init__(self, data_filepath="../data/stock_data.csv", currency_filepath="../data/code_to_currency.json",
+                 fx_filepath="../data/fx_rates.csv", panel_dir: str | None = None, dtype: str = 'float64',
+                 tickers: Collection[str] | None = None):
 
+        # Data a grid search is run on, recorded in its manifest so it is not resumed on other data
+        self.__data_settings = {"data": os.path.abspath(data_filepath), "dtype": dtype,
+                                "tickers": sorted(tickers) if tickers is not None else None}
         try:
             with open(currency_filepath, "r") as f:
                 self.__code_to_currency = json.load(f)
@@ -42,161 +127,675 @@ class Main:
             logging.warning("No stock ticker currency file found, proceeding without")
             self.__code_to_currency = {}
         try:
-            self.__df = pd.read_csv(data_filepath)
-            self.__df['Date'] = pd.to_datetime(self.__df['Date'], format="%Y-%m-%d")
-            self.__dates = self.__df['Date']
+            if panel_dir is not None:
+                sources = self.__panel_sources(currency_filepath, fx_filepath)
+                if not Panel.exists(panel_dir):
+                    Panel.from_csv(data_filepath, panel_dir, self.__code_to_currency, self.__load_fx_rates(fx_filepath),
+                                   dtype=dtype, tickers=tickers, sources=sources)
+                self.__data = Panel(panel_dir)
+                # An existing panel is only reused if it was built from the files as they are now
+                self.__data.validate(data_filepath, sources, dtype, tickers)
+                self.__dates = pd.Series(self.__data.get_dates(), name='Date')
+            else:
+                usecols = None
+                if tickers is not None:
+                    usecols = filter_columns(pd.read_csv(data_filepath, nrows=0).columns, tickers)
+                self.__data = pd.read_csv(data_filepath, usecols=usecols)
+                self.__data['Date'] = pd.to_datetime(self.__data['Date'], format="%Y-%m-%d")
+                self.__dates = self.__data['Date']
         except FileNotFoundError:
             raise FileNotFoundError("No historical data file found")
+        # Maps months to indexes and checks for gaps once, before any run is started
+        self.__calendar = make_calendar(self.__dates)
+        if panel_dir is None:
+            fx_rates = self.__load_fx_rates(fx_filepath)
+            if fx_rates is not None:
+                # Converts all non-USD prices to USD once at load time, so the strategy never has to check currencies
+                self.__data = convert_prices_to_usd(self.__data, self.__code_to_currency, fx_rates)
+            # Cast after converting, so rates are applied in float64
+            self.__data = cast_stock_data(self.__data, dtype)
+        # Background process figures are rendered in, created when first needed
+        self.__render_executor = None
+        self.__renders = []
+
+    def __panel_sources(self, currency_filepath: str, fx_filepath: str) -> Dict[str, str]:
+        """
+        Gets the files besides the stock data CSV that a panel's prices are built from: the currency file, and the FX
+        rate file if any stock needs converting
+        """
+        sources = {'currency': currency_filepath}
+        if any(currency != BASE_CURRENCY for currency in self.__code_to_currency.values()):
+            sources['fx'] = fx_filepath
+        return sources
+
+    def __load_fx_rates(self, fx_filepath: str) -> pd.DataFrame | None:
+        """
+        Loads the FX rates needed to convert non-USD prices to USD
+
+        Parameters:
+            - fx_filepath (str): Path to the FX rate CSV
 
-    def plot_cash_graphs(self, strategy_controllers: Collection[StrategyController]):
+        Returns:
+            - pd.DataFrame | None: FX rates, or None if every stock is in USD or there is no FX rate file
+        """
+        if all(currency == BASE_CURRENCY for currency in self.__code_to_currency.values()):
+            return None
+        try:
+            return load_fx_rates(fx_filepath)
+        except FileNotFoundError:
+            logging.warning("Non-USD stocks found but no FX rate file found, proceeding without converting prices")
+            return None
+
+    def plot_cash_graphs(self, results: Collection[RunResult], output_dir: str | None = None,
+                         mode: str = 'auto', fmt: str = 'png'):
         """
         Plots the cash tallies on matplotlib graphs.
         Shows how the cash level changes using strategy over historical data.
-        :param strategy_controllers: List of all strategy controllers from all runs
+        :param results: Results of all runs
+        :param output_dir: Directory to save the figure to. If not given, the figure is shown instead
+        :param mode: Per-run plot mode, 'auto' or one of `plotting.PLOT_MODES`
+        :param fmt: File format when saving, 'png' or 'svg'
         """
+        self.plot_tally_graphs(results, 'cash', output_dir, mode, fmt)
 
-        # Split into two graphs
-        fig, axes = plt.subplots(nrows=1, ncols=2)
-        cash_tallies = self.plot_per_run_graph(strategy_controllers, axes[0], 'cash')
-        self.plot_average_graph(cash_tallies, axes[1], 'cash')
-        plt.show()
-
-    def plot_position_graphs(self, strategy_controllers: Collection[StrategyController]):
+    def plot_position_graphs(self, results: Collection[RunResult],
+                             output_dir: str | None = None, mode: str = 'auto', fmt: str = 'png'):
         """
         Plots the position tallies on matplotlib graphs.
-        Shows how the position value changes using strategy over historical data.
-        :param strategy_controllers: List of all strategy controllers from all runs
+        Shows how the net market value of the open positions changes using strategy over historical data.
+        :param results: Results of all runs
+        :param output_dir: Directory to save the figure to. If not given, the figure is shown instead
+        :param mode: Per-run plot mode, 'auto' or one of `plotting.PLOT_MODES`
+        :param fmt: File format when saving, 'png' or 'svg'
+        """
+        self.plot_tally_graphs(results, 'position', output_dir, mode, fmt)
+
+    def plot_tally_graphs(self, results: Collection[RunResult], tally_type: str,
+                          output_dir: str | None = None, mode: str = 'auto', fmt: str = 'png'):
+        """
+        Plots each run's tally and the average tally side by side. When saving to output_dir, rendering is handed to
+        a background process and this returns straight away; use `wait_for_renders()` to wait for the files.
+
+        Parameters:
+            - results (Collection[RunResult]): Results of all runs
+            - tally_type (str): Either 'cash' or 'position'
+            - output_dir (str | None): Directory to save '<tally_type>.<fmt>' to, or None to show the figure
+            - mode (str): Per-run plot mode, 'auto' or one of `plotting.PLOT_MODES`
+            - fmt (str): File format when saving, 'png' or 'svg'
+        """
+        stacked = self.get_tallies(results, tally_type)
+        labels = [f"J: {s.get_J()}, K: {s.get_K()}, ratio: {s.get_ratio()}" for s in results]
+
+        if output_dir is None:
+            import matplotlib.pyplot as plt
+            fig, axes = plt.subplots(nrows=1, ncols=2)
+            plotting.plot_runs(axes[0], self.__dates, stacked, labels, tally_type, mode)
+            plotting.plot_average(axes[1], self.__dates, stacked, tally_type)
+            plt.show()
+        else:
+            if self.__render_executor is None:
+                self.__render_executor = ProcessPoolExecutor(max_workers=1)
+            filepath = os.path.join(output_dir, f"{tally_type}.{fmt}")
+            self.__renders.append(self.__render_executor.submit(
+                plotting.render_tally_graphs, filepath, self.__dates, stacked, labels, tally_type, mode))
+
+    def wait_for_renders(self) -> Collection[str]:
         """
-        # Split into two graphs
-        fig, axes = plt.subplots(nrows=1, ncols=2)
-        position_tallies = self.plot_per_run_graph(strategy_controllers, axes[0], 'position')
-        self.plot_average_graph(position_tallies, axes[1], 'position')
-        plt.show()
+        Waits for figures being rendered in the background to be saved
 
-    def plot_per_run_graph(self, strategy_controllers: Collection[StrategyController], axes: plt.axes,
-                           tally_type: str) -> Collection[Collection[float]]:
+        Returns:
+            - Collection[str]: Paths of the saved figures
+        """
+        filepaths = [future.result() for future in self.__renders]
+        self.__renders = []
+        if self.__render_executor is not None:
+            self.__render_executor.shutdown()
+            self.__render_executor = None
+        return filepaths
+
+    def get_tallies(self, results: Collection[RunResult], tally_type: str) -> np.ndarray:
         """
-        Plots lines for each run's cash or position value tally by time on the same graph
+        Stacks every run's cash or position tally into one (runs x months) array
 
         Parameters:
-            - strategy_controllers (Collection[StrategyController]): strategy Controllers used for runs
-            - axes (plt.axes): Axes to plot on
+            - results (Collection[RunResult]): Results of all runs
             - tally_type (str): Either 'cash' or 'position' depending on what you want
 
         Returns:
-            - Collection[Collection[float]]: list of lists, containing every tally from all runs
+            - np.ndarray: (runs x months) array of tallies, padded with NaN for runs that stopped early
 
         Raises:
             - InvalidTallyType: If tally_type is not 'cash' or 'position'
         """
+        if tally_type == 'cash':
+            tallies = [s.get_cash_tally() for s in results]
+        elif tally_type == 'position':
+            tallies = [s.get_position_tally() for s in results]
+        else:
+            raise InvalidTallyType(f"Tally type {tally_type} invalid. Must be 'cash' or 'position")
+        return plotting.stack_tallies(tallies, len(self.__dates))
+
+    def get_performance(self, results: Collection[RunResult]) -> pd.DataFrame:
+        """
+        Computes the performance statistics of every run at once (see `utils.performance`), annualised for monthly
+        or daily data
 
-        # Saves all the tallies so they can be averaged
-        tallies = []
-        for s in strategy_controllers:
-            if tally_type == 'cash':
-                # Plots the cash tally and date tally for each run
-                s.plot_cash(self.__dates, axes)
-                # Saves the cash tally for averaging
-                tallies.append(s.get_cash_tally())
-            elif tally_type == 'position':
-                # Plots the position tally and date tally for each run
-                s.plot_position(self.__dates, axes)
-                # Saves the position tally for averaging
-                tallies.append(s.get_position_tally())
-            else:
-                raise InvalidTallyType(f"Tally type {tally_type} invalid. Must be 'cash' or 'position")
-
-        axes.legend()
-        axes.set_title(f"{tally_type} per run over time")
-        axes.set_xlabel("Date")
-        axes.set_ylabel(f"{tally_type}")
+        Parameters:
+            - results (Collection[RunResult]): Results of all runs
 
-        return tallies
+        Returns:
+            - pd.DataFrame: One row per run of its parameters, final result and performance statistics
+        """
+        periods_per_year = TRADING_DAYS_PER_YEAR if isinstance(self.__calendar, TradingCalendar) else MONTHS_PER_YEAR
+        return performance_table(results, len(self.__dates), periods_per_year)
 
-    def plot_average_graph(self, tallies: Collection[Collection[float]], axes: plt.axes, tally_type: str):
+    @staticmethod
+    def output_results(table: pd.DataFrame):
         """
-        Plots average cash tally from all runs by time
+        Output statistical results to command line
+        :param table: Performance of all runs, from `get_performance()`
+        """
+        print(f"Percentage of bankrupt runs: {table['bankrupt'].mean() * 100}%")
+        print(f"Average Final Cash {table['final_cash'].mean()}")
+        print(f"Average Final Equity {table['final_equity'].mean()}")
+        print(f"Median Sharpe Ratio {table['sharpe'].median()}")
+        print(f"Median Max Drawdown {table['max_drawdown'].median()}")
 
-        Parameters:
-            - tallies (Collection[Collection[float]]): The tally (Collection[float]) for each run
-            - axes (plt.axes): Axes to plot graph on
-            - tally_type (str): The type of tally we are plotting ('cash' or 'position'). Only used for titles so
-                                no exception thrown if invalid.
+
+    @staticmethod
+    def output_memory(memory: pd.DataFrame):
+        """
+        Output memory use of profiled runs to command line
+        :param memory: Memory profiles of runs, from `utils.memory_profile.memory_table()`
         """
-        average_tally = np.average(np.array(tallies), axis=0)
-        axes.plot(self.__dates, average_tally)
-        axes.set_title(f"Average over {tally_type} time")
-        axes.set_xlabel("Date")
-        axes.set_ylabel(f"{tally_type}")
+        print(f"Largest Peak RSS {memory['peak_rss'].max() / 2 ** 20:.1f} MB")
+        for name in ('Stock', 'Portfolio'):
+            if name in memory:
+                print(f"Most {name} Objects Alive {int(memory[name].max())}")
 
     @staticmethod
-    def output_results(strategy_controllers: Collection[StrategyController]):
+    def output_telemetry(report: dict):
         """
-        Output statistical results to command line
-        :param strategy_controllers:
-        :return:
+        Output pool utilization of a grid search to command line
+        :param report: Utilization report, from `utils.telemetry.utilization_report()`
         """
-        number_of_bankrupt = 0
-        average_cash = 0
-        for s in strategy_controllers:
-            number_of_bankrupt += 1 if s.get_bankrupt() else 0
-            average_cash += s.get_cash()
-        average_cash /= len(strategy_controllers)
-        bankrupt_percentage = (number_of_bankrupt / len(strategy_controllers)) * 100
-        print(f"Percentage of bankrupt runs: {bankrupt_percentage}%")
-        print(f"Average Final Cash {average_cash}")
+        print(f"Pool Utilization {report['utilization'] * 100:.1f}% over {report['wall_time']:.2f}s "
+              f"({report['idle_time']:.2f} worker seconds idle)")
+        print(f"Average Queue Wait {report['queue_wait']:.3f}s, Compute {report['compute']:.3f}s, "
+              f"Return Wait {report['return_wait']:.3f}s per task")
+        print(f"Pickled Arguments {report['args_bytes'] / 2 ** 20:.1f} MB, Results "
+              f"{report['result_bytes'] / 2 ** 20:.1f} MB")
+        if report['stragglers']:
+            print(f"Stragglers: {report['stragglers']}")
 
+    @staticmethod
+    def save_results(table: pd.DataFrame, output_dir: str):
+        """
+        Saves the parameters, final result and performance statistics of each run to 'results.csv' in output_dir
 
-    def run_grid_parameters(self, iterations, cash):
+        Parameters:
+            - table (pd.DataFrame): Performance of all runs, from `get_performance()`
+            - output_dir (str): Directory to save results to
+        """
+        table.to_csv(os.path.join(output_dir, "results.csv"), index=False)
+
+    def run_grid_parameters(self, iterations: int, cash: float, grid: Grid | None = None,
+                            max_workers: int | None = None, output_dir: str | None = None,
+                            plot: bool = True, plot_mode: str = 'auto', plot_format: str = 'png',
+                            store_filepath: str | None = None, engine: str = 'object',
+                            checkpoint_dir: str | None = None, checkpoint_every: int = 12,
+                            shards: int = 1, rebalance: str = 'monthly', profile_months: Collection[int] | None = None,
+                            memory_budget: int | None = None, selection_workers: int = 1,
+                            groups: Dict[str, str] | None = None, executor: str = 'auto',
+                            chunk_size: int | None = None, telemetry: Telemetry | None = None) -> Collection[RunResult]:
         """
         Run the strategy using random grid search on parameters
         :param iterations: Number of iterations
         :param cash: Starting cash amount
+        :param grid: Grid of parameters to sample from. Defaults to `DEFAULT_GRID`
+        :param max_workers: Number of worker processes. Defaults to the number of CPUs
+        :param output_dir: Directory to save results and figures to. Figures are shown instead if not given
+        :param plot: Whether to plot cash and position graphs. matplotlib is only imported if this is set
+        :param plot_mode: Per-run plot mode, 'auto' or one of `plotting.PLOT_MODES`
+        :param plot_format: File format of saved figures, 'png' or 'svg'. Figures are saved by the time this returns
+        :param store_filepath: SQLite file results are written to as each run finishes (see `ResultsStore`)
+        :param engine: Engine each run uses, 'object' or 'array' (see `StrategyController`)
+        :param checkpoint_dir: Directory to checkpoint runs to. If it holds a grid search that did not finish, that
+                               search is resumed instead, skipping finished runs and carrying on unfinished ones from
+                               their last checkpoint. It must be resumed on the same data, precision, universe,
+                               rebalance frequency and groups (see `load_or_create_manifest()`)
+        :param checkpoint_every: Months between checkpoints
+        :param shards: Number of ticker shards each run ranks on in parallel threads (see `sharding.py`)
+        :param rebalance: How often each run creates positions, 'daily', 'weekly' or 'monthly'. On daily data, J and
+                          K are in trading days
+        :param profile_months: Months each run takes memory snapshots at, or None not to profile memory. Profiles
+                               are saved to 'memory.csv' in output_dir (see `utils.memory_profile`)
+        :param memory_budget: Bytes the runs in flight may use together. Each run's peak RSS is measured and runs
+                              are held back once the largest peak seen times the runs in flight would exceed this
+        :param selection_workers: Threads each run selects its winners and losers on before its cash simulation. Worth
+                                  raising above 1 when there are fewer runs than cores
+        :param groups: Group (E.g., sector) of each ticker, to select deciles within each group (see `grouping.py`)
+        :param executor: Backend runs are spread over, 'auto' or one of `utils.executors.EXECUTOR_BACKENDS`. 'auto'
+                         picks threads for the 'array' engine when numba is installed (its kernel releases the GIL),
+                         processes otherwise, and runs small grids serially
+        :param chunk_size: Runs batched into each task. Defaults to enough to cover the cost of submitting a task to a
+                           process pool, and 1 for other backends
+        :param telemetry: Collects when each task was submitted, started and ended, on which worker, and the pickled
+                          size of its arguments and result (see `utils.telemetry`). Costs a pickle of each, so is off
+                          by default
+        :return: Results of all runs
         """
+        # Checked here as well as in each run, so a bad interval fails before any run is started
+        if checkpoint_every < 1:
+            raise ValueError(f"Checkpoint interval {checkpoint_every} invalid. Must be at least 1 month")
         # Sets grid of parameters
-        grid = Grid({
-            "J": [x for x in range(1, 13)],
-            "K": [x for x in range(1, 13)],
-            "ratio": [x / 100 for x in range(0,20,1)]
-        })
-
-        strategy_controllers = []
-        futures = []
-        with ProcessPoolExecutor() as executor:
-            for x in range(iterations):
-
-                # Gets parameters from grid
-                J = grid.get_J()
-                K = grid.get_K()
-                ratio = grid.get_ratio()
-
-                print(f"Run {x + 1} begins!")
-                print(f"J: {J}")
-                print(f"K: {K}")
-                print(f"Investment ratio: {ratio}")
-
-                # Runs the grid strategy using multiprocessing to improve efficiency
-                strategy_controller = StrategyController(J, K, ratio, cash)
-                futures.append(executor.submit(run, strategy_controller, self.__df, self.__code_to_currency))
-
-        # Waits for each branch to execute before continuing
-        for future in futures:
-            strategy_controllers.append(future.result())
+        if grid is None:
+            grid = Grid.from_specs(DEFAULT_GRID)
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+        if checkpoint_dir is not None:
+            settings = {**self.__data_settings, "rebalance": rebalance, "groups": Main.groups_digest(groups)}
+            runs = Main.load_or_create_manifest(checkpoint_dir, grid, iterations, cash, engine, settings)
+        else:
+            runs = [{"J": grid.get_J(), "K": grid.get_K(), "ratio": grid.get_ratio(), "cash": cash, "engine": engine}
+                    for x in range(iterations)]
+
+        results = []
+        tasks = []
+        store = ResultsStore(store_filepath) if store_filepath is not None else None
+        if store is not None:
+            store.set_dates(self.__dates)
+        progress = ProgressReporter(len(runs))
+        for x, params in enumerate(runs):
+            checkpoint_filepath = result_filepath = None
+            if checkpoint_dir is not None:
+                checkpoint_filepath = os.path.join(checkpoint_dir, f"run_{x}.npz")
+                result_filepath = os.path.join(checkpoint_dir, f"run_{x}_result.npz")
+                # Finished before the search was interrupted
+                if os.path.exists(result_filepath):
+                    results.append(RunResult.load(result_filepath))
+                    progress.update()
+                    continue
+
+            J, K, ratio = params["J"], params["K"], params["ratio"]
+            print(f"Run {x + 1} begins!")
+            print(f"J: {J}")
+            print(f"K: {K}")
+            print(f"Investment ratio: {ratio}")
+
+            if checkpoint_filepath is not None and os.path.exists(checkpoint_filepath):
+                strategy_controller = StrategyController.load_checkpoint(checkpoint_filepath)
+            else:
+                strategy_controller = StrategyController(J, K, ratio, params["cash"], params["engine"], shards,
+                                                         rebalance, selection_workers, groups)
+            tasks.append((strategy_controller, checkpoint_filepath, result_filepath))
+
+        # A budget needs every run's peak RSS, even when no snapshots are asked for
+        if memory_budget is not None and profile_months is None:
+            profile_months = ()
+        max_workers = max_workers if max_workers is not None else os.cpu_count() or 1
+        cells = self.count_cells()
+        if executor == 'auto':
+            executor = choose_backend(len(tasks), cells, max_workers, engine == 'array' and NUMBA_AVAILABLE,
+                                      profile_months is not None)
+        elif executor == 'thread' and profile_months is not None:
+            logging.warning("Threads share one process, so memory profiles measure every run in flight together")
+        if chunk_size is None:
+            chunk_size = choose_chunk_size(executor, len(tasks), cells, max_workers)
+        if telemetry is not None:
+            telemetry.set_workers(1 if executor == 'serial' else max_workers)
+        limiter = ConcurrencyLimiter(max_workers, memory_budget)
+        pending = chunked(tasks, chunk_size)
+        futures = {}
+        # Process workers are sent the data once when they start, other backends share it with this process
+        initializer = set_task_data if executor == 'process' else None
+        task_data = None if executor == 'process' else self.__data
+        # Runs the grid strategy on the chosen backend, in batches of chunk_size runs
+        with make_executor(executor, max_workers, initializer, (self.__data,)) as pool:
+            # Collects results as each batch finishes, so they are stored even if a later run fails
+            try:
+                while True:
+                    # Submits batches as others finish, up to the cap set by the memory budget
+                    while len(futures) < limiter.get_limit():
+                        batch = next(pending, None)
+                        if batch is None:
+                            break
+                        args = ([(strategy_controller, checkpoint_filepath)
+                                 for strategy_controller, checkpoint_filepath, _ in batch],
+                                task_data, checkpoint_every, profile_months)
+                        record = None
+                        if telemetry is not None:
+                            record = telemetry.submit(", ".join(f"J{c.get_J()} K{c.get_K()} r{c.get_ratio()}"
+                                                                for c, _, _ in batch),
+                                                      args if executor == 'process' else None)
+                            future = pool.submit(timed_task, run_batch, executor == 'process', *args)
+                        else:
+                            future = pool.submit(run_batch, *args)
+                        futures[future] = (batch, record)
+                    if not futures:
+                        break
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batch, record = futures.pop(future)
+                        batch_results = future.result()
+                        if record is not None:
+                            batch_results, worker = batch_results
+                            telemetry.receive(record, worker)
+                        for result, (_, checkpoint_filepath, result_filepath) in zip(batch_results, batch):
+                            limiter.update(result.get_memory_profile())
+                            results.append(result)
+                            if store is not None:
+                                store.add(result)
+                            if result_filepath is not None:
+                                result.save(result_filepath)
+                                if os.path.exists(checkpoint_filepath):
+                                    os.remove(checkpoint_filepath)
+                            progress.update()
+            finally:
+                if store is not None:
+                    store.close()
+
+        self.report_results(results, output_dir, plot, plot_mode, plot_format)
+        return results
+
+    @staticmethod
+    def load_or_create_manifest(checkpoint_dir: str, grid: Grid, iterations: int, cash: float, engine: str,
+                                settings: dict | None = None) -> Collection[dict]:
+        """
+        Loads the parameters of every run of a grid search from 'grid.json' in checkpoint_dir, or samples them from
+        the grid and saves them there with the settings of the search if this is a new search. A resumed search must
+        have the same settings, so its finished runs are never mixed with runs on other data or settings. Manifests
+        written before settings were recorded cannot be checked, which is logged as a warning
+
+        Parameters:
+            - settings (dict | None): Data and settings shared by every run (E.g., the data file, precision, universe,
+                                      rebalance frequency and groups), as JSON values
+
+        Returns:
+            - Collection[dict]: J, K, ratio, cash and engine of each run
+
+        Raises:
+            - GridMismatchError: If the search in checkpoint_dir was started with other settings
+        """
+        settings = settings or {}
+        manifest_filepath = os.path.join(checkpoint_dir, "grid.json")
+        if os.path.exists(manifest_filepath):
+            with open(manifest_filepath, "r") as f:
+                manifest = json.load(f)
+            if isinstance(manifest, list):
+                logging.warning(f"Grid search in {checkpoint_dir} has no recorded settings, so cannot be checked "
+                                f"against the settings it is resumed with")
+                runs = manifest
+            else:
+                runs = manifest["runs"]
+                changed = sorted(name for name in set(manifest["settings"]) | set(settings)
+                                 if manifest["settings"].get(name) != settings.get(name))
+                if changed:
+                    raise GridMismatchError(f"Grid search in {checkpoint_dir} was started with other settings, "
+                                            f"{changed} changed. Resume it with the same settings, or use a separate "
+                                            f"checkpoint directory")
+            logging.warning(f"Resuming grid search of {len(runs)} runs from {checkpoint_dir}")
+            return runs
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        runs = [{"J": grid.get_J(), "K": grid.get_K(), "ratio": grid.get_ratio(), "cash": cash, "engine": engine}
+                for x in range(iterations)]
+        with open(manifest_filepath, "w") as f:
+            json.dump({"settings": settings, "runs": runs}, f)
+        return runs
 
+    @staticmethod
+    def groups_digest(groups: Dict[str, str] | None) -> str | None:
+        """
+        Hashes the group of each ticker, so a grid manifest records the groups without listing every ticker
+        """
+        if groups is None:
+            return None
+        return hashlib.sha1(json.dumps(groups, sort_keys=True).encode()).hexdigest()[:12]
+
+    def run_grid_queue(self, queue_filepath: str, iterations: int, cash: float, grid: Grid | None = None,
+                       local_workers: int = 0, worker_args: Collection[str] = (), poll_interval: float = 5,
+                       timeout: float | None = None, output_dir: str | None = None, plot: bool = True,
+                       plot_mode: str = 'auto', plot_format: str = 'png') -> Collection[RunResult]:
+        """
+        Run the strategy using random grid search on parameters, through a work queue file shared with worker
+        processes (see `worker.py`), which may run on any host that mounts the queue file and the data. Waits for
+        every task to finish, then reports on the results like `run_grid_parameters()`. Stops waiting early if every
+        local worker has exited with tasks left (E.g., they crashed), or after timeout seconds, leaving the unfinished
+        tasks in the queue.
+        :param queue_filepath: Path to the work queue SQLite file
+        :param iterations: Number of iterations
+        :param cash: Starting cash amount
+        :param grid: Grid of parameters to sample from. Defaults to `DEFAULT_GRID`
+        :param local_workers: Number of worker processes to start on this machine
+        :param worker_args: Extra command line arguments for local workers (E.g., data file paths)
+        :param poll_interval: Seconds between checks of the queue
+        :param timeout: Seconds to wait for the tasks before giving up on the rest, or None to wait for all of them
+        :param output_dir: Directory to save results and figures to. Figures are shown instead if not given
+        :param plot: Whether to plot cash and position graphs
+        :param plot_mode: Per-run plot mode, 'auto' or one of `plotting.PLOT_MODES`
+        :param plot_format: File format of saved figures, 'png' or 'svg'
+        :return: Results of all runs that finished
+        """
+        if grid is None:
+            grid = Grid.from_specs(DEFAULT_GRID)
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+
+        with ResultsStore(queue_filepath) as store:
+            store.set_dates(self.__dates)
+        with WorkQueue(queue_filepath) as queue:
+            task_ids = queue.enqueue([(grid.get_J(), grid.get_K(), grid.get_ratio(), cash) for x in range(iterations)])
+            workers = [subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__), "worker.py"),
+                                         "--queue", queue_filepath, *worker_args])
+                       for x in range(local_workers)]
+
+            # Waits for the tasks to be finished by any worker
+            progress = ProgressReporter(len(task_ids))
+            deadline = time.time() + timeout if timeout is not None else None
+            while True:
+                # Checked before counting, so workers that exit once the last task is done are not taken as crashed
+                workers_gone = bool(workers) and all(worker.poll() is not None for worker in workers)
+                # Tasks whose last lease expired would otherwise only be failed by a worker leasing
+                queue.expire_leases()
+                counts = queue.get_counts(task_ids)
+                finished = counts['done'] + counts['failed']
+                if finished > progress.get_done():
+                    progress.update(finished - progress.get_done())
+                if finished == len(task_ids):
+                    break
+                if workers_gone:
+                    logging.error(f"Every local worker exited with {len(task_ids) - finished} tasks unfinished, "
+                                  f"exit codes {[worker.returncode for worker in workers]}")
+                    break
+                if deadline is not None and time.time() >= deadline:
+                    logging.error(f"Timed out after {timeout}s with {len(task_ids) - finished} tasks unfinished")
+                    break
+                time.sleep(poll_interval)
+            if counts['failed']:
+                logging.error(f"{counts['failed']} tasks failed, see the 'error' column of the tasks table")
+            run_ids = queue.get_run_ids(task_ids)
+        for worker in workers:
+            # Only still running if the wait timed out
+            if worker.poll() is None:
+                worker.terminate()
+            worker.wait()
+
+        with ResultsStore(queue_filepath) as store:
+            results = store.load_results(run_ids)
+        self.report_results(results, output_dir, plot, plot_mode, plot_format)
+        return results
+
+    def report_results(self, results: Collection[RunResult], output_dir: str | None = None, plot: bool = True,
+                       plot_mode: str = 'auto', plot_format: str = 'png'):
+        """
+        Outputs statistics of the results to command line, saves them to output_dir if given, and plots them. Figures
+        saved to output_dir are rendered in a background process, and this waits for them, so they exist once it
+        returns
+        """
         # Output statistical results to command line
-        Main.output_results(strategy_controllers)
-        # Plots cash over time and average cash from all runs
-        self.plot_cash_graphs(strategy_controllers)
-        self.plot_position_graphs(strategy_controllers)
+        table = self.get_performance(results)
+        Main.output_results(table)
+        if output_dir is not None:
+            Main.save_results(table, output_dir)
+        memory = memory_table(results)
+        if len(memory):
+            Main.output_memory(memory)
+            if output_dir is not None:
+                memory.to_csv(os.path.join(output_dir, "memory.csv"), index=False)
+        if plot:
+            # Plots cash over time and average cash from all runs
+            self.plot_cash_graphs(results, output_dir, plot_mode, plot_format)
+            self.plot_position_graphs(results, output_dir, plot_mode, plot_format)
+            self.wait_for_renders()
+
+    def count_cells(self) -> int:
+        """
+        Gets the number of months x tickers in the stock data, the size of each run
+        """
+        if isinstance(self.__data, Panel):
+            return int(np.prod(self.__data.get_prices().shape))
+        return len(self.__data) * sum(col.endswith('Returns') for col in self.__data.columns)
 
+    def get_data(self) -> pd.DataFrame | Panel:
+        return self.__data
 
-if __name__ == '__main__':
-    m = Main()
-    m.run_grid_parameters(iterations=10, cash=1000)
+    def get_calendar(self) -> MonthCalendar | TradingCalendar:
+        return self.__calendar
 
 
+def positive_int(value: str) -> int:
+    """
+    Parses a command line argument that must be an int of at least 1
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} invalid. Must be at least 1")
+    return number
 
 
+def parse_args(args: Collection[str] | None = None) -> argparse.Namespace:
+    """
+    Parses command line arguments for running a grid search
 
+    Parameters:
+        - args (Collection[str] | None): Arguments to parse. Defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(description="Grid search over the Jegadeesh-Titman J-month/K-month strategy")
+    parser.add_argument("--data", default="../data/stock_data.csv", help="Monthly stock data CSV")
+    parser.add_argument("--currency", default="../data/code_to_currency.json",
+                        help="JSON mapping ticker codes to currencies")
+    parser.add_argument("--fx", default="../data/fx_rates.csv", help="FX rate CSV for converting prices to USD")
+    parser.add_argument("--panel", default=None,
+                        help="Directory of a memory-mapped panel to run on instead of loading the CSV into memory in "
+                             "every worker. Built from --data on first use")
+    parser.add_argument("--dtype", default="float64", choices=tuple(DTYPES),
+                        help="Precision of prices and returns. float32 halves memory, cash is always float64")
+    parser.add_argument("--J", default=DEFAULT_GRID["J"],
+                        help="J values, as 'start:stop[:step]' (stop excluded) or a comma separated list")
+    parser.add_argument("--K", default=DEFAULT_GRID["K"], help="K values, in the same format as --J")
+    parser.add_argument("--ratio", default=DEFAULT_GRID["ratio"],
+                        help="Investment ratios, in the same format as --J")
+    parser.add_argument("--iterations", type=int, default=10, help="Number of runs to sample from the grid")
+    parser.add_argument("--cash", type=float, default=1000, help="Starting cash for each run")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (or threads). Defaults to the number of CPUs")
+    parser.add_argument("--executor", default="auto", choices=("auto",) + EXECUTOR_BACKENDS,
+                        help="Backend runs are spread over. 'auto' picks threads for the numba compiled 'array' "
+                             "engine, processes otherwise, and runs small grids serially")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Runs batched into each task. Defaults to enough to cover a process task's overhead")
+    parser.add_argument("--output-dir", default=None,
+                        help="Directory to save results.csv and figures to. Figures are shown if not given")
+    parser.add_argument("--store", default=None,
+                        help="SQLite file to write results to as runs finish, for querying later")
+    parser.add_argument("--engine", default="object", choices=StrategyController.ENGINES,
+                        help="'object' trades Stock objects month by month, 'array' runs precomputed selections "
+                             "through a (numba compiled if installed) kernel")
+    parser.add_argument("--rebalance", default="monthly", choices=REBALANCE_FREQUENCIES,
+                        help="How often positions are created. With daily --data, J and K are in trading days")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Ticker shards each run ranks on in parallel threads, for very large universes")
+    parser.add_argument("--neutral", default=None, choices=GROUP_COLUMNS,
+                        help="Rank within each sector, industry or country of the screener instead of all tickers. "
+                             f"Groups with fewer than {MIN_GROUP_SIZE} eligible tickers in a month are skipped")
+    parser.add_argument("--screener", default=None,
+                        help="NASDAQ screener CSV for --neutral. Defaults to the latest data/nasdaq_screener_*.csv")
+    add_universe_args(parser)
+    parser.add_argument("--selection-workers", type=int, default=1,
+                        help="Threads each run selects every month's winners and losers on before simulating cash")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="Measure each run's peak RSS and save memory profiles to memory.csv in --output-dir")
+    parser.add_argument("--profile-months", default="",
+                        help="With --profile-memory, months to take tracemalloc snapshots and count Stock and "
+                             "Portfolio objects at, in the same format as --J")
+    parser.add_argument("--memory-budget", type=float, default=None,
+                        help="MB the runs in flight may use together. Caps concurrency from measured peak RSS")
+    parser.add_argument("--telemetry", action="store_true",
+                        help="Time every task and measure its pickled size, and report pool utilization. Saved to "
+                             "telemetry.csv in --output-dir. Not available with --queue")
+    parser.add_argument("--trace", default=None,
+                        help="JSON file to save a Chrome trace of the tasks to (implies --telemetry)")
+    parser.add_argument("--checkpoint-dir", default=None,
+                        help="Directory to checkpoint runs to. Rerunning with the same directory resumes the search")
+    parser.add_argument("--checkpoint-every", type=positive_int, default=12, help="Months between checkpoints")
+    parser.add_argument("--queue", default=None,
+                        help="Run through a work queue file shared with worker.py processes instead of a local pool")
+    parser.add_argument("--local-workers", type=int, default=0,
+                        help="With --queue, number of worker processes to start on this machine")
+    parser.add_argument("--queue-timeout", type=float, default=None,
+                        help="With --queue, seconds to wait for the tasks before reporting on those that finished")
+    parser.add_argument("--plot", action="store_true", help="Plot cash and position graphs")
+    parser.add_argument("--plot-mode", default="auto", choices=("auto",) + plotting.PLOT_MODES,
+                        help="Per-run graph style. 'auto' draws lines for a few runs and a fan chart for many")
+    parser.add_argument("--plot-format", default="png", choices=("png", "svg"), help="File format of saved figures")
+    parsed = parser.parse_args(args)
+    # Queue workers run in their own processes, possibly on other hosts, so their tasks cannot be timed from here
+    if parsed.queue is not None and (parsed.telemetry or parsed.trace is not None):
+        parser.error("--telemetry and --trace time the tasks of a local pool, so cannot be used with --queue")
+    return parsed
+
+
+def main(args: Collection[str] | None = None):
+    args = parse_args(args)
+    m = Main(args.data, args.currency, args.fx, args.panel, args.dtype, universe_from_args(args, args.data))
+    grid = Grid.from_specs({"J": args.J, "K": args.K, "ratio": args.ratio})
+    screener = args.screener if args.screener is not None else find_screener()
+    groups = None
+    if args.neutral is not None:
+        if screener is None:
+            raise FileNotFoundError("No NASDAQ screener CSV found to group tickers by for --neutral")
+        groups = load_groups(screener, args.neutral)
+    if args.queue is not None:
+        m.run_grid_queue(args.queue, iterations=args.iterations, cash=args.cash, grid=grid,
+                         local_workers=args.local_workers, timeout=args.queue_timeout,
+                         worker_args=["--data", args.data, "--currency", args.currency, "--fx", args.fx,
+                                      *(["--panel", args.panel] if args.panel is not None else []),
+                                      "--dtype", args.dtype, "--engine", args.engine, "--shards", str(args.shards),
+                                      "--rebalance", args.rebalance,
+                                      "--selection-workers", str(args.selection_workers),
+                                      *(["--neutral", args.neutral, "--screener", screener]
+                                        if args.neutral is not None else []),
+                                      *universe_args(args)],
+                         output_dir=args.output_dir, plot=args.plot, plot_mode=args.plot_mode,
+                         plot_format=args.plot_format)
+        return
+    telemetry = Telemetry() if args.telemetry or args.trace is not None else None
+    m.run_grid_parameters(iterations=args.iterations, cash=args.cash, grid=grid, max_workers=args.workers,
+                          output_dir=args.output_dir, plot=args.plot, plot_mode=args.plot_mode,
+                          plot_format=args.plot_format, store_filepath=args.store, engine=args.engine,
+                          checkpoint_dir=args.checkpoint_dir, checkpoint_every=args.checkpoint_every,
+                          shards=args.shards, rebalance=args.rebalance, selection_workers=args.selection_workers,
+                          groups=groups, executor=args.executor, chunk_size=args.chunk_size, telemetry=telemetry,
+                          profile_months=(Grid.parse_spec(args.profile_months) if args.profile_months else [])
+                          if args.profile_memory else None,
+                          memory_budget=int(args.memory_budget * 2 ** 20) if args.memory_budget is not None else None)
+    if telemetry is not None:
+        Main.output_telemetry(utilization_report(telemetry.get_records(), telemetry.get_workers()))
+        if args.output_dir is not None:
+            task_table(telemetry.get_records()).to_csv(os.path.join(args.output_dir, "telemetry.csv"), index=False)
+        if args.trace is not None:
+            save_chrome_trace(telemetry.get_records(), args.trace)
 
 
+if __name__ == '__main__':
+    main()
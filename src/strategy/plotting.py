@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+from typing import Collection, Tuple, TYPE_CHECKING
+
+from utils.exceptions import InvalidTallyType
+
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
+
+
+# Plot modes for per-run graphs. 'lines' draws every run, which only stays readable for a handful of runs
+PLOT_MODES = ('lines', 'fan', 'density')
+# Above this many runs, 'auto' switches from one line per run to a fan chart
+MAX_LINES = 20
+# Percentiles drawn as bands in fan charts, paired from the outside in
+FAN_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+""" PREPARING DATA """
+
+
+def stack_tallies(tallies: Collection[Collection[float]], length: int) -> np.ndarray:
+    """
+    Stacks tallies from all runs into one (runs x months) array. Tallies shorter than length (E.g., position tallies
+    of runs that went bankrupt) are padded with NaN
+
+    Parameters:
+        - tallies (Collection[Collection[float]]): The tally for each run
+        - length (int): Number of months
+
+    Returns:
+        - np.ndarray: (runs x months) float64 array
+    """
+    stacked = np.full((len(tallies), length), np.nan)
+    for i, tally in enumerate(tallies):
+        stacked[i, :len(tally)] = tally
+    return stacked
+
+
+def resolve_mode(mode: str, runs: int) -> str:
+    """
+    Resolves the plot mode to use, where 'auto' picks 'lines' for a few runs and 'fan' for many
+
+    Raises:
+        - ValueError: If mode is not 'auto' or one of `PLOT_MODES`
+    """
+    if mode == 'auto':
+        return 'lines' if runs <= MAX_LINES else 'fan'
+    if mode not in PLOT_MODES:
+        raise ValueError(f"Plot mode {mode} invalid. Must be 'auto' or one of {PLOT_MODES}")
+    return mode
+
+
+def lttb_downsample(x: np.ndarray, y: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Downsamples a series with Largest-Triangle-Three-Buckets, which keeps the points that most affect the shape of
+    the line. The first and last points are always kept.
+
+    Parameters:
+        - x (np.ndarray): x values, numeric and increasing
+        - y (np.ndarray): y values
+        - threshold (int): Number of points to keep
+
+    Returns:
+        - Tuple[np.ndarray, np.ndarray]: Downsampled x and y values
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    x_float = np.asarray(x, dtype=np.float64)
+    y_float = np.asarray(y, dtype=np.float64)
+
+    # Bucket edges for the points between the first and last
+    edges = (np.floor(np.arange(threshold - 1) * (n - 2) / (threshold - 2)) + 1).astype(np.int64)
+    edges[-1] = n - 1
+    indexes = np.zeros(threshold, dtype=np.int64)
+    indexes[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket, or the last point for the final bucket
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x_float[end:next_end].mean()
+        avg_y = np.nanmean(y_float[end:next_end]) if not np.isnan(y_float[end:next_end]).all() else y_float[a]
+        # Picks the point in this bucket forming the largest triangle with the last kept point and the next average
+        areas = np.abs((x_float[a] - avg_x) * (y_float[start:end] - y_float[a]) -
+                       (x_float[a] - x_float[start:end]) * (avg_y - y_float[a]))
+        a = start + int(np.argmax(np.nan_to_num(areas, nan=-1.0)))
+        indexes[i + 1] = a
+    return x[indexes], y[indexes]
+
+
+def downsample_dates(dates: Collection[pd.Timestamp], y: np.ndarray, threshold: int | None) -> \
+        Tuple[np.ndarray, np.ndarray]:
+    """
+    Downsamples a series indexed by dates with `lttb_downsample()`. Does nothing if threshold is None
+    """
+    dates = np.asarray(pd.DatetimeIndex(dates))
+    if threshold is None:
+        return dates, y
+    numeric_dates, y = lttb_downsample(dates.astype('datetime64[ns]').astype(np.int64), y, threshold)
+    return numeric_dates.astype('datetime64[ns]'), y
+
+
+def top_n_runs(stacked: np.ndarray, n: int) -> np.ndarray:
+    """
+    Gets the indexes of the n runs with the highest final value, best first. Runs ending in NaN are ranked last
+    """
+    final = np.where(np.isnan(stacked[:, -1]), -np.inf, stacked[:, -1])
+    return np.argsort(-final, kind='stable')[:n]
+
+
+""" DRAWING """
+
+
+def plot_lines(ax: 'Axes', dates: Collection[pd.Timestamp], stacked: np.ndarray, labels: Collection[str],
+               max_points: int | None = None):
+    """
+    Draws one labelled line per run
+    """
+    for tally, label in zip(stacked, labels):
+        ax.plot(*downsample_dates(dates, tally, max_points), label=label)
+    ax.legend()
+
+
+def plot_fan_chart(ax: 'Axes', dates: Collection[pd.Timestamp], stacked: np.ndarray,
+                   percentiles: Collection[float] = FAN_PERCENTILES):
+    """
+    Draws percentile bands across runs for each month, with the median as a line. The cost is independent of the
+    number of runs once the percentiles are computed.
+    """
+    dates = np.asarray(pd.DatetimeIndex(dates))
+    percentiles = sorted(percentiles)
+    bands = np.nanpercentile(stacked, percentiles, axis=0)
+    pairs = len(percentiles) // 2
+    for i in range(pairs):
+        ax.fill_between(dates, bands[i], bands[-i - 1], color='tab:blue', alpha=0.15 + 0.2 * i, linewidth=0,
+                        label=f"{percentiles[i]}-{percentiles[-i - 1]}th percentile")
+    if len(percentiles) % 2:
+        ax.plot(dates, bands[pairs], color='tab:blue', label=f"{percentiles[pairs]}th percentile")
+
+
+def plot_density(ax: 'Axes', dates: Collection[pd.Timestamp], stacked: np.ndarray, bins: int = 100):
+    """
+    Shades how many runs fall into each value bin in each month. Binning is one vectorised pass over all runs
+    """
+    dates = np.asarray(pd.DatetimeIndex(dates))
+    finite = stacked[np.isfinite(stacked)]
+    if finite.size == 0:
+        return
+    edges = np.linspace(finite.min(), finite.max(), bins + 1)
+    # Bin of every value, with each month's bins offset so one bincount counts all months at once
+    value_bins = np.clip(np.searchsorted(edges, stacked, side='right') - 1, 0, bins - 1)
+    months = np.broadcast_to(np.arange(stacked.shape[1]), stacked.shape)
+    valid = np.isfinite(stacked)
+    counts = np.bincount((months[valid] * bins + value_bins[valid]), minlength=stacked.shape[1] * bins)
+    counts = counts.reshape(stacked.shape[1], bins).T.astype(np.float64)
+    counts[counts == 0] = np.nan
+    ax.pcolormesh(dates, (edges[:-1] + edges[1:]) / 2, counts, shading='nearest', cmap='Blues')
+
+
+def highlight_runs(ax: 'Axes', dates: Collection[pd.Timestamp], stacked: np.ndarray, labels: Collection[str],
+                   n: int, max_points: int | None = None):
+    """
+    Draws the n best runs by final value as labelled lines on top of a fan chart or density plot
+    """
+    for i in top_n_runs(stacked, n):
+        ax.plot(*downsample_dates(dates, stacked[i], max_points), linewidth=1, label=labels[i])
+
+
+def plot_runs(ax: 'Axes', dates: Collection[pd.Timestamp], stacked: np.ndarray, labels: Collection[str],
+              tally_type: str, mode: str = 'auto', top_n: int = 5, max_points: int | None = 1000):
+    """
+    Plots every run's tally on one axes, choosing between individual lines, a fan chart or density shading
+
+    Parameters:
+        - ax (Axes): Axes to plot on
+        - dates (Collection[pd.Timestamp]): Date of each month
+        - stacked (np.ndarray): (runs x months) array of tallies, see `stack_tallies()`
+        - labels (Collection[str]): Label for each run
+        - tally_type (str): 'cash' or 'position', used for titles
+        - mode (str): 'auto' or one of `PLOT_MODES`
+        - top_n (int): Number of best runs to highlight in 'fan' and 'density' modes
+        - max_points (int | None): Points kept per line after LTTB downsampling, or None to keep all
+    """
+    mode = resolve_mode(mode, len(stacked))
+    if mode == 'lines':
+        plot_lines(ax, dates, stacked, labels, max_points)
+    else:
+        if mode == 'fan':
+            plot_fan_chart(ax, dates, stacked)
+        else:
+            plot_density(ax, dates, stacked)
+        if top_n:
+            highlight_runs(ax, dates, stacked, labels, top_n, max_points)
+        ax.legend(fontsize='small')
+    ax.set_title(f"{tally_type} per run over time")
+    ax.set_xlabel("Date")
+    ax.set_ylabel(f"{tally_type}")
+
+
+def plot_average(ax: 'Axes', dates: Collection[pd.Timestamp], stacked: np.ndarray, tally_type: str):
+    """
+    Plots the average tally over all runs
+    """
+    ax.plot(dates, np.nanmean(stacked, axis=0))
+    ax.set_title(f"Average over {tally_type} time")
+    ax.set_xlabel("Date")
+    ax.set_ylabel(f"{tally_type}")
+
+
+""" RENDERING TO FILE """
+
+
+def render_tally_graphs(filepath: str, dates: Collection[pd.Timestamp], stacked: np.ndarray,
+                        labels: Collection[str], tally_type: str, mode: str = 'auto', top_n: int = 5,
+                        max_points: int | None = 1000):
+    """
+    Renders the per-run and average graphs of a tally to a PNG or SVG file (chosen by the file extension). Uses the
+    non-interactive 'Agg' backend, so it can run in a background process without a display.
+
+    Raises:
+        - InvalidTallyType: If tally_type is not 'cash' or 'position'
+    """
+    if tally_type not in ('cash', 'position'):
+        raise InvalidTallyType(f"Tally type {tally_type} invalid. Must be 'cash' or 'position")
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(nrows=1, ncols=2, figsize=(14, 5))
+    plot_runs(axes[0], dates, stacked, labels, tally_type, mode, top_n, max_points)
+    plot_average(axes[1], dates, stacked, tally_type)
+    fig.tight_layout()
+    fig.savefig(filepath)
+    plt.close(fig)
+    return filepath
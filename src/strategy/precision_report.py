@@ -0,0 +1,94 @@
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Collection, Tuple
+
+from signals import SignalTable
+from utils.grid import Grid
+from utils.precision import cast_stock_data
+
+
+def decile_membership(signals: SignalTable) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Gets which tickers are winners and which are losers in each month
+
+    Returns:
+        - np.ndarray: (months x tickers) boolean mask of winners
+        - np.ndarray: (months x tickers) boolean mask of losers
+    """
+    winners, losers, counts = signals.calculate_selections()
+    masks = []
+    for selection in (winners, losers):
+        mask = np.zeros((len(counts), len(signals.get_tickers())), dtype=bool)
+        months, columns = np.nonzero(selection >= 0)
+        mask[months, selection[months, columns]] = True
+        masks.append(mask)
+    return masks[0], masks[1]
+
+
+def compare_precisions(df: pd.DataFrame, J_values: Collection[int]) -> pd.DataFrame:
+    """
+    Ranks the stock data in float64 and in float32 and counts, for each J and month, how many decile memberships
+    differ between the two. A membership differs when a ticker is a winner (or loser) in one precision but not the
+    other, so one swap at the edge of a decile counts as 2
+
+    Parameters:
+        - df (pd.DataFrame): Stock data, with prices already in USD
+        - J_values (Collection[int]): Look-back periods to compare
+
+    Returns:
+        - pd.DataFrame: One row per J and month with 'J', 'Date', 'winners' (decile size in float64),
+                        'winners_differ', 'losers_differ' and 'eligible_differ' (tickers eligible in one precision only)
+    """
+    single = cast_stock_data(df, 'float32')
+    double = cast_stock_data(df, 'float64')
+    reports = []
+    for J in J_values:
+        signals64, signals32 = SignalTable(double, J), SignalTable(single, J)
+        winners64, losers64 = decile_membership(signals64)
+        winners32, losers32 = decile_membership(signals32)
+        reports.append(pd.DataFrame({
+            'J': J,
+            'Date': signals64.get_calendar().get_dates(),
+            'winners': winners64.sum(axis=1),
+            'winners_differ': (winners64 != winners32).sum(axis=1),
+            'losers_differ': (losers64 != losers32).sum(axis=1),
+            'eligible_differ': (signals64.get_eligible() != signals32.get_eligible()).sum(axis=1),
+        }))
+    return pd.concat(reports, ignore_index=True)
+
+
+def summarise(report: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summarises a report from `compare_precisions()` per J: the number of months with any differing membership, and
+    the total and largest number of differing memberships in a month
+    """
+    report = report.assign(differ=report['winners_differ'] + report['losers_differ'])
+    return report.groupby('J').agg(months=('Date', 'size'), months_differ=('differ', lambda x: int((x > 0).sum())),
+                                   memberships_differ=('differ', 'sum'), max_differ=('differ', 'max'))
+
+
+def parse_args(args: Collection[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compares decile memberships ranked in float64 and float32")
+    parser.add_argument("--data", default="../data/stock_data.csv", help="Monthly stock data CSV")
+    parser.add_argument("--currency", default="../data/code_to_currency.json",
+                        help="JSON mapping ticker codes to currencies")
+    parser.add_argument("--fx", default="../data/fx_rates.csv", help="FX rate CSV for converting prices to USD")
+    parser.add_argument("--J", default="1:13", help="J values, as 'start:stop[:step]' or a comma separated list")
+    parser.add_argument("--output", default=None, help="CSV to save the per month report to")
+    return parser.parse_args(args)
+
+
+def main(args: Collection[str] | None = None):
+    # Imported here so that importing this module does not import main.py
+    from main import Main
+    args = parse_args(args)
+    df = Main(args.data, args.currency, args.fx).get_data()
+    report = compare_precisions(df, Grid.parse_spec(args.J))
+    if args.output is not None:
+        report.to_csv(args.output, index=False)
+    print(summarise(report).to_string())
+
+
+if __name__ == '__main__':
+    main()
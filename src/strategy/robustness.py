@@ -0,0 +1,281 @@
+"""
+Universe subsampling robustness runs: reruns one parameter set on hundreds of seeded random subsets of the universe
+(E.g., 50-80% of the tickers each), to check its results are not down to a few tickers.
+
+Every subset shares one loaded copy of the stock data and one SignalTable. A ticker's average J-month return and
+eligibility do not depend on which other tickers are in the universe, so each month is sorted once over the whole
+universe, and a subset's ranking is that order with the tickers outside the subset masked out. Batches of subsets are
+selected at once along a subset axis, and each subset's cash is then simulated by the 'array' kernel (see
+`kernels.py`), which releases the GIL when compiled, on a thread pool.
+
+    python robustness.py --J 6 --K 6 --ratio 0.1 --subsets 300 --output-dir robustness
+"""
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from typing import Collection, Tuple
+
+from signals import SignalTable
+from sharding import selection_counts
+from kernels import NUMBA_AVAILABLE, simulate, rebalance_settle_from
+from utils.panel import Panel
+from utils.run_result import RunResult
+from utils.performance import MONTHS_PER_YEAR, TRADING_DAYS_PER_YEAR, performance_table
+from utils.trading_calendar import REBALANCE_FREQUENCIES, TradingCalendar, rebalance_mask
+
+if NUMBA_AVAILABLE:
+    import numba
+
+# Bytes the selection of a batch of subsets may use, which sets the default batch size
+BATCH_BYTES = 2 ** 28
+
+# Statistics summarised over subsets
+SUMMARY_COLUMNS = ('final_cash', 'final_equity', 'annual_return', 'sharpe', 'max_drawdown', 'newey_west_t')
+
+
+def subset_masks(tickers: int, subsets: int, min_fraction: float = 0.5, max_fraction: float = 0.8,
+                 seed: int = 0) -> np.ndarray:
+    """
+    Draws random subsets of the universe, each keeping a fraction of the tickers drawn uniformly between min_fraction
+    and max_fraction. The same seed always gives the same subsets
+
+    Parameters:
+        - tickers (int): Number of tickers in the universe
+        - subsets (int): Number of subsets to draw
+        - min_fraction (float): Smallest fraction of tickers a subset keeps
+        - max_fraction (float): Largest fraction of tickers a subset keeps
+        - seed (int): Seed of the random generator
+
+    Returns:
+        - np.ndarray: (subsets x tickers) boolean mask of the tickers in each subset
+
+    Raises:
+        - ValueError: If the fractions are not 0 < min_fraction <= max_fraction <= 1
+    """
+    if not 0 < min_fraction <= max_fraction <= 1:
+        raise ValueError("Subset fractions must satisfy 0 < min_fraction <= max_fraction <= 1")
+    rng = np.random.default_rng(seed)
+    sizes = np.rint(rng.uniform(min_fraction, max_fraction, subsets) * tickers).astype(np.int64)
+    # Each subset keeps the tickers with its sizes[s] smallest random keys
+    ranks = np.argsort(np.argsort(rng.random((subsets, tickers)), axis=1), axis=1)
+    return ranks < sizes[:, None]
+
+
+def universe_order(signals: SignalTable) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sorts every month's eligible tickers over the whole universe once, for `select_subsets()`
+
+    Returns:
+        - np.ndarray: (months x tickers) ticker indexes, eligible ones first in ascending order of returns with ties in
+                      column order
+        - np.ndarray: (months x tickers) eligibility mask
+    """
+    eligible = signals.get_eligible()
+    order = np.argsort(np.where(eligible, np.asarray(signals.get_scores()), np.inf), axis=1, kind='stable')
+    return order, eligible
+
+
+def fill_selections_python(order: np.ndarray, eligible_count: np.ndarray, masks: np.ndarray, counts: np.ndarray,
+                           winners: np.ndarray, losers: np.ndarray):
+    """
+    Fills the winners and losers of each subset and month by walking the month's order from each end, skipping
+    tickers outside the subset, until counts[s, m] of each are found. Only the ends of each order are read, so this
+    costs about 2 * counts / (fraction of tickers kept) steps per subset and month
+    """
+    for s in range(masks.shape[0]):
+        for m in range(order.shape[0]):
+            n = counts[s, m]
+            k = 0
+            p = 0
+            while k < n:
+                i = order[m, p]
+                if masks[s, i]:
+                    losers[s, m, k] = i
+                    k += 1
+                p += 1
+            k = n - 1
+            p = eligible_count[m] - 1
+            while k >= 0:
+                i = order[m, p]
+                if masks[s, i]:
+                    winners[s, m, k] = i
+                    k -= 1
+                p -= 1
+
+
+if NUMBA_AVAILABLE:
+    fill_selections_numba = numba.njit(cache=True, nogil=True)(fill_selections_python)
+else:
+    fill_selections_numba = None
+
+
+def select_subsets(order: np.ndarray, eligible: np.ndarray, masks: np.ndarray, use_numba: bool = True) -> \
+        Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Selects every month's winners and losers in each of a batch of subsets, the same as ranking each subset on its
+    own: dropping tickers from a stable sort leaves the rest in the order a stable sort of them alone would give.
+    Each subset's number of eligible tickers in every month is one matrix product of the subset masks and the
+    eligibility mask. The selections are then read off the ends of each month's order by a compiled loop when numba
+    is installed, or otherwise from the running count of each subset's tickers along the whole order
+
+    Parameters:
+        - order (np.ndarray): (months x tickers) ranking from `universe_order()`
+        - eligible (np.ndarray): (months x tickers) eligibility mask from `universe_order()`
+        - masks (np.ndarray): (subsets x tickers) mask of the tickers in each subset
+        - use_numba (bool): Whether to use the compiled loop if numba is installed
+
+    Returns:
+        - np.ndarray: (subsets x months x max count) ticker indexes of winners in ascending order of returns, -1 padded
+        - np.ndarray: (subsets x months x max count) ticker indexes of losers in ascending order of returns, -1 padded
+        - np.ndarray: (subsets x months) number of winners (and losers)
+    """
+    subsets = masks.shape[0]
+    months, tickers = order.shape
+    eligible_count = eligible.sum(axis=1)
+    # Counts are far below 2^53, so they are exact in float64
+    sizes = (masks.astype(np.float64) @ eligible.T.astype(np.float64)).astype(np.int64)
+    counts = selection_counts(sizes)
+    width = max(int(counts.max(initial=0)), 1)
+    winners = np.full((subsets, months, width), -1, dtype=np.int64)
+    losers = np.full((subsets, months, width), -1, dtype=np.int64)
+    if use_numba and NUMBA_AVAILABLE:
+        fill_selections_numba(order.astype(np.int64), eligible_count.astype(np.int64), masks, counts, winners,
+                              losers)
+        return winners, losers, counts
+
+    # Position p of month m holds a ticker in the subset that is eligible that month
+    in_subset = masks[:, order] & (np.arange(tickers)[None, :] < eligible_count[:, None])[None]
+    rank = np.cumsum(in_subset, axis=2, dtype=np.int32) - 1
+    first_winner = (sizes - counts)[:, :, None]
+    s, m, p = np.nonzero(in_subset & (rank < counts[:, :, None]))
+    losers[s, m, rank[s, m, p]] = order[m, p]
+    s, m, p = np.nonzero(in_subset & (rank >= first_winner))
+    winners[s, m, rank[s, m, p] - first_winner[s, m, 0]] = order[m, p]
+    return winners, losers, counts
+
+
+def run_subsets(df: pd.DataFrame | Panel, J: int, K: int, ratio: float, cash: float, masks: np.ndarray,
+                rebalance: str = 'monthly', batch_size: int | None = None, workers: int = 1,
+                signals: SignalTable | None = None) -> list[RunResult]:
+    """
+    Runs one parameter set on each subset of the universe, with the same results as a `StrategyController` run with
+    the 'array' engine on stock data holding only that subset's tickers
+
+    Parameters:
+        - df (pd.DataFrame | Panel): Stock data of the whole universe
+        - J (int): J months (look-back period)
+        - K (int): K months (holding period)
+        - ratio (float): Investment ratio
+        - cash (float): Starting cash
+        - masks (np.ndarray): (subsets x tickers) mask of the tickers in each subset, E.g., from `subset_masks()`
+        - rebalance (str): How often positions are created, see `StrategyController`
+        - batch_size (int | None): Subsets selected at once. Defaults to as many as fit in `BATCH_BYTES`
+        - workers (int): Threads subsets' cash is simulated on
+        - signals (SignalTable | None): Signals of df for J, if already computed
+
+    Returns:
+        - list[RunResult]: Result of each subset, in the order of masks
+    """
+    if signals is None:
+        signals = SignalTable.from_panel(df, J) if isinstance(df, Panel) else SignalTable(df, J)
+    order, eligible = universe_order(signals)
+    months, tickers = order.shape
+    rebalance_rows = rebalance_mask(signals.get_calendar().get_dates(), rebalance)
+    # Positions are only created on rebalance rows once there are J months to look back on
+    trading = (np.arange(months) >= J) & rebalance_rows
+    settle_from = rebalance_settle_from(rebalance_rows, J, K)
+    prices = signals.get_prices()
+    if batch_size is None:
+        # The running count of the loop without numba takes about 8 bytes per subset, month and ticker
+        batch_size = max(1, BATCH_BYTES // max(months * tickers * 8, 1))
+
+    def run_subset(selection: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> RunResult:
+        winners, losers, counts = selection
+        final_cash, cash_tally, position_tally, bankrupt_month = simulate(
+            prices, winners, losers, np.where(trading, counts, 0), settle_from, ratio, cash)
+        return RunResult(J, K, ratio, cash, final_cash, bankrupt_month >= 0, cash_tally, position_tally)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        for start in range(0, len(masks), batch_size):
+            winners, losers, counts = select_subsets(order, eligible, masks[start:start + batch_size])
+            results += executor.map(run_subset, zip(winners, losers, counts))
+    return results
+
+
+def robustness_table(results: Collection[RunResult], masks: np.ndarray, periods: int,
+                     periods_per_year: int = MONTHS_PER_YEAR) -> pd.DataFrame:
+    """
+    Gets the performance of each subset (see `utils.performance.performance_table()`), with its index and the
+    fraction of the universe it kept. Statistics are of each subset's equity, its cash plus its open positions, as
+    positions still open at the end can leave its final cash far from what it is worth
+    """
+    table = performance_table(results, periods, periods_per_year)
+    table.insert(0, 'subset', np.arange(len(results)))
+    table.insert(1, 'fraction', masks.mean(axis=1) if masks.shape[1] else np.zeros(len(masks)))
+    return table
+
+
+def summarise(table: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summarises the distribution over subsets of the main statistics: their mean, standard deviation and quantiles,
+    and the share of subsets that went bankrupt
+    """
+    summary = table[list(SUMMARY_COLUMNS)].describe(percentiles=[0.05, 0.25, 0.5, 0.75, 0.95]).T
+    summary['bankrupt'] = table['bankrupt'].mean()
+    return summary
+
+
+def parse_args(args: Collection[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Reruns a parameter set on random subsets of the universe")
+    parser.add_argument("--data", default="../data/stock_data.csv", help="Monthly stock data CSV")
+    parser.add_argument("--currency", default="../data/code_to_currency.json",
+                        help="JSON mapping ticker codes to currencies")
+    parser.add_argument("--fx", default="../data/fx_rates.csv", help="FX rate CSV for converting prices to USD")
+    parser.add_argument("--panel", default=None, help="Directory of a memory-mapped panel to run on")
+    parser.add_argument("--J", type=int, default=6, help="J months")
+    parser.add_argument("--K", type=int, default=6, help="K months")
+    parser.add_argument("--ratio", type=float, default=0.1, help="Investment ratio")
+    parser.add_argument("--cash", type=float, default=1000, help="Starting cash")
+    parser.add_argument("--rebalance", default="monthly", choices=REBALANCE_FREQUENCIES,
+                        help="How often positions are created")
+    parser.add_argument("--subsets", type=int, default=300, help="Number of random subsets")
+    parser.add_argument("--min-fraction", type=float, default=0.5, help="Smallest fraction of tickers a subset keeps")
+    parser.add_argument("--max-fraction", type=float, default=0.8, help="Largest fraction of tickers a subset keeps")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the subsets")
+    parser.add_argument("--batch-size", type=int, default=None, help="Subsets selected at once")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Threads subsets' cash is simulated on")
+    parser.add_argument("--output-dir", default=None, help="Directory to save robustness.csv to")
+    return parser.parse_args(args)
+
+
+def main(args: Collection[str] | None = None):
+    # Imported here so that importing this module does not import main.py
+    from main import Main
+    args = parse_args(args)
+    m = Main(args.data, args.currency, args.fx, args.panel)
+    data = m.get_data()
+    tickers = len(data.get_tickers()) if isinstance(data, Panel) else \
+        sum(col.endswith('Returns') for col in data.columns)
+    masks = subset_masks(tickers, args.subsets, args.min_fraction, args.max_fraction, args.seed)
+    # The whole universe is run as the first row, to compare the subsets against
+    masks = np.vstack([np.ones((1, tickers), dtype=bool), masks])
+    results = run_subsets(data, args.J, args.K, args.ratio, args.cash, masks, args.rebalance, args.batch_size,
+                          args.workers)
+    periods_per_year = TRADING_DAYS_PER_YEAR if isinstance(m.get_calendar(), TradingCalendar) else MONTHS_PER_YEAR
+    table = robustness_table(results, masks, len(m.get_calendar()), periods_per_year)
+    full, subsets = table.iloc[0], table.iloc[1:]
+    print(f"Whole universe: final cash {full['final_cash']}, final equity {full['final_equity']}, "
+          f"Sharpe ratio {full['sharpe']}")
+    print(f"Subsets with a lower Sharpe ratio: {(subsets['sharpe'] < full['sharpe']).mean() * 100}%")
+    print(summarise(subsets).to_string())
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+        table.to_csv(os.path.join(args.output_dir, "robustness.csv"), index=False)
+
+
+if __name__ == '__main__':
+    main()
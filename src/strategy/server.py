@@ -0,0 +1,311 @@
+"""
+Long-running backtest server. Loads the stock data once, keeps a pool of worker processes that each hold the data and
+the signals and selections of every J they have run, and answers single backtest queries over HTTP (TCP or a Unix
+socket) in milliseconds rather than paying for loading data and starting a pool on every experiment. Repeated queries
+are answered from a result cache.
+
+    GET /backtest?J=6&K=6&ratio=0.1[&cash=1000&engine=array&rebalance=monthly]
+    GET /health
+"""
+import os
+import json
+import math
+import time
+import socket
+import argparse
+import logging
+import threading
+import socketserver
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Collection, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import pandas as pd
+
+from signals import SignalTable
+from strategy_controller import StrategyController
+from utils.grid import Grid
+from utils.panel import Panel
+from utils.precision import DTYPES
+from utils.run_result import RunResult
+from utils.trading_calendar import REBALANCE_FREQUENCIES
+from utils.universe import add_universe_args, universe_from_args
+
+
+# Stock data, and signals and selections of each J, of the current process, set once per worker by `init_worker()`
+_DATA = None
+_SIGNALS = {}
+_SELECTIONS = {}
+_SIGNALS_LOCK = threading.Lock()
+
+
+def init_worker(data: pd.DataFrame | Panel, warm_J: Collection[int] = ()):
+    """
+    Initialises a worker process (or the server process itself when it has no pool) with the stock data, and
+    computes the signals and selections of warm_J up front so the first queries for them are fast
+    """
+    global _DATA
+    _DATA = data
+    _SIGNALS.clear()
+    _SELECTIONS.clear()
+    for J in warm_J:
+        get_selections(J)
+
+
+def get_signals(J: int) -> SignalTable:
+    """
+    Gets the signals of J for this process's data, computing them the first time J is asked for
+    """
+    with _SIGNALS_LOCK:
+        if J not in _SIGNALS:
+            _SIGNALS[J] = SignalTable.from_panel(_DATA, J) if isinstance(_DATA, Panel) else SignalTable(_DATA, J)
+        return _SIGNALS[J]
+
+
+def get_selections(J: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Gets every month's winners and losers for J (see `SignalTable.calculate_selections()`), selecting them the first
+    time J is asked for. They depend on nothing else a query sets, so one selection serves every K, ratio, cash and
+    rebalance frequency, and a query only simulates cash
+    """
+    signals = get_signals(J)
+    with _SIGNALS_LOCK:
+        if J not in _SELECTIONS:
+            _SELECTIONS[J] = signals.calculate_selections()
+        return _SELECTIONS[J]
+
+
+def run_query(J: int, K: int, ratio: float, cash: float, engine: str, rebalance: str) -> RunResult:
+    """
+    Runs one backtest on this process's data and cached signals and selections
+    """
+    controller = StrategyController(J, K, ratio, cash, engine=engine, rebalance=rebalance)
+    controller.use_signals(_DATA, get_signals(J), get_selections(J))
+    controller.run(_DATA)
+    return controller.get_result()
+
+
+class BacktestService:
+    """
+    Answers backtest queries from a persistent pool of worker processes and an LRU cache of results
+
+    Parameters:
+        - data (pd.DataFrame | Panel): Stock data, as loaded by `Main`
+        - workers (int): Worker processes. 0 runs queries on the server's own threads, which avoids sending results
+                         between processes but runs one query at a time per CPU core the GIL allows
+        - cache_size (int): Results kept in the cache
+        - warm_J (Collection[int]): J values whose signals and selections each worker computes at start up
+    """
+
+    def __init__(self, data: pd.DataFrame | Panel, workers: int = 0, cache_size: int = 1024,
+                 warm_J: Collection[int] = ()):
+        self.__dates = pd.DatetimeIndex(data.get_dates() if isinstance(data, Panel) else data['Date'])
+        self.__tickers = len(data.get_tickers()) if isinstance(data, Panel) else \
+            sum(col.endswith('Returns') for col in data.columns)
+        self.__cache = OrderedDict()
+        self.__cache_size = cache_size
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        if workers > 0:
+            self.__executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                                  initargs=(data, tuple(warm_J)))
+            # Starts every worker now rather than on the first queries
+            for future in [self.__executor.submit(os.getpid) for x in range(workers)]:
+                future.result()
+        else:
+            self.__executor = None
+            init_worker(data, warm_J)
+
+    @staticmethod
+    def parse_query(query: dict) -> Tuple[int, int, float, float, str, str]:
+        """
+        Parses and validates the parameters of a backtest query
+
+        Raises:
+            - ValueError: If a parameter is missing or invalid
+        """
+        try:
+            J, K, ratio = int(query['J']), int(query['K']), float(query['ratio'])
+        except KeyError as e:
+            raise ValueError(f"Missing parameter {e}")
+        cash = float(query.get('cash', 1000))
+        # float() accepts 'nan' and 'inf', which would be run and then written out as invalid JSON
+        if not math.isfinite(ratio) or not math.isfinite(cash):
+            raise ValueError("ratio and cash must be finite")
+        engine = query.get('engine', 'array')
+        rebalance = query.get('rebalance', 'monthly')
+        if J < 1 or K < 1:
+            raise ValueError("J and K must be at least 1")
+        if engine not in StrategyController.ENGINES:
+            raise ValueError(f"Engine {engine} invalid. Must be one of {StrategyController.ENGINES}")
+        if rebalance not in REBALANCE_FREQUENCIES:
+            raise ValueError(f"Rebalance frequency {rebalance} invalid. Must be one of {REBALANCE_FREQUENCIES}")
+        return J, K, ratio, cash, engine, rebalance
+
+    def backtest(self, J: int, K: int, ratio: float, cash: float = 1000, engine: str = 'array',
+                 rebalance: str = 'monthly') -> Tuple[RunResult, bool]:
+        """
+        Runs a backtest, or gets it from the cache if the same query has been answered before
+
+        Returns:
+            - RunResult: Result of the backtest
+            - bool: Whether it came from the cache
+        """
+        key = (J, K, ratio, cash, engine, rebalance)
+        with self.__lock:
+            if key in self.__cache:
+                self.__cache.move_to_end(key)
+                self.__hits += 1
+                return self.__cache[key], True
+            self.__misses += 1
+        if self.__executor is not None:
+            result = self.__executor.submit(run_query, *key).result()
+        else:
+            result = run_query(*key)
+        with self.__lock:
+            self.__cache[key] = result
+            if len(self.__cache) > self.__cache_size:
+                self.__cache.popitem(last=False)
+        return result, False
+
+    def to_json(self, result: RunResult, cached: bool, seconds: float) -> dict:
+        """
+        Turns a result into a JSON-serialisable response, with NaN (and infinite values) as null
+        """
+        def values(tally) -> list:
+            return [value if math.isfinite(value) else None for value in RunResult.to_array(tally, len(self.__dates))]
+
+        return {
+            'J': result.get_J(), 'K': result.get_K(), 'ratio': result.get_ratio(),
+            'starting_cash': result.get_starting_cash(),
+            'final_cash': result.get_cash() if math.isfinite(result.get_cash()) else None,
+            'bankrupt': result.get_bankrupt(),
+            'dates': [date.strftime("%Y-%m-%d") for date in self.__dates],
+            'cash': values(result.get_cash_tally()),
+            'position': values(result.get_position_tally()),
+            'cached': cached,
+            'seconds': seconds,
+        }
+
+    def health(self) -> dict:
+        with self.__lock:
+            return {'months': len(self.__dates), 'tickers': self.__tickers, 'cached': len(self.__cache),
+                    'hits': self.__hits, 'misses': self.__misses}
+
+    def close(self):
+        if self.__executor is not None:
+            self.__executor.shutdown()
+
+
+def make_handler(service: BacktestService) -> type:
+    """
+    Creates the HTTP request handler class answering queries from service
+    """
+
+    class BacktestHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/health':
+                return self.respond(200, service.health())
+            if url.path != '/backtest':
+                return self.respond(404, {'error': f"Unknown path {url.path}"})
+            start = time.perf_counter()
+            try:
+                params = service.parse_query({name: values[-1] for name, values in parse_qs(url.query).items()})
+            except ValueError as e:
+                return self.respond(400, {'error': str(e)})
+            try:
+                result, cached = service.backtest(*params)
+                body = service.to_json(result, cached, time.perf_counter() - start)
+            except Exception as e:
+                logging.exception(f"Backtest {params} failed")
+                return self.respond(500, {'error': f"{type(e).__name__}: {e}"})
+            self.respond(200, body)
+
+        def respond(self, status: int, body: dict):
+            payload = json.dumps(body, allow_nan=False).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def address_string(self) -> str:
+            # Unix socket clients have no address
+            return self.client_address[0] if self.client_address else "unix"
+
+        def log_message(self, format: str, *args):
+            logging.info(f"{self.address_string()} {format % args}")
+
+    return BacktestHandler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    HTTP server listening on a Unix socket, for clients on the same machine
+    """
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = socket.gethostname(), 0
+
+
+def make_server(service: BacktestService, host: str = "127.0.0.1", port: int = 8765,
+                socket_path: str | None = None) -> socketserver.BaseServer:
+    """
+    Creates the server for service, on a Unix socket if socket_path is given, or on host and port otherwise
+    """
+    handler = make_handler(service)
+    if socket_path is not None:
+        return UnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def parse_args(args: Collection[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serves backtests of the J-month/K-month strategy from warm data")
+    parser.add_argument("--data", default="../data/stock_data.csv", help="Monthly stock data CSV")
+    parser.add_argument("--currency", default="../data/code_to_currency.json",
+                        help="JSON mapping ticker codes to currencies")
+    parser.add_argument("--fx", default="../data/fx_rates.csv", help="FX rate CSV for converting prices to USD")
+    parser.add_argument("--panel", default=None, help="Directory of a memory-mapped panel to serve from")
+    parser.add_argument("--dtype", default="float64", choices=tuple(DTYPES), help="Precision of prices and returns")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--socket", default=None, help="Unix socket to listen on instead of host and port")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes. 0 runs queries in the server process")
+    parser.add_argument("--cache-size", type=int, default=1024, help="Results kept in the cache")
+    parser.add_argument("--warm-J", default="",
+                        help="J values whose signals are computed at start up, in the same format as main.py --J")
+    add_universe_args(parser)
+    return parser.parse_args(args)
+
+
+def main(args: Collection[str] | None = None):
+    # Imported here so that importing this module does not import main.py
+    from main import Main
+    args = parse_args(args)
+    tickers = universe_from_args(args, args.data)
+    data = Main(args.data, args.currency, args.fx, args.panel, args.dtype, tickers).get_data()
+    service = BacktestService(data, args.workers, args.cache_size, Grid.parse_spec(args.warm_J) if args.warm_J else ())
+    server = make_server(service, args.host, args.port, args.socket)
+    print(f"Serving backtests on {args.socket if args.socket is not None else f'http://{args.host}:{args.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
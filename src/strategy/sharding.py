@@ -0,0 +1,117 @@
+"""
+Ranking split across shards of tickers, for universes where one month's cross-section is too large to rank quickly in
+one thread. Each shard ranks its own tickers and keeps only its local winner and loser candidates, which are merged
+into exactly the selections a single ranking over every ticker would make (see `SignalTable.calculate_selections()`).
+"""
+import numpy as np
+from concurrent.futures import Executor
+from typing import Collection, Tuple
+
+
+def shard_slices(tickers: int, shards: int) -> Collection[slice]:
+    """
+    Splits ticker columns into contiguous, near equal shards
+
+    Parameters:
+        - tickers (int): Number of ticker columns
+        - shards (int): Number of shards, capped at the number of tickers
+
+    Returns:
+        - Collection[slice]: Column slice of each shard, in column order
+    """
+    shards = max(1, min(shards, tickers))
+    edges = np.linspace(0, tickers, shards + 1).astype(np.int64)
+    return [slice(int(start), int(end)) for start, end in zip(edges[:-1], edges[1:])]
+
+
+def selection_counts(eligible_count: np.ndarray) -> np.ndarray:
+    """
+    Gets the number of winners (and losers) in each month from the number of eligible tickers: a decile, or the single
+    best and worst stock when fewer than 10 are eligible
+    """
+    return np.where(eligible_count >= 10, eligible_count // 10, np.minimum(eligible_count, 1))
+
+
+def local_candidates(scores: np.ndarray, eligible: np.ndarray, counts: np.ndarray, offset: int) -> \
+        Tuple[np.ndarray, np.ndarray]:
+    """
+    Ranks one shard's tickers and keeps the lowest and highest counts[t] eligible tickers of each month. Any ticker
+    in the global selection is in the selection of its own shard, so these candidates are all the merge needs
+
+    Parameters:
+        - scores (np.ndarray): (months x shard tickers) average J-month returns
+        - eligible (np.ndarray): (months x shard tickers) eligibility mask
+        - counts (np.ndarray): Global number of winners (and losers) in each month
+        - offset (int): Column of the shard's first ticker, to turn local indexes into global ones
+
+    Returns:
+        - np.ndarray: (months x width) global ticker indexes of loser candidates, -1 padded
+        - np.ndarray: (months x width) global ticker indexes of winner candidates, -1 padded
+    """
+    local_count = eligible.sum(axis=1)
+    take = np.minimum(counts, local_count)
+    # Ineligible tickers are pushed to the end of each row, leaving eligible ones in ascending order
+    order = np.argsort(np.where(eligible, scores, np.inf), axis=1, kind='stable')
+
+    columns = np.arange(max(min(int(counts.max(initial=0)), scores.shape[1]), 1))
+    selected = columns < take[:, None]
+    loser_positions = np.where(selected, columns, 0)
+    winner_positions = np.where(selected, local_count[:, None] - take[:, None] + columns, 0)
+    losers = np.where(selected, np.take_along_axis(order, loser_positions, axis=1) + offset, -1)
+    winners = np.where(selected, np.take_along_axis(order, winner_positions, axis=1) + offset, -1)
+    return losers, winners
+
+
+def merge_candidates(candidates: np.ndarray, scores: np.ndarray, counts: np.ndarray, highest: bool) -> np.ndarray:
+    """
+    Merges the candidates of every shard into the global selection. Candidates are ordered by score, then by column,
+    which is the order a stable sort over all tickers gives
+
+    Parameters:
+        - candidates (np.ndarray): (months x candidates) global ticker indexes from all shards, -1 padded
+        - scores (np.ndarray): (months x tickers) average J-month returns of all tickers
+        - counts (np.ndarray): Number of tickers to select in each month
+        - highest (bool): Whether to select the highest scores (winners) rather than the lowest (losers)
+
+    Returns:
+        - np.ndarray: (months x max count) selected ticker indexes in ascending order of returns, -1 padded
+    """
+    valid = candidates >= 0
+    candidate_scores = np.where(valid, np.take_along_axis(scores, np.where(valid, candidates, 0), axis=1), 0)
+    # Padding sorts before every candidate when selecting the highest, and after every candidate otherwise
+    padding_key = valid if highest else ~valid
+    order = np.lexsort((candidates, candidate_scores, padding_key), axis=-1)
+
+    columns = np.arange(max(int(counts.max(initial=0)), 1))
+    selected = columns < counts[:, None]
+    positions = candidates.shape[1] - counts[:, None] + columns if highest else columns[None, :]
+    positions = np.where(selected, positions, 0)
+    return np.where(selected, np.take_along_axis(candidates, np.take_along_axis(order, positions, axis=1), axis=1),
+                    -1)
+
+
+def select_sharded(scores: np.ndarray, eligible: np.ndarray, shards: int, executor: Executor) -> \
+        Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Selects the winners and losers of every month by ranking shards of tickers in parallel, then merging their
+    candidates. Gives the same result as `SignalTable.calculate_selections()` with one shard
+
+    Parameters:
+        - scores (np.ndarray): (months x tickers) average J-month returns
+        - eligible (np.ndarray): (months x tickers) eligibility mask
+        - shards (int): Number of shards to split tickers into
+        - executor (Executor): Pool the shards are ranked on. A thread pool shares the arrays without copying them
+
+    Returns:
+        - np.ndarray: (months x max decile size) ticker indexes of winners in ascending order of returns, -1 padded
+        - np.ndarray: (months x max decile size) ticker indexes of losers in ascending order of returns, -1 padded
+        - np.ndarray: Number of winners (and losers) in each month
+    """
+    # Only the eligible count is needed from every shard before the decile size of each month is known
+    counts = selection_counts(eligible.sum(axis=1))
+    slices = shard_slices(scores.shape[1], shards)
+    futures = [executor.submit(local_candidates, scores[:, s], eligible[:, s], counts, s.start) for s in slices]
+    shard_losers, shard_winners = zip(*[future.result() for future in futures])
+    losers = merge_candidates(np.hstack(shard_losers), scores, counts, highest=False)
+    winners = merge_candidates(np.hstack(shard_winners), scores, counts, highest=True)
+    return winners, losers, counts
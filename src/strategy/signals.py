@@ -0,0 +1,400 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from typing import Collection, Dict, Tuple
+
+from utils.stock import Stock
+from utils.month_calendar import MonthCalendar
+from utils.trading_calendar import TradingCalendar, make_calendar
+from utils.panel import Panel, CHUNK_MONTHS, CHUNK_TICKERS
+from utils.precision import infer_dtype
+from sharding import shard_slices, selection_counts, select_sharded
+from grouping import group_codes, group_selection_counts, select_grouped
+
+
+class SignalTable:
+    """
+    Precomputed J-month signals for every month and ticker of the stock data. Computed once per J so that ranking a
+    month is a lookup into arrays rather than a scan of the DataFrame. Rows of daily stock data are trading days, in
+    which case J is in trading days (see `utils.trading_calendar`).
+
+    For each month, t, a ticker is eligible if it has J months of returns before t with no missing values, and a
+    current price that is present and above 0. The average J-month returns are stored as a (months x tickers) score
+    array, and the reason each ticker is excluded (or 0 if eligible) as a (months x tickers) array.
+
+    Signals of a `utils.panel.Panel` too large for memory are created with `from_panel()`, which computes them in
+    blocks into memory-mapped files, and selections are then made a chunk of months at a time.
+
+    Parameters:
+        - df (pd.DataFrame): Stock data containing 'Date', a price column per ticker and a '<ticker>Returns' column
+        - J (int): J months (look-back period)
+        - shards (int): Number of ticker shards signals are computed and ranked on in parallel threads (see
+                        `sharding.py`). Selections are the same for any number of shards
+        - groups (Dict[str, str] | None): Group (E.g., sector or country) of each ticker. If given, winners and losers
+                                          are the deciles of each group rather than of every ticker (see
+                                          `grouping.py`), and shards are not used for ranking
+
+    Raises:
+        - MissingMonthsError: If monthly stock data skips a month, see `utils.month_calendar.MonthCalendar`
+    """
+
+    # Reasons a ticker can be excluded from ranking, in the order they are checked
+    EXCLUSION_REASONS = ('insufficient_history', 'missing_returns', 'missing_price', 'invalid_price')
+
+    def __init__(self, df: pd.DataFrame, J: int, shards: int = 1, groups: Dict[str, str] | None = None):
+        self.__J = J
+        self.__shards = shards
+        # Rows are months (or trading days), so look-backs are row offsets once the calendar has no gaps
+        self.__calendar = make_calendar(df['Date'])
+        self.__dates = self.__calendar.get_dates()
+        self.__tickers = [col[:-7] for col in df.columns if col != 'Date' and col.endswith('Returns')]
+        self.__groups = group_codes(self.__tickers, groups) if groups is not None else None
+        return_cols = [f"{ticker}Returns" for ticker in self.__tickers]
+        # float32 stock data (see `utils.precision`) is ranked in float32, anything else in float64
+        dtype = infer_dtype(df, return_cols + self.__tickers)
+        returns = df[return_cols].to_numpy(dtype=dtype)
+        self.__prices = df[self.__tickers].to_numpy(dtype=dtype)
+
+        if shards > 1:
+            # Scores and reasons only look down each column, so shards of tickers are computed independently
+            slices = shard_slices(len(self.__tickers), shards)
+            with ThreadPoolExecutor(max_workers=len(slices)) as executor:
+                scores = executor.map(lambda s: self.calculate_scores(returns[:, s], J), slices)
+                reasons = executor.map(lambda s: self.calculate_exclusion_reasons(returns[:, s], self.__prices[:, s],
+                                                                                  J), slices)
+                self.__scores = np.hstack(list(scores))
+                self.__reasons = np.hstack(list(reasons))
+        else:
+            self.__scores = self.calculate_scores(returns, J)
+            self.__reasons = self.calculate_exclusion_reasons(returns, self.__prices, J)
+        # Selections are made over every month at once when the signals are in memory
+        self.__chunk_months = max(len(self.__dates), 1)
+
+    @classmethod
+    def from_panel(cls, panel: Panel, J: int, shards: int = 1, chunk_months: int = CHUNK_MONTHS,
+                   chunk_tickers: int = CHUNK_TICKERS, groups: Dict[str, str] | None = None) -> 'SignalTable':
+        """
+        Creates the signals of an on-disk panel. Scores and exclusion reasons are computed in blocks of chunk_months x
+        chunk_tickers into 'scores_J<J>_<key>.npy' and 'reasons_J<J>_<key>.npy' in the panel's directory, and
+        memory-mapped from there, so every run with the same J (in any process) reuses them. The key is the panel's
+        manifest key (see `Panel`), so caches of a panel rebuilt in place from other data are never picked up
+
+        Parameters:
+            - panel (Panel): Panel to compute signals for
+            - J (int): J months (look-back period)
+            - shards (int): Number of threads blocks are computed on, and ticker shards selections are made on
+            - chunk_months (int): Months per block
+            - chunk_tickers (int): Tickers per block
+            - groups (Dict[str, str] | None): Group of each ticker to rank within, or None to rank every ticker together
+
+        Raises:
+            - MissingMonthsError: If the panel skips a month
+        """
+        # Panels written before manifests were recorded have no key
+        suffix = f"_{panel.get_key()}" if panel.get_key() is not None else ""
+        scores_filepath = os.path.join(panel.get_directory(), f"scores_J{J}{suffix}.npy")
+        reasons_filepath = os.path.join(panel.get_directory(), f"reasons_J{J}{suffix}.npy")
+        if not os.path.exists(scores_filepath):
+            cls.write_signals(panel, J, scores_filepath, reasons_filepath, shards, chunk_months, chunk_tickers)
+
+        signals = cls.__new__(cls)
+        signals.__J = J
+        signals.__shards = shards
+        signals.__calendar = make_calendar(panel.get_dates())
+        signals.__dates = signals.__calendar.get_dates()
+        signals.__tickers = panel.get_tickers()
+        signals.__groups = group_codes(signals.__tickers, groups) if groups is not None else None
+        signals.__prices = panel.get_prices()
+        signals.__scores = np.load(scores_filepath, mmap_mode='r')
+        signals.__reasons = np.load(reasons_filepath, mmap_mode='r')
+        signals.__chunk_months = chunk_months
+        return signals
+
+
+    """ PRECOMPUTING SIGNALS """
+
+
+    @staticmethod
+    def calculate_scores(returns: np.ndarray, J: int) -> np.ndarray:
+        """
+        Calculates average returns over the J months before each month
+
+        Parameters:
+            - returns (np.ndarray): (months x tickers) array of monthly returns
+            - J (int): Look-back period
+
+        Returns:
+            - np.ndarray: (months x tickers) array in the precision of returns, where row t is the mean of rows t-J to
+                          t-1. NaN where there are fewer than J months before t.
+        """
+        scores = np.full(returns.shape, np.nan, dtype=returns.dtype)
+        months = returns.shape[0]
+        if 0 < J < months:
+            # Row k of the total covers rows k to k+J-1, so it is the look-back window of month k+J. Windows are built
+            # from sums over 1, 2, 4, ... rows, taking one per set bit of J, so a J of a year of trading days costs
+            # about 2 log2(J) passes rather than J. Rows are added in the same order whatever the array's layout, so
+            # a block of tickers gives the same scores as the whole
+            windows = months - J
+            total, power, width, offset, remaining = None, returns, 1, 0, J
+            while remaining:
+                if remaining & 1:
+                    part = power[offset:offset + windows]
+                    total = np.array(part) if total is None else np.add(total, part, out=total)
+                    offset += width
+                remaining >>= 1
+                if remaining:
+                    # Row k of the next power covers rows k to k+2*width-1
+                    power = power[:-width] + power[width:]
+                    width *= 2
+            scores[J:] = total / J
+        return scores
+
+    @staticmethod
+    def calculate_exclusion_reasons(returns: np.ndarray, prices: np.ndarray, J: int) -> np.ndarray:
+        """
+        Works out why each ticker is excluded from ranking in each month, using rolling counts of missing returns
+
+        Parameters:
+            - returns (np.ndarray): (months x tickers) array of monthly returns
+            - prices (np.ndarray): (months x tickers) array of current prices
+            - J (int): Look-back period
+
+        Returns:
+            - np.ndarray: (months x tickers) array of codes, 0 if eligible, otherwise 1 + the index of the first
+                          failing reason in `EXCLUSION_REASONS`
+        """
+        months = returns.shape[0]
+        reasons = np.zeros(returns.shape, dtype=np.int8)
+
+        # Rolling count of missing returns over the J months before each month, from a cumulative count
+        missing_count = np.zeros((months + 1, returns.shape[1]), dtype=np.int64)
+        np.cumsum(np.isnan(returns), axis=0, out=missing_count[1:])
+        missing_returns = np.ones(returns.shape, dtype=bool)
+        if 0 < J < months:
+            missing_returns[J:] = (missing_count[J:-1] - missing_count[:-J - 1]) > 0
+
+        # Checked in reverse order so that the first failing reason is the one kept
+        with np.errstate(invalid='ignore'):
+            reasons[prices <= 0] = 4
+        reasons[np.isnan(prices)] = 3
+        reasons[missing_returns] = 2
+        history = min(J, months) if J > 0 else months
+        reasons[:history] = 1
+        return reasons
+
+
+    @staticmethod
+    def write_signals(panel: Panel, J: int, scores_filepath: str, reasons_filepath: str, shards: int = 1,
+                      chunk_months: int = CHUNK_MONTHS, chunk_tickers: int = CHUNK_TICKERS):
+        """
+        Computes the scores and exclusion reasons of a panel block by block, so at most shards blocks (plus their J
+        month look-backs) are in memory at once. Each block is computed exactly as the whole panel would be, as the
+        J months read before it give its first months their full look-back window.
+
+        The files are written under temporary names and moved into place, scores last, so processes computing the
+        same signals at once never read a partly written file.
+        """
+        months, tickers = panel.get_prices().shape
+        temp_scores = f"{scores_filepath}.{os.getpid()}.tmp"
+        temp_reasons = f"{reasons_filepath}.{os.getpid()}.tmp"
+        scores = np.lib.format.open_memmap(temp_scores, mode='w+', dtype=panel.get_returns().dtype,
+                                           shape=(months, tickers))
+        reasons = np.lib.format.open_memmap(temp_reasons, mode='w+', dtype=np.int8, shape=(months, tickers))
+        prices, returns = panel.get_prices(), panel.get_returns()
+
+        def write_block(block: Tuple[int, int, int, int, int]):
+            read_start, start, end, ticker_start, ticker_end = block
+            columns = slice(ticker_start, ticker_end)
+            block_returns = np.asarray(returns[read_start:end, columns])
+            block_prices = np.asarray(prices[read_start:end, columns])
+            # Rows read before start only provide look-back, and are written by the block before
+            scores[start:end, columns] = SignalTable.calculate_scores(block_returns, J)[start - read_start:]
+            reasons[start:end, columns] = SignalTable.calculate_exclusion_reasons(
+                block_returns, block_prices, J)[start - read_start:]
+
+        with ThreadPoolExecutor(max_workers=max(shards, 1)) as executor:
+            list(executor.map(write_block, panel.iter_blocks(J, chunk_months, chunk_tickers)))
+        scores.flush()
+        reasons.flush()
+        del scores, reasons
+        os.replace(temp_reasons, reasons_filepath)
+        os.replace(temp_scores, scores_filepath)
+
+
+    """ RANKING """
+
+
+    def ranked_stocks(self, month: int) -> list[Stock]:
+        """
+        Creates Stock objects for every eligible ticker in a month, in ascending order of average J-month returns.
+        Ties keep the order of the columns in the stock data.
+
+        Parameters:
+            - month (int): Row index of the month to rank
+
+        Returns:
+            - list[Stock]: Eligible stocks in ascending order of returns
+        """
+        eligible = np.flatnonzero(self.__reasons[month] == 0)
+        order = eligible[np.argsort(self.__scores[month, eligible], kind='stable')]
+        return Stock.from_arrays([self.__tickers[i] for i in order], self.__scores[month, order],
+                                 self.__prices[month, order])
+
+    def selected_stocks(self, month: int, indexes: np.ndarray) -> list[Stock]:
+        """
+        Creates Stock objects for selected tickers of a month, E.g., one row of the winners or losers from
+        `calculate_selections()`
+
+        Parameters:
+            - month (int): Row index of the month
+            - indexes (np.ndarray): Ticker indexes, -1 padded
+
+        Returns:
+            - list[Stock]: Stocks of the selected tickers, in the order given
+        """
+        indexes = indexes[indexes >= 0]
+        return Stock.from_arrays([self.__tickers[i] for i in indexes], self.__scores[month, indexes],
+                                 self.__prices[month, indexes])
+
+    def calculate_selections(self, workers: int = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Selects the winners and losers of every month at once, matching `JKStrategy.get_winners_and_losers()` applied
+        to `ranked_stocks()`: the top and bottom deciles, or the single best and worst stock when fewer than 10 are
+        eligible. With groups, these are taken within each group instead (see `grouping.select_grouped()`).
+        Selections do not depend on cash, so months are selected independently, in chunks on workers threads (NumPy
+        sorts release the GIL)
+
+        Parameters:
+            - workers (int): Threads chunks of months are selected on in parallel
+
+        Returns:
+            - np.ndarray: (months x max decile size) ticker indexes of winners in ascending order of returns, -1 padded
+            - np.ndarray: (months x max decile size) ticker indexes of losers in ascending order of returns, -1 padded
+            - np.ndarray: Number of winners (and losers) in each month
+        """
+        months = len(self.__dates)
+        chunks = self.month_chunks(workers)
+        counts = np.concatenate([self.count_selections(np.asarray(self.__reasons[start:end]) == 0)
+                                 for start, end in chunks]) if months else np.zeros(0, dtype=np.int64)
+        width = max(int(counts.max(initial=0)), 1)
+        winners = np.full((months, width), -1, dtype=np.int64)
+        losers = np.full((months, width), -1, dtype=np.int64)
+
+        def select_chunk(chunk: Tuple[int, int]):
+            # Only one chunk of months is read from the signals at a time by each worker
+            start, end = chunk
+            scores = np.asarray(self.__scores[start:end])
+            eligible = np.asarray(self.__reasons[start:end]) == 0
+            if self.__groups is not None:
+                chunk_winners, chunk_losers, _ = select_grouped(scores, eligible, self.__groups)
+            elif self.__shards > 1:
+                with ThreadPoolExecutor(max_workers=self.__shards) as shard_executor:
+                    chunk_winners, chunk_losers, _ = select_sharded(scores, eligible, self.__shards, shard_executor)
+            else:
+                chunk_winners, chunk_losers = self.select(scores, eligible, counts[start:end])
+            # Chunks write disjoint rows, so workers need no lock
+            winners[start:end, :chunk_winners.shape[1]] = chunk_winners
+            losers[start:end, :chunk_losers.shape[1]] = chunk_losers
+
+        if workers > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(select_chunk, chunks))
+        else:
+            for chunk in chunks:
+                select_chunk(chunk)
+        return winners, losers, counts
+
+    def count_selections(self, eligible: np.ndarray) -> np.ndarray:
+        """
+        Gets the number of winners (and losers) in each month of a chunk, summed over groups when ranking within groups
+        """
+        if self.__groups is not None:
+            return group_selection_counts(eligible, self.__groups)[1].sum(axis=1)
+        return selection_counts(eligible.sum(axis=1))
+
+    @staticmethod
+    def select(scores: np.ndarray, eligible: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Selects the winners and losers of a chunk of months with one stable sort over every ticker
+
+        Returns:
+            - np.ndarray: (months x max count) ticker indexes of winners in ascending order of returns, -1 padded
+            - np.ndarray: (months x max count) ticker indexes of losers in ascending order of returns, -1 padded
+        """
+        eligible_count = eligible.sum(axis=1)
+        # Ineligible tickers are pushed to the end of each row, leaving eligible ones in ascending order
+        masked = np.where(eligible, scores, np.inf)
+        order = np.argsort(masked, axis=1, kind='stable')
+
+        columns = np.arange(max(int(counts.max(initial=0)), 1))
+        selected = columns < counts[:, None]
+        loser_positions = np.where(selected, columns, 0)
+        winner_positions = np.where(selected, eligible_count[:, None] - counts[:, None] + columns, 0)
+        losers = np.where(selected, np.take_along_axis(order, loser_positions, axis=1), -1)
+        winners = np.where(selected, np.take_along_axis(order, winner_positions, axis=1), -1)
+        return winners, losers
+
+    def month_chunks(self, workers: int = 1) -> Collection[Tuple[int, int]]:
+        """
+        Splits the months into the (start, end) chunks selections are made over, with at least one chunk per worker
+        """
+        months = len(self.__dates)
+        size = max(min(self.__chunk_months, -(-months // max(workers, 1))), 1)
+        return [(start, min(start + size, months)) for start in range(0, months, size)]
+
+    def index_of(self, date: pd.Timestamp) -> int:
+        """
+        Gets the row index of a month
+
+        Raises:
+            - KeyError: If the month is not in the stock data
+        """
+        return self.__calendar.index_of(date)
+
+
+    """ DIAGNOSTICS """
+
+
+    def get_exclusions(self) -> pd.DataFrame:
+        """
+        Gets a table of how many tickers were eligible, and how many were excluded for each reason, in each month
+
+        Returns:
+            - pd.DataFrame: Indexed by date, with an 'eligible' column and a column per reason in `EXCLUSION_REASONS`
+        """
+        counts = {reason: [] for reason in ('eligible',) + SignalTable.EXCLUSION_REASONS}
+        for start, end in self.month_chunks():
+            reasons = np.asarray(self.__reasons[start:end])
+            for code, reason in enumerate(counts):
+                counts[reason].append((reasons == code).sum(axis=1))
+        return pd.DataFrame({reason: np.concatenate(count) if count else np.zeros(0, dtype=np.int64)
+                             for reason, count in counts.items()}, index=self.__dates)
+
+
+    """ GETTERS """
+
+
+    def get_J(self) -> int:
+        return self.__J
+
+    def get_shards(self) -> int:
+        return self.__shards
+
+    def get_groups(self) -> np.ndarray | None:
+        return self.__groups
+
+    def get_calendar(self) -> MonthCalendar | TradingCalendar:
+        return self.__calendar
+
+    def get_tickers(self) -> Collection[str]:
+        return self.__tickers
+
+    def get_scores(self) -> np.ndarray:
+        return self.__scores
+
+    def get_eligible(self) -> np.ndarray:
+        return np.asarray(self.__reasons) == 0
+
+    def get_prices(self) -> np.ndarray:
+        return self.__prices
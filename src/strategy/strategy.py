@@ -1,10 +1,12 @@
+import numpy as np
 import pandas as pd
 import logging
 from datetime import datetime
-from typing import Tuple
-from pandas.tseries.offsets import DateOffset
+from typing import Dict, Tuple
 
+from signals import SignalTable
 from utils.stock import Stock
+from utils.panel import Panel
 
 
 class JKStrategy:
@@ -21,54 +23,61 @@ class JKStrategy:
 
     Parameters:
         - J (int): J months (look-back period)
+        - shards (int): Number of ticker shards signals are computed and ranked on in parallel (see `sharding.py`)
+        - groups (Dict[str, str] | None): Group of each ticker, to select deciles within each group for a sector- or
+                                          country-neutral strategy (see `grouping.py`)
     """
 
-    def __init__(self, J: int):
+    def __init__(self, J: int, shards: int = 1, groups: Dict[str, str] | None = None):
         # Look-back period
         self.__J = J
+        self.__shards = shards
+        self.__groups = groups
+        # Signals precomputed for the DataFrame currently being ranked
+        self.__signals = None
+        self.__signals_df = None
 
-    def rank_stocks(self, df: pd.DataFrame, t: datetime, current_month: pd.Series, code_to_currency=None) -> list:
+    def rank_stocks(self, df: pd.DataFrame | Panel, t: int | datetime, current_month: pd.Series) -> list:
         """
-        Ranks stocks in ascending order on returns over the last J months
+        Ranks stocks in ascending order on returns over the last J months. Prices are expected to already be in USD
+        (see `utils.currency.convert_prices_to_usd()`)
         :param df: DataFrame containing stock average monthly returns and dates (MM/YYYY)
-        :param t: Current month (MM/YYYY)
+        :param t: Current month, as a month index (row of df) or a date in that month
         :param current_month:
-        :param code_to_currency:
         :return:
         """
-        # Selects the last J months of returns
-        split_df = df[(df['Date'] >= t - DateOffset(months=self.__J)) &
-                      (df['Date'] < t)]
-        # List of stocks containing data for current price and average returns over last J months
-        stocks = []
-
-        # Loops through each 'returns' column, gets the average of stocks returns over last J months, and appends
-        # a tuple of the stock and its average J month returns to 'stock_and_returns'
-        for col in df.columns:
-            if not col == 'Date' and 'Returns' in col:
-                # Gets the data required for the stock,
-                ticker_code, average_J_returns, price = JKStrategy.get_stock_data(col, split_df, current_month)
-
-                # If the there is a current price of the stock and average returns
-                if not pd.isnull(price) and not pd.isnull(average_J_returns):
-                    # Creates new Stock object containing data
-                    stock = JKStrategy.create_stock(ticker_code, average_J_returns, price)
-                    if stock:
-                        stocks.append(stock)
-                """
-                else:
-                    print("### FLAG ### NaN found")
-                """
+        # Eligibility and average J month returns are precomputed once for the whole DataFrame
+        signals = self.get_signals(df)
+        if not isinstance(t, (int, np.integer)):
+            t = signals.index_of(t)
+        return signals.ranked_stocks(t)
+
+    def get_signals(self, df: pd.DataFrame | Panel) -> SignalTable:
+        """
+        Gets the precomputed J-month signals for a DataFrame, computing them the first time the DataFrame is seen.
+        Signals of an on-disk Panel are computed in chunks, or loaded if another run already computed them
+
+        Parameters:
+            - df (pd.DataFrame | Panel): DataFrame containing stock prices, returns and dates, or an on-disk Panel
 
-                # Flags for any currencies that are not USD
-                # TODO: Add code to convert currency here or when reading file
-                if code_to_currency:
-                    if code_to_currency[ticker_code] != "USD":
-                        logging.error("Non-USD Currency found")
+        Returns:
+            - SignalTable: Scores, eligibility mask and exclusion diagnostics for every month
+        """
+        if self.__signals is None or self.__signals_df is not df:
+            if isinstance(df, Panel):
+                self.__signals = SignalTable.from_panel(df, self.__J, self.__shards, groups=self.__groups)
+            else:
+                self.__signals = SignalTable(df, self.__J, self.__shards, self.__groups)
+            self.__signals_df = df
+        return self.__signals
 
-        # Orders stocks by returns in ascending order
-        ranked_stocks = sorted(stocks)
-        return ranked_stocks
+    def set_signals(self, df: pd.DataFrame | Panel, signals: SignalTable):
+        """
+        Uses signals already computed for df (with the same J), E.g., shared between runs by a long-running server,
+        instead of computing them again
+        """
+        self.__signals = signals
+        self.__signals_df = df
 
     @staticmethod
     def get_stock_data(returns_col: str, last_J_months_df: pd.DataFrame, current_month: pd.Series) -> \
@@ -121,7 +130,9 @@ class JKStrategy:
     @staticmethod
     def get_winners_and_losers(ranked_stocks: list[Stock]) -> Tuple[list[Stock], list[Stock]]:
         """
-        Gets the worst performing decile ('losers') and best performing decile ('winners')
+        Gets the worst performing decile ('losers') and best performing decile ('winners'). Runs take every month's
+        selections at once from `SignalTable.calculate_selections()` instead, which is tested against this applied to
+        `rank_stocks()` as the reference
         :param ranked_stocks: Stocks and their average J months of returns in ascending order by their J returns
         :return: 'winners' decile (top 10% performers), and 'losers' decile (bottom 10% decile)
         """
@@ -1,79 +1,296 @@
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime
-from typing import Collection
+from typing import Collection, Dict, Tuple, TYPE_CHECKING
 
 from strategy import JKStrategy
+from signals import SignalTable
 from investor import Investor
+from kernels import simulate, rebalance_settle_from
+from utils.run_result import RunResult
+from utils import checkpoint
+from utils.panel import Panel
+from utils.memory_profile import MemoryProfile
+from utils.trading_calendar import REBALANCE_FREQUENCIES, rebalance_mask
+
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
 
 
 class StrategyController:
+    """
+    Runs the J-month/K-month strategy over the stock data month by month.
+
+    A run has two stages. Rankings do not depend on cash, so the first selects every month's winners and losers
+    from the SignalTable up front, in chunks of months on workers threads. The second runs the sequential cash
+    accounting over those selections. Two engines give the same cash results: 'object' trades Stock objects through
+    an Investor each month, while 'array' runs the accounting as one kernel (compiled with numba when installed, see
+    `kernels.py`).
+
+    Each row of the stock data is one period, so on daily data (see `utils.trading_calendar`) J and K are in trading
+    days and positions are created on the first trading day of each rebalance period.
+
+    Parameters:
+        - J (int): J months, or trading days on daily data (look-back period)
+        - K (int): K months, or trading days on daily data (holding period)
+        - ratio (float): Investment ratio
+        - cash (float): Starting cash
+        - engine (str): 'object' or 'array'
+        - shards (int): Number of ticker shards ranking is split across, for very large universes (see `sharding.py`)
+        - rebalance (str): How often positions are created, one of `utils.trading_calendar.REBALANCE_FREQUENCIES`.
+                           'monthly' on monthly data creates a position every row
+        - workers (int): Threads the first stage selects chunks of months on, so one long run can use every core
+        - groups (Dict[str, str] | None): Group (E.g., sector or country) of each ticker. If given, deciles are taken
+                                          within each group, for a sector- or country-neutral strategy
+    """
+
+    ENGINES = ('object', 'array')
 
-    def __init__(self, J: int, K: int, ratio: float, cash, code_to_currency=None):
-        self.__strategy = JKStrategy(J=J)
+    def __init__(self, J: int, K: int, ratio: float, cash, engine: str = 'object', shards: int = 1,
+                 rebalance: str = 'monthly', workers: int = 1, groups: Dict[str, str] | None = None):
+        if engine not in StrategyController.ENGINES:
+            raise ValueError(f"Engine {engine} invalid. Must be one of {StrategyController.ENGINES}")
+        if rebalance not in REBALANCE_FREQUENCIES:
+            raise ValueError(f"Rebalance frequency {rebalance} invalid. Must be one of {REBALANCE_FREQUENCIES}")
+        self.__engine = engine
+        self.__rebalance = rebalance
+        # Rows positions are created on, set when the data is known
+        self.__rebalance_rows = None
+        self.__strategy = JKStrategy(J=J, shards=shards, groups=groups)
+        self.__groups = groups
+        self.__shards = shards
+        self.__workers = workers
+        # Winners, losers and selection counts of every month, from the first stage, and the signals they were made
+        # from
+        self.__selections = None
+        self.__selections_signals = None
         self.__investor = Investor(starting_cash=cash, investment_ratio=ratio)
         self.__J = J
         self.__K = K
+        self.__starting_cash = cash
         self.__bankrupt = False
+        # Number of months in the data of the last run
+        self.__months = 0
+        # Final cash, cash tally and position tally from the 'array' engine
+        self.__array_result = None
+        # Next month to run, so a run restored from a checkpoint carries on where it stopped
+        self.__month = 0
 
-    def plot_cash(self, date_tally: Collection[pd.Timestamp], ax: plt.axes) -> plt.axes:
+    def plot_cash(self, date_tally: Collection[pd.Timestamp], ax: 'Axes') -> 'Axes':
         cash_tally = self.__investor.get_cash_tally()
         ax.plot(date_tally, cash_tally, label=f"J: {self.__J}, K: {self.__K},"
                                               f" ratio: {self.__investor.get_investment_ratio()}")
         return ax
 
-    def plot_position(self, date_tally: Collection[pd.Timestamp], ax: plt.axes) -> plt.axes:
+    def plot_position(self, date_tally: Collection[pd.Timestamp], ax: 'Axes') -> 'Axes':
         position_tally = self.__investor.get_position_tally()
         ax.plot(date_tally, position_tally, label=f"J: {self.__J}, K: {self.__K},"
                                               f" ratio: {self.__investor.get_investment_ratio()}")
         return ax
 
-    def run_month(self, df: pd.DataFrame,  i: int,  t: datetime, row: pd.Series, code_to_currency=None):
+    def run_month(self, df: pd.DataFrame,  i: int, row: pd.Series):
         """
         Runs the strategy for one month
 
-        Params:
-        :param df:
-        :param i:
-        :param t:
-        :param row:
-        :param code_to_currency:
-        :return:
-        """
-        ranked_stocks = self.__strategy.rank_stocks(df, t, row, code_to_currency)
-        if ranked_stocks:
-            winners, losers = self.__strategy.get_winners_and_losers(ranked_stocks)
-            self.__investor.create_position(winners, losers, t)
-        if i > self.__J + self.__K:
-            self.__investor.settle_position(t, row, self.__K)
-
-    def run(self, df: pd.DataFrame, code_to_currency=None):
-        for i, row in df.iterrows():
-            i = int(i)
-            t = row['Date']
+        Parameters:
+            - df (pd.DataFrame): Stock data being run on
+            - i (int): Index of the month (its row in df)
+            - row (pd.Series): Prices and returns of the month
+        """
+        if self.__rebalance_rows[i]:
+            # Second stage: trades the month's selections made by the first stage in `run()`
+            winners, losers, counts = self.__selections
+            if counts[i]:
+                signals = self.__strategy.get_signals(df)
+                self.__investor.create_position(signals.selected_stocks(i, winners[i]),
+                                                signals.selected_stocks(i, losers[i]), i)
+        if i > self.__J + self.__K and self.__rebalance_rows[i - self.__K]:
+            self.__investor.settle_position(i, row, self.__K)
+
+    def run(self, df: pd.DataFrame | Panel, checkpoint_filepath: str | None = None, checkpoint_every: int = 12,
+            stop_month: int | None = None, profile: MemoryProfile | None = None):
+        """
+        Runs the strategy over the data, from the first month or from where a restored checkpoint stopped. Months are
+        the rows of df, which are checked for gaps before the first month is run
+
+        Parameters:
+            - df (pd.DataFrame | Panel): Stock data to run on, in memory or as an on-disk Panel. Only the current
+                                         month's prices are read from a Panel each month
+            - checkpoint_filepath (str | None): Where to save a checkpoint every checkpoint_every months and when the
+                                                run stops ('object' engine only)
+            - checkpoint_every (int): Months between checkpoints
+            - stop_month (int | None): Month to stop before, E.g., to save the state just before a month that goes
+                                       wrong. Runs to the end if None
+            - profile (MemoryProfile | None): Started memory profile to snapshot at its months (see
+                                              `utils.memory_profile`)
+
+        Raises:
+            - ValueError: If checkpoint_every is less than 1
+            - MissingMonthsError: If df skips a month
+        """
+        if checkpoint_every < 1:
+            raise ValueError(f"Checkpoint interval {checkpoint_every} invalid. Must be at least 1 month")
+        self.__months = len(df)
+        # Builds the signals and month calendar up front, so gaps in the data are found before any month is run
+        signals = self.__strategy.get_signals(df)
+        self.__rebalance_rows = rebalance_mask(signals.get_calendar().get_dates(), self.__rebalance)
+        # First stage: every month's selections, independent of cash, unless they were given for these signals
+        if self.__selections is None or self.__selections_signals is not signals:
+            self.__selections = signals.calculate_selections(self.__workers)
+            self.__selections_signals = signals
+        if self.__engine == 'array':
+            self.run_array(df)
+            if profile is not None and profile.get_snapshot_months():
+                profile.on_month(self.__months - 1, force=True)
+            return
+        end = self.__months if stop_month is None else min(stop_month, self.__months)
+        # Month indexes are row positions, independent of the DataFrame's index labels
+        for i, row in enumerate(self.iter_rows(df, self.__month, end), start=self.__month):
             if i >= self.__J:
-                self.run_month(df, i, t, row, code_to_currency)
+                self.run_month(df, i, row)
             self.__investor.update_trackers(row)
+            self.__month = i + 1
+            if profile is not None:
+                profile.on_month(i)
 
             if self.__investor.get_cash() < 0:
                 print("#####   BANKRUPT   #####")
                 self.__bankrupt = True
-                self.__investor.fill_cash_tracker(len(df['Date']))
+                self.__investor.fill_cash_tracker(self.__months)
+                self.__month = self.__months
                 break
+            if checkpoint_filepath is not None and self.__month % checkpoint_every == 0:
+                self.save_checkpoint(checkpoint_filepath)
+        if checkpoint_filepath is not None:
+            self.save_checkpoint(checkpoint_filepath)
 
+    def use_signals(self, df: pd.DataFrame | Panel, signals: SignalTable,
+                    selections: Tuple[np.ndarray, np.ndarray, np.ndarray] | None = None):
+        """
+        Runs on signals already computed for df with this run's J, rather than computing them in `run()`, and on
+        selections already made from them if given. Selections do not depend on K, the ratio, cash or the rebalance
+        frequency, so one `SignalTable.calculate_selections()` can be shared by every run with the same signals
 
+        Raises:
+            - ValueError: If the signals were computed with a different J
+        """
+        if signals.get_J() != self.__J:
+            raise ValueError(f"Signals computed with J={signals.get_J()} cannot be used for a run with J={self.__J}")
+        self.__strategy.set_signals(df, signals)
+        if selections is not None:
+            self.__selections = selections
+            self.__selections_signals = signals
 
+    @staticmethod
+    def iter_rows(df: pd.DataFrame | Panel, start: int, end: int):
+        """
+        Iterates over the rows of months start to end as Series indexed by column (or by ticker for a Panel)
+        """
+        if isinstance(df, Panel):
+            return (df.row(i) for i in range(start, end))
+        return (row for _, row in df.iloc[start:end].iterrows())
 
+    def is_finished(self) -> bool:
+        """
+        Whether the run has reached the end of the data or gone bankrupt
+        """
+        return self.__array_result is not None or (self.__months > 0 and self.__month >= self.__months)
+
+    def save_checkpoint(self, filepath: str):
+        """
+        Saves the run's parameters, month cursor and Investor state (cash, portfolios and trackers) to a compressed
+        binary checkpoint, which `load_checkpoint()` can carry on from
+        """
+        state = {f'investor_{name}': value for name, value in self.__investor.get_state().items()}
+        state.update({'J': self.__J, 'K': self.__K, 'starting_cash': self.__starting_cash, 'engine': self.__engine,
+                      'shards': self.__shards, 'rebalance': self.__rebalance, 'workers': self.__workers,
+                      'month': self.__month, 'months': self.__months, 'bankrupt': self.__bankrupt})
+        if self.__groups is not None:
+            state.update({'group_tickers': np.array(list(self.__groups.keys()), dtype=str),
+                          'group_labels': np.array(list(self.__groups.values()), dtype=str)})
+        checkpoint.save_checkpoint(filepath, state)
+
+    @classmethod
+    def load_checkpoint(cls, filepath: str) -> 'StrategyController':
+        """
+        Restores a StrategyController saved with `save_checkpoint()`. Calling `run()` on it with the same data
+        carries on from the month after the checkpoint
+        """
+        state = checkpoint.load_checkpoint(filepath)
+        controller = cls(int(state['J']), int(state['K']), float(state['investor_investment_ratio']),
+                         state['starting_cash'], str(state['engine']), int(state.get('shards', 1)),
+                         str(state.get('rebalance', 'monthly')), int(state.get('workers', 1)),
+                         dict(zip(state['group_tickers'].tolist(), state['group_labels'].tolist()))
+                         if 'group_tickers' in state else None)
+        controller.__investor = Investor.from_state({name[len('investor_'):]: value for name, value in state.items()
+                                                     if name.startswith('investor_')})
+        controller.__month = int(state['month'])
+        controller.__months = int(state['months'])
+        controller.__bankrupt = bool(state['bankrupt'])
+        return controller
+
+    def run_array(self, df: pd.DataFrame | Panel):
+        """
+        Runs the strategy with the 'array' engine, from precomputed selections for every month
+        """
+        signals = self.__strategy.get_signals(df)
+        winners, losers, counts = self.__selections
+        # Positions are only created on rebalance rows once there are J months to look back on
+        counts = np.where((np.arange(self.__months) >= self.__J) & self.__rebalance_rows, counts, 0)
+        cash, cash_tally, position_tally, bankrupt_month = simulate(
+            signals.get_prices(), winners, losers, counts,
+            rebalance_settle_from(self.__rebalance_rows, self.__J, self.__K), self.get_ratio(), self.__starting_cash)
+        if bankrupt_month >= 0:
+            print("#####   BANKRUPT   #####")
+            self.__bankrupt = True
+        self.__array_result = (cash, cash_tally, position_tally)
+
+    def get_result(self) -> RunResult:
+        """
+        Gets a compact record of the run, with tallies copied into float64 arrays covering every month of the data
+        """
+        return RunResult(self.__J, self.__K, self.get_ratio(), self.__starting_cash, self.get_cash(), self.__bankrupt,
+                         RunResult.to_array(self.get_cash_tally(), self.__months),
+                         RunResult.to_array(self.get_position_tally(), self.__months))
+
+    def get_J(self) -> int:
+        return self.__J
+
+    def get_K(self) -> int:
+        return self.__K
+
+    def get_ratio(self) -> float:
+        return self.__investor.get_investment_ratio()
 
     def get_bankrupt(self) -> bool:
         return self.__bankrupt
 
+    def get_engine(self) -> str:
+        return self.__engine
+
+    def get_shards(self) -> int:
+        return self.__shards
+
+    def get_groups(self) -> Dict[str, str] | None:
+        return self.__groups
+
+    def get_workers(self) -> int:
+        return self.__workers
+
+    def get_rebalance(self) -> str:
+        return self.__rebalance
+
     def get_cash_tally(self) -> Collection[float]:
+        if self.__array_result is not None:
+            return self.__array_result[1]
         return self.__investor.get_cash_tally()
 
     def get_position_tally(self) -> Collection[float]:
+        if self.__array_result is not None:
+            return self.__array_result[2]
         return self.__investor.get_position_tally()
 
     def get_cash(self) -> float:
+        if self.__array_result is not None:
+            return self.__array_result[0]
         return self.__investor.get_cash()
 
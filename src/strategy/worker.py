@@ -0,0 +1,133 @@
+import os
+import socket
+import time
+import argparse
+import logging
+import threading
+import traceback
+import pandas as pd
+from typing import Collection, Dict
+
+from strategy_controller import StrategyController
+from utils.work_queue import WorkQueue
+from utils.panel import Panel
+from utils.precision import DTYPES
+from utils.trading_calendar import REBALANCE_FREQUENCIES
+from utils.screener import GROUP_COLUMNS, find_screener, load_groups
+from utils.universe import add_universe_args, universe_from_args
+
+
+def run_worker(queue_filepath: str, df: pd.DataFrame | Panel, worker: str | None = None,
+               lease_timeout: float = 600, poll_interval: float = 5, exit_when_empty: bool = True,
+               engine: str = 'object', shards: int = 1, rebalance: str = 'monthly', selection_workers: int = 1,
+               groups: Dict[str, str] | None = None) -> int:
+    """
+    Takes tasks from a work queue and runs them until the queue is finished (or forever if exit_when_empty is False).
+    While a task runs, its lease is renewed in the background so long runs are not handed to another worker.
+
+    Parameters:
+        - queue_filepath (str): Path to the queue file (see `WorkQueue`)
+        - df (pd.DataFrame | Panel): Stock data to run on
+        - worker (str | None): Identifier of this worker. Defaults to '<hostname>:<pid>'
+        - lease_timeout (float): Seconds a lease lasts without being renewed
+        - poll_interval (float): Seconds to wait before checking again when no task is available
+        - exit_when_empty (bool): Whether to stop once every task is done or failed
+        - engine (str): Engine each run uses, 'object' or 'array' (see `StrategyController`)
+        - shards (int): Number of ticker shards each run ranks on in parallel threads (see `sharding.py`)
+        - rebalance (str): How often each run creates positions, 'daily', 'weekly' or 'monthly'
+        - selection_workers (int): Threads each run selects its winners and losers on before simulating cash
+        - groups (Dict[str, str] | None): Group of each ticker, to select deciles within each group
+
+    Returns:
+        - int: Number of tasks completed by this worker
+    """
+    worker = worker if worker is not None else f"{socket.gethostname()}:{os.getpid()}"
+    completed = 0
+    with WorkQueue(queue_filepath, lease_timeout=lease_timeout) as queue:
+        while True:
+            task = queue.lease(worker)
+            if task is None:
+                if exit_when_empty and queue.is_finished():
+                    return completed
+                time.sleep(poll_interval)
+                continue
+
+            task_id, J, K, ratio, cash = task
+            stop_renewing = threading.Event()
+            renewer = threading.Thread(target=renew_lease, args=(queue_filepath, task_id, worker, lease_timeout,
+                                                                 stop_renewing), daemon=True)
+            renewer.start()
+            try:
+                strategy_controller = StrategyController(J, K, ratio, cash, engine, shards, rebalance,
+                                                         selection_workers, groups)
+                strategy_controller.run(df)
+                result = strategy_controller.get_result()
+            except Exception:
+                logging.error(f"Task {task_id} failed on worker {worker}")
+                queue.fail(task_id, worker, traceback.format_exc())
+                continue
+            finally:
+                stop_renewing.set()
+                renewer.join()
+            if queue.complete(task_id, worker, result):
+                completed += 1
+
+
+def renew_lease(queue_filepath: str, task_id: int, worker: str, lease_timeout: float, stop: threading.Event):
+    """
+    Renews a task's lease every third of the lease timeout until stop is set. Uses its own connection, as SQLite
+    connections cannot be shared between threads
+    """
+    with WorkQueue(queue_filepath, lease_timeout=lease_timeout) as queue:
+        while not stop.wait(lease_timeout / 3):
+            if not queue.renew(task_id, worker):
+                return
+
+
+def parse_args(args: Collection[str] | None = None) -> argparse.Namespace:
+    """
+    Parses command line arguments for a worker
+    """
+    parser = argparse.ArgumentParser(description="Worker that runs grid search tasks from a shared work queue")
+    parser.add_argument("--queue", required=True, help="Work queue SQLite file")
+    parser.add_argument("--data", default="../data/stock_data.csv", help="Monthly stock data CSV")
+    parser.add_argument("--currency", default="../data/code_to_currency.json",
+                        help="JSON mapping ticker codes to currencies")
+    parser.add_argument("--fx", default="../data/fx_rates.csv", help="FX rate CSV for converting prices to USD")
+    parser.add_argument("--panel", default=None, help="Directory of a memory-mapped panel to run on")
+    parser.add_argument("--dtype", default="float64", choices=tuple(DTYPES), help="Precision of prices and returns")
+    parser.add_argument("--engine", default="object", choices=StrategyController.ENGINES,
+                        help="Engine each run uses")
+    parser.add_argument("--rebalance", default="monthly", choices=REBALANCE_FREQUENCIES,
+                        help="How often positions are created")
+    parser.add_argument("--shards", type=int, default=1, help="Ticker shards each run ranks on in parallel threads")
+    parser.add_argument("--selection-workers", type=int, default=1,
+                        help="Threads each run selects winners and losers on before simulating cash")
+    parser.add_argument("--neutral", default=None, choices=GROUP_COLUMNS,
+                        help="Rank within each sector, industry or country of the screener")
+    parser.add_argument("--screener", default=None, help="NASDAQ screener CSV for --neutral")
+    add_universe_args(parser)
+    parser.add_argument("--lease-timeout", type=float, default=600, help="Seconds before an unrenewed lease expires")
+    parser.add_argument("--poll-interval", type=float, default=5, help="Seconds to wait when no task is available")
+    parser.add_argument("--forever", action="store_true", help="Keep waiting for tasks once the queue is finished")
+    return parser.parse_args(args)
+
+
+def main(args: Collection[str] | None = None):
+    # Imported here so that importing this module to call `run_worker()` does not import main.py
+    from main import Main
+    args = parse_args(args)
+    df = Main(args.data, args.currency, args.fx, args.panel, args.dtype,
+              universe_from_args(args, args.data)).get_data()
+    groups = None
+    if args.neutral is not None:
+        groups = load_groups(args.screener if args.screener is not None else find_screener(), args.neutral)
+    completed = run_worker(args.queue, df, lease_timeout=args.lease_timeout, poll_interval=args.poll_interval,
+                           exit_when_empty=not args.forever, engine=args.engine,
+                           shards=args.shards, rebalance=args.rebalance, selection_workers=args.selection_workers,
+                           groups=groups)
+    print(f"Worker finished after completing {completed} tasks")
+
+
+if __name__ == '__main__':
+    main()
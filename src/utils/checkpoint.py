@@ -0,0 +1,25 @@
+import os
+import numpy as np
+
+
+def save_checkpoint(filepath: str, state: dict):
+    """
+    Saves a state dictionary of scalars and arrays as a compressed numpy archive. The file is written next to its
+    final path and then moved into place, so a crash while saving never leaves a half written checkpoint
+
+    Parameters:
+        - filepath (str): Path to save to, ending in '.npz'
+        - state (dict): Mapping from name to a scalar or numpy array (no Python objects, so no pickling is needed)
+    """
+    temp_filepath = f"{filepath}.tmp.npz"
+    np.savez_compressed(temp_filepath, **state)
+    os.replace(temp_filepath, filepath)
+
+
+def load_checkpoint(filepath: str) -> dict:
+    """
+    Loads a state dictionary saved with `save_checkpoint()`, with 0-d arrays turned back into scalars
+    """
+    with np.load(filepath, allow_pickle=False) as archive:
+        return {name: archive[name].item() if archive[name].ndim == 0 else archive[name] for name in archive.files}
+
@@ -0,0 +1,76 @@
+import logging
+from typing import Dict
+import numpy as np
+import pandas as pd
+
+
+BASE_CURRENCY = "USD"
+
+
+def load_fx_rates(fx_filepath: str) -> pd.DataFrame:
+    """
+    Loads a local FX rate file. The file is a CSV with a 'Date' column and one column per currency code, where each
+    value is the price of one unit of that currency in USD on that date (E.g., a 'GBP' column holding 1.27)
+
+    Parameters:
+        - fx_filepath (str): Path to the FX rate CSV file
+
+    Returns:
+        - pd.DataFrame: FX rates sorted by date
+    """
+    fx_rates = pd.read_csv(fx_filepath)
+    fx_rates['Date'] = pd.to_datetime(fx_rates['Date'])
+    return fx_rates.sort_values('Date').reset_index(drop=True)
+
+
+def convert_prices_to_usd(df: pd.DataFrame, code_to_currency: Dict[str, str], fx_rates: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts every non-USD price column of the stock data into USD. Rates are aligned to each month using the last
+    rate known on or before that month, then all non-USD price columns are multiplied by their currency's rate vector
+    in one step. Returns columns are percentage changes and are left untouched.
+
+    Months before a currency's first FX rate have no rate to align to, so its prices in those months become NaN and
+    its tickers are ineligible until the rates start. This is logged as a warning, as it usually means the FX rate
+    file does not go back as far as the stock data.
+
+    Parameters:
+        - df (pd.DataFrame): Stock data with a 'Date' column, price columns and '<ticker>Returns' columns
+        - code_to_currency (Dict[str, str]): Mapping from ticker code to currency code
+        - fx_rates (pd.DataFrame): FX rates as loaded by `load_fx_rates()`
+
+    Returns:
+        - pd.DataFrame: Copy of the stock data with prices in USD
+    """
+    price_cols = [col for col in df.columns if col in code_to_currency
+                  and code_to_currency[col] not in (BASE_CURRENCY, None)]
+    if not price_cols:
+        return df
+
+    # Tickers in a currency we have no rates for are left as they are, flagged once rather than every month
+    missing = sorted({code_to_currency[col] for col in price_cols} - set(fx_rates.columns))
+    if missing:
+        logging.warning(f"No FX rates found for currencies {missing}, prices in these currencies are not converted")
+        price_cols = [col for col in price_cols if code_to_currency[col] not in missing]
+        if not price_cols:
+            return df
+
+    # Aligns the FX rates to the stock data's dates, giving one row of rates per month
+    currencies = sorted({code_to_currency[col] for col in price_cols})
+    dates = pd.DataFrame({'Date': df['Date'].to_numpy(), 'position': np.arange(len(df))}).sort_values('Date')
+    fx_rates = fx_rates[['Date'] + currencies].astype({'Date': dates['Date'].dtype})
+    aligned = pd.merge_asof(dates, fx_rates, on='Date').sort_values('position')
+    rates = aligned[currencies].to_numpy(dtype=np.float64)
+    # Months before a currency's first rate are aligned to nothing
+    unrated = [currency for currency, column in zip(currencies, rates.T) if np.isnan(column).any()]
+    if unrated:
+        first_dates = {currency: str(fx_rates.loc[fx_rates[currency].notna(), 'Date'].min().date())
+                       for currency in unrated}
+        logging.warning(f"FX rates start after the stock data for currencies {first_dates} (first rate dates), "
+                        f"prices in these currencies are NaN and their tickers ineligible before then")
+
+    # Picks the rate vector for each price column and converts every column at once
+    currency_index = {currency: i for i, currency in enumerate(currencies)}
+    column_rates = rates[:, [currency_index[code_to_currency[col]] for col in price_cols]]
+    df = df.copy()
+    df[price_cols] = df[price_cols].to_numpy(dtype=np.float64) * column_rates
+    return df
@@ -3,4 +3,24 @@ class InvalidTallyType(Exception):
     """
     Exception for when an invalid tally is provided (anything other than 'cash' or 'position')
     """
-    pass
\ No newline at end of file
+    pass
+
+class MissingMonthsError(Exception):
+    """
+    Exception for when the stock data skips months, so months can not be mapped to consecutive indexes
+    """
+    pass
+
+class PanelMismatchError(Exception):
+    """
+    Exception for when an on-disk panel was built from different source files or settings than it is opened with, so
+    running on it would give stale or unexpected results
+    """
+    pass
+
+class GridMismatchError(Exception):
+    """
+    Exception for when a grid search is resumed with different data or settings than it was started with, so finished
+    runs would be mixed with runs under the new settings
+    """
+    pass
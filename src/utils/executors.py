@@ -0,0 +1,107 @@
+"""
+Executor backends the runs of a grid search are spread over, and how many runs each task batches together.
+
+    - 'serial' runs each task in the calling thread, with no pickling or scheduling at all
+    - 'thread' runs tasks on a thread pool, sharing the stock data without copying it. Only worth it when runs spend
+      their time in code that releases the GIL (NumPy sorts and the numba compiled 'array' kernel)
+    - 'process' runs tasks on a process pool. Each task's arguments and result are pickled, so short runs are batched
+      into chunks to spread that cost, and the stock data is sent once per worker rather than with every task
+"""
+import math
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Collection, Iterator
+
+
+EXECUTOR_BACKENDS = ('serial', 'thread', 'process')
+
+# Cells (months x tickers) of stock data a task should cover before the cost of pickling and scheduling it is small
+# next to the run itself. A grid with less work than this in total is quicker to run serially than to start a pool for
+TASK_CELLS = 2_000_000
+
+# Tasks each worker should get at least, so a worker that draws slow runs does not hold up the end of the search
+TASKS_PER_WORKER = 4
+
+
+class SerialExecutor(Executor):
+    """
+    Executor that runs each task in the calling thread when it is submitted, returning a future that is already done
+    """
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        return future
+
+
+def make_executor(backend: str, max_workers: int, initializer: Callable | None = None,
+                  initargs: tuple = ()) -> Executor:
+    """
+    Creates an executor of a backend
+
+    Parameters:
+        - backend (str): One of `EXECUTOR_BACKENDS`
+        - max_workers (int): Threads or processes of the pool (unused by 'serial')
+        - initializer (Callable | None): Called with initargs in each worker before its first task (once, in the
+                                         calling thread, for 'serial')
+        - initargs (tuple): Arguments to initializer
+
+    Raises:
+        - ValueError: If backend is not one of `EXECUTOR_BACKENDS`
+    """
+    if backend == 'serial':
+        if initializer is not None:
+            initializer(*initargs)
+        return SerialExecutor()
+    if backend == 'thread':
+        return ThreadPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs)
+    if backend == 'process':
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs)
+    raise ValueError(f"Executor backend {backend} invalid. Must be one of {EXECUTOR_BACKENDS}")
+
+
+def choose_backend(runs: int, cells: int, max_workers: int, releases_gil: bool, profile: bool = False) -> str:
+    """
+    Picks the backend for a grid search from its size and whether its runs release the GIL
+
+    Parameters:
+        - runs (int): Number of runs
+        - cells (int): Months x tickers of the stock data each run covers
+        - max_workers (int): Workers available
+        - releases_gil (bool): Whether runs spend most of their time without the GIL, E.g., the 'array' engine with
+                               numba installed. Runs that hold it (the 'object' engine) only scale across processes
+        - profile (bool): Whether runs are memory profiled, which measures each process's peak RSS, so needs runs in
+                          their own processes
+
+    Returns:
+        - str: One of `EXECUTOR_BACKENDS`
+    """
+    if max_workers <= 1 or runs <= 1 or runs * cells < TASK_CELLS:
+        return 'serial'
+    if releases_gil and not profile:
+        return 'thread'
+    return 'process'
+
+
+def choose_chunk_size(backend: str, runs: int, cells: int, max_workers: int) -> int:
+    """
+    Picks how many runs each task batches for a backend. Process tasks batch enough runs to cover `TASK_CELLS`, but
+    no more than leaves `TASKS_PER_WORKER` tasks for each worker. Serial and thread tasks cost little to submit, so
+    hold one run each
+    """
+    if backend != 'process' or runs <= 0:
+        return 1
+    balanced = math.ceil(runs / (max(max_workers, 1) * TASKS_PER_WORKER))
+    return max(1, min(math.ceil(TASK_CELLS / max(cells, 1)), balanced))
+
+
+def chunked(items: Collection, size: int) -> Iterator[list]:
+    """
+    Splits items into lists of size items (the last may be shorter), in order
+    """
+    items = list(items)
+    return (items[start:start + size] for start in range(0, len(items), max(size, 1)))
@@ -1,10 +1,60 @@
+import math
 import random
+from typing import Collection, Dict
 
 class Grid:
 
     def __init__(self, grid: dict):
         self.__grid = grid
 
+    @classmethod
+    def from_specs(cls, specs: Dict[str, str]) -> 'Grid':
+        """
+        Creates a Grid from a spec string for each parameter (see `parse_spec()`)
+
+        Parameters:
+            - specs (Dict[str, str]): Mapping from parameter name ('J', 'K', 'ratio') to its spec
+        """
+        return cls({name: Grid.parse_spec(spec) for name, spec in specs.items()})
+
+    @staticmethod
+    def parse_spec(spec: str) -> Collection[int | float]:
+        """
+        Parses the values of a parameter from either a range, 'start:stop[:step]' with stop excluded (E.g., '1:13' or
+        '0:0.2:0.01'), or a comma separated list (E.g., '1,3,6')
+
+        Parameters:
+            - spec (str): Spec to parse
+
+        Returns:
+            - Collection[int | float]: Values, as ints if every part of the spec is an int
+
+        Raises:
+            - ValueError: If spec is not a range or list of numbers, or a range has a step of 0
+        """
+        number = float if '.' in spec else int
+        try:
+            if ':' not in spec:
+                return [number(value) for value in spec.split(',')]
+            parts = [number(part) for part in spec.split(':')]
+        except ValueError:
+            raise ValueError(f"Spec '{spec}' invalid. Must be 'start:stop[:step]' or a comma separated list of numbers")
+        if len(parts) not in (2, 3):
+            raise ValueError(f"Range spec '{spec}' invalid. Must be 'start:stop[:step]'")
+        start, stop, step = parts if len(parts) == 3 else (*parts, 1)
+        if step == 0:
+            raise ValueError(f"Range spec '{spec}' has a step of 0")
+        if number is int:
+            return list(range(start, stop, step))
+        # Counts the values like range() would, with stop excluded even when (stop - start) / step lands a rounding
+        # error above a whole number
+        count = max(math.ceil((stop - start) / step - 1e-9), 0)
+        # Rounded so that float steps give the same values as writing them out (E.g., 0.07 not 0.07000000000000001)
+        return [round(start + i * step, 10) for i in range(count)]
+
+    def get_grid(self) -> dict:
+        return self.__grid
+
     def get_J(self) -> int:
         return self.__grid["J"][random.randint(0, len(self.__grid["J"]) - 1)]
 
@@ -12,4 +62,4 @@ class Grid:
         return self.__grid["K"][random.randint(0, len(self.__grid["K"]) - 1)]
 
     def get_ratio(self) -> float:
-        return self.__grid["ratio"][random.randint(0, len(self.__grid["ratio"]) - 1)]
\ No newline at end of file
+        return self.__grid["ratio"][random.randint(0, len(self.__grid["ratio"]) - 1)]
@@ -0,0 +1,214 @@
+import gc
+import os
+import logging
+import tracemalloc
+import pandas as pd
+from typing import Collection, Dict
+
+from utils.stock import Stock
+from utils.portfolio import Portfolio
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+# Allocation sites kept from each tracemalloc snapshot
+TOP_ALLOCATIONS = 10
+
+
+""" PROCESS MEMORY """
+
+
+def rss_bytes() -> int:
+    """
+    Gets the current resident set size of this process, or 0 where it cannot be read (non-Linux)
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def reset_peak_rss() -> bool:
+    """
+    Resets this process's peak resident set size, so the next `peak_rss_bytes()` only covers what runs after this.
+    Worker processes run many tasks, so without this a task's peak would be the largest of every earlier task
+
+    Returns:
+        - bool: Whether the peak could be reset (Linux only)
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes() -> int:
+    """
+    Gets the peak resident set size of this process since it started, or since `reset_peak_rss()`
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return rss_bytes()
+    # kB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+def count_instances(classes: Collection[type] = (Stock, Portfolio)) -> Dict[str, int]:
+    """
+    Counts the live instances of each class by walking every object tracked by the garbage collector. This is slow
+    (proportional to the number of objects alive), so it is only done at the months a `MemoryProfile` snapshots
+    """
+    counts = {cls.__name__: 0 for cls in classes}
+    classes = tuple(classes)
+    for obj in gc.get_objects():
+        if isinstance(obj, classes):
+            counts[type(obj).__name__] = counts.get(type(obj).__name__, 0) + 1
+    return counts
+
+
+""" PROFILING """
+
+
+class MemoryProfile:
+    """
+    Opt-in memory instrumentation of one run. Records the peak resident set size of the task running it and, at the
+    chosen months, a tracemalloc snapshot of the largest allocation sites along with counts of live `Stock` and
+    `Portfolio` instances. tracemalloc slows Python allocations down, so it is only started when snapshot months are
+    given. Profiles are sent back from workers with each `RunResult`, so only summaries are kept, not snapshots.
+
+    Parameters:
+        - snapshot_months (Collection[int]): Month indexes to take snapshots at. The 'array' engine runs every month
+                                             in one kernel, so it is only snapshotted once, after the run
+        - top (int): Allocation sites kept per snapshot
+    """
+
+    def __init__(self, snapshot_months: Collection[int] = (), top: int = TOP_ALLOCATIONS):
+        self.__snapshot_months = frozenset(int(month) for month in snapshot_months)
+        self.__top = top
+        self.__peak_rss = 0
+        self.__start_rss = 0
+        self.__snapshots = []
+        self.__tracing = False
+
+    def start(self):
+        """
+        Starts measuring, resetting the process's peak RSS so it only covers this task
+        """
+        reset_peak_rss()
+        self.__start_rss = rss_bytes()
+        if self.__snapshot_months and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.__tracing = True
+
+    def on_month(self, month: int, force: bool = False):
+        """
+        Takes a snapshot if month is one of the snapshot months, or if forced
+        """
+        if not force and month not in self.__snapshot_months:
+            return
+        snapshot = {'month': month, 'rss': rss_bytes(), 'traced': 0, 'traced_peak': 0, 'top': []}
+        if tracemalloc.is_tracing():
+            snapshot['traced'], snapshot['traced_peak'] = tracemalloc.get_traced_memory()
+            statistics = tracemalloc.take_snapshot().statistics('lineno')[:self.__top]
+            snapshot['top'] = [(str(stat.traceback[0]), stat.size, stat.count) for stat in statistics]
+        snapshot.update(count_instances())
+        self.__snapshots.append(snapshot)
+
+    def stop(self):
+        """
+        Stops measuring and records the task's peak RSS
+        """
+        self.__peak_rss = max(peak_rss_bytes(), rss_bytes())
+        if self.__tracing:
+            tracemalloc.stop()
+            self.__tracing = False
+
+    def get_snapshot_months(self) -> frozenset:
+        return self.__snapshot_months
+
+    def get_peak_rss(self) -> int:
+        return self.__peak_rss
+
+    def get_start_rss(self) -> int:
+        return self.__start_rss
+
+    def get_snapshots(self) -> Collection[dict]:
+        return self.__snapshots
+
+
+def memory_table(results: Collection) -> pd.DataFrame:
+    """
+    Tidy table of the memory profiles of runs, with one row per run and snapshot (or one row per run without
+    snapshots). Runs without a profile are left out
+
+    Parameters:
+        - results (Collection[RunResult]): Results of runs
+
+    Returns:
+        - pd.DataFrame: 'J', 'K', 'ratio', 'peak_rss', 'month', 'rss', 'traced', 'traced_peak', a count column per
+                        counted class, and the largest allocation site ('top_allocation', 'top_allocation_bytes')
+    """
+    rows = []
+    for result in results:
+        profile = result.get_memory_profile()
+        if profile is None:
+            continue
+        run = {'J': result.get_J(), 'K': result.get_K(), 'ratio': result.get_ratio(),
+               'peak_rss': profile.get_peak_rss()}
+        for snapshot in profile.get_snapshots() or [{}]:
+            row = dict(run)
+            row.update({name: value for name, value in snapshot.items() if name != 'top'})
+            if snapshot.get('top'):
+                row['top_allocation'], row['top_allocation_bytes'], _ = snapshot['top'][0]
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+class ConcurrencyLimiter:
+    """
+    Caps how many runs are in flight so their combined peak memory stays below a budget. Until a run has finished
+    and reported its peak, one run is in flight at a time; after that the cap is the budget over the largest peak
+    seen, so it only falls as larger runs are measured.
+
+    Parameters:
+        - max_workers (int): Cap without a budget, and the highest cap with one
+        - memory_budget (int | None): Bytes the runs in flight may use together, or None for no budget
+    """
+
+    def __init__(self, max_workers: int, memory_budget: int | None = None):
+        self.__max_workers = max(1, max_workers)
+        self.__memory_budget = memory_budget
+        self.__largest_peak = 0
+        self.__limit = self.__max_workers if memory_budget is None else 1
+
+    def update(self, profile: MemoryProfile | None):
+        """
+        Updates the cap from the profile of a finished run
+        """
+        if self.__memory_budget is None or profile is None or profile.get_peak_rss() <= self.__largest_peak:
+            return
+        self.__largest_peak = profile.get_peak_rss()
+        limit = max(1, min(self.__max_workers, self.__memory_budget // self.__largest_peak))
+        if limit != self.__limit:
+            logging.warning(f"Runs peak at {self.__largest_peak / 2 ** 20:.0f} MB, running up to {limit} at once to "
+                            f"stay within the {self.__memory_budget / 2 ** 20:.0f} MB memory budget")
+        self.__limit = limit
+
+    def get_limit(self) -> int:
+        return self.__limit
+
+    def get_largest_peak(self) -> int:
+        return self.__largest_peak
@@ -0,0 +1,61 @@
+import pandas as pd
+from typing import Collection
+
+from utils.exceptions import MissingMonthsError
+
+
+class MonthCalendar:
+    """
+    Maps every month of the stock data to a dense integer index (the row of that month), once at load time. Look-back
+    and holding periods are then integer offsets from a month's index rather than date arithmetic.
+
+    The months are checked when the calendar is created, so gaps in the data are reported before a run starts rather
+    than surfacing as a missing portfolio months into the run.
+
+    Parameters:
+        - dates (Collection[pd.Timestamp]): Date of each row of the stock data, one per month in ascending order
+
+    Raises:
+        - MissingMonthsError: If a month between the first and last date has no row
+        - ValueError: If dates are not in ascending order, or a month appears more than once
+    """
+
+    def __init__(self, dates: Collection[pd.Timestamp]):
+        self.__dates = pd.DatetimeIndex(dates)
+        periods = self.__dates.to_period('M')
+        if len(periods):
+            if periods.has_duplicates:
+                duplicated = sorted({str(period) for period in periods[periods.duplicated()]})
+                raise ValueError(f"Months {duplicated} appear more than once in stock data")
+            if not periods.is_monotonic_increasing:
+                raise ValueError("Dates in stock data are not in ascending order")
+            missing = pd.period_range(periods[0], periods[-1], freq='M').difference(periods)
+            if len(missing):
+                raise MissingMonthsError(f"{len(missing)} month(s) missing from stock data: "
+                                         f"{[str(period) for period in missing]}")
+        # Months since 1970-01, so a date's index is one subtraction
+        self.__first = int(periods[0].ordinal) if len(periods) else 0
+
+    def __len__(self) -> int:
+        return len(self.__dates)
+
+    def index_of(self, date: pd.Timestamp) -> int:
+        """
+        Gets the index of the month a date falls in
+
+        Raises:
+            - KeyError: If the month is not in the stock data
+        """
+        month = pd.Timestamp(date).to_period('M').ordinal - self.__first
+        if not 0 <= month < len(self.__dates):
+            raise KeyError(f"Month {date} not found in stock data")
+        return int(month)
+
+    def date_of(self, month: int) -> pd.Timestamp:
+        """
+        Gets the date of the row of a month index
+        """
+        return self.__dates[month]
+
+    def get_dates(self) -> pd.DatetimeIndex:
+        return self.__dates
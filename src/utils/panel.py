@@ -0,0 +1,309 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from typing import Collection, Dict, Iterator, Tuple
+
+from utils.currency import convert_prices_to_usd
+from utils.exceptions import PanelMismatchError
+from utils.precision import get_dtype
+from utils.universe import csv_tickers, filter_columns
+
+
+# Months and tickers per block when streaming into or computing over a panel, bounding the working memory to roughly
+# CHUNK_MONTHS x CHUNK_TICKERS values per array
+CHUNK_MONTHS = 120
+CHUNK_TICKERS = 4096
+
+
+class Panel:
+    """
+    Stock data stored on disk as memory-mapped (months x tickers) float64 or float32 matrices of prices and returns,
+    for panels too large to hold in RAM as a DataFrame. Pages of the matrices are only read when accessed, and every
+    process that opens the same directory shares them through the OS page cache rather than holding its own copy.
+    Pickling a Panel (E.g., to send it to a worker process) only sends the directory path.
+
+    A panel directory holds 'prices.npy' and 'returns.npy' (row-major, so one month is one contiguous row), 'dates.npy'
+    and 'tickers.json', and caches of signals computed from it (see `SignalTable.from_panel()`). 'manifest.json'
+    records what the panel was built from (the size and modification time of each source file, the dtype and the
+    universe), so `validate()` can tell when it is opened with sources or settings that have since changed, and its
+    'key' names the signal caches, so caches of a panel rebuilt in place are never reused.
+
+    Parameters:
+        - directory (str): Panel directory written by `from_csv()` or `from_frame()`
+    """
+
+    def __init__(self, directory: str):
+        self.__directory = directory
+        with open(os.path.join(directory, "tickers.json"), "r") as f:
+            self.__tickers = json.load(f)
+        self.__dates = pd.DatetimeIndex(np.load(os.path.join(directory, "dates.npy")))
+        self.__prices = np.load(os.path.join(directory, "prices.npy"), mmap_mode='r')
+        self.__returns = np.load(os.path.join(directory, "returns.npy"), mmap_mode='r')
+        manifest_filepath = os.path.join(directory, "manifest.json")
+        self.__manifest = None
+        if os.path.exists(manifest_filepath):
+            with open(manifest_filepath, "r") as f:
+                self.__manifest = json.load(f)
+
+    def __len__(self) -> int:
+        return len(self.__dates)
+
+    def __getstate__(self) -> dict:
+        return {'directory': self.__directory}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state['directory'])
+
+
+    """ WRITING """
+
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        """
+        Whether a complete panel has been written to directory
+        """
+        return os.path.exists(os.path.join(directory, "tickers.json"))
+
+    @staticmethod
+    def describe_sources(sources: Dict[str, str]) -> Dict[str, dict | None]:
+        """
+        Describes the files a panel is built from by their size and modification time, which change whenever a file
+        is rewritten, without reading them
+
+        Parameters:
+            - sources (Dict[str, str]): Path of each source file by its role (E.g., 'data' or 'fx')
+
+        Returns:
+            - Dict[str, dict | None]: 'path', 'size' and 'mtime_ns' of each source by its role, or None for a file that
+                                      does not exist
+        """
+        described = {}
+        for role, filepath in sources.items():
+            try:
+                stat = os.stat(filepath)
+            except FileNotFoundError:
+                described[role] = None
+                continue
+            described[role] = {'path': filepath, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        return described
+
+    @staticmethod
+    def make_manifest(sources: Dict[str, str], dtype: str, tickers: Collection[str] | None,
+                      digest: str | None = None) -> dict:
+        """
+        Builds the manifest of a panel (see `validate()`), with a 'key' hashed from the rest of it
+
+        Parameters:
+            - sources (Dict[str, str]): Path of each source file by its role
+            - dtype (str): Precision prices and returns are stored in
+            - tickers (Collection[str] | None): Universe the panel was filtered to, or None for every ticker
+            - digest (str | None): Hash of the data itself, for panels not built from files
+        """
+        manifest = {'sources': Panel.describe_sources(sources), 'dtype': str(np.dtype(get_dtype(dtype))),
+                    'tickers': sorted(tickers) if tickers is not None else None, 'digest': digest}
+        manifest['key'] = hashlib.sha1(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[:12]
+        return manifest
+
+    @classmethod
+    def from_csv(cls, csv_filepath: str, directory: str, code_to_currency: Dict[str, str] | None = None,
+                 fx_rates: pd.DataFrame | None = None, chunk_months: int = CHUNK_MONTHS,
+                 dtype: str = 'float64', tickers: Collection[str] | None = None,
+                 sources: Dict[str, str] | None = None) -> 'Panel':
+        """
+        Streams a stock data CSV into a panel directory, chunk_months rows at a time, so the CSV is never loaded whole.
+        Prices are converted to USD chunk by chunk when FX rates are given (see `utils.currency`).
+
+        Parameters:
+            - csv_filepath (str): Stock data CSV with a 'Date' column, price columns and '<ticker>Returns' columns
+            - directory (str): Directory to write the panel to
+            - code_to_currency (Dict[str, str] | None): Mapping from ticker code to currency code
+            - fx_rates (pd.DataFrame | None): FX rates as loaded by `utils.currency.load_fx_rates()`
+            - chunk_months (int): Rows read per chunk
+            - dtype (str): Precision prices and returns are stored in, one of `utils.precision.DTYPES`
+            - tickers (Collection[str] | None): Tickers to keep (see `utils.universe`). Other columns are never read
+            - sources (Dict[str, str] | None): Other files the panel is built from by their role (E.g., the FX rate
+                                               file), recorded in its manifest with the CSV as 'data'
+
+        Returns:
+            - Panel: The panel written
+        """
+        # The dates alone give the shape of the matrices before any prices are read
+        dates = pd.to_datetime(pd.read_csv(csv_filepath, usecols=['Date'])['Date'], format="%Y-%m-%d")
+        columns = pd.read_csv(csv_filepath, nrows=0).columns
+        keep = set(tickers) if tickers is not None else None
+        manifest = cls.make_manifest({'data': csv_filepath, **(sources or {})}, dtype, keep)
+        tickers = [col[:-7] for col in columns if col != 'Date' and col.endswith('Returns')
+                   and (keep is None or col[:-7] in keep)]
+        usecols = filter_columns(columns, tickers)
+        writer = cls.__open_writer(directory, dates, tickers, dtype, manifest)
+        for chunk in pd.read_csv(csv_filepath, chunksize=chunk_months, usecols=usecols):
+            chunk['Date'] = pd.to_datetime(chunk['Date'], format="%Y-%m-%d")
+            if code_to_currency and fx_rates is not None:
+                chunk = convert_prices_to_usd(chunk, code_to_currency, fx_rates)
+            writer.send(chunk)
+        writer.close()
+        return cls(directory)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, directory: str, chunk_months: int = CHUNK_MONTHS,
+                   dtype: str = 'float64') -> 'Panel':
+        """
+        Writes stock data already loaded as a DataFrame to a panel directory
+        """
+        tickers = [col[:-7] for col in df.columns if col != 'Date' and col.endswith('Returns')]
+        # There are no source files to describe, so the manifest key comes from the data
+        digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()).hexdigest()
+        writer = cls.__open_writer(directory, pd.DatetimeIndex(df['Date']), tickers, dtype,
+                                   cls.make_manifest({}, dtype, None, digest))
+        for start in range(0, len(df), chunk_months):
+            writer.send(df.iloc[start:start + chunk_months])
+        writer.close()
+        return cls(directory)
+
+    @staticmethod
+    def __open_writer(directory: str, dates: pd.DatetimeIndex, tickers: list, dtype: str, manifest: dict) -> Iterator:
+        """
+        Creates the panel's matrices and returns a generator that writes each chunk of rows sent to it. 'tickers.json'
+        is written last, after 'manifest.json', so a panel is only seen by `exists()` once every row has been written
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "dates.npy"), np.asarray(dates, dtype='datetime64[ns]'))
+        shape = (len(dates), len(tickers))
+        dtype = get_dtype(dtype)
+        prices = np.lib.format.open_memmap(os.path.join(directory, "prices.npy"), mode='w+', dtype=dtype, shape=shape)
+        returns = np.lib.format.open_memmap(os.path.join(directory, "returns.npy"), mode='w+', dtype=dtype,
+                                            shape=shape)
+        return_cols = [f"{ticker}Returns" for ticker in tickers]
+
+        def write():
+            row = 0
+            try:
+                while True:
+                    chunk = yield
+                    prices[row:row + len(chunk)] = chunk[tickers].to_numpy(dtype=dtype)
+                    returns[row:row + len(chunk)] = chunk[return_cols].to_numpy(dtype=dtype)
+                    row += len(chunk)
+            except GeneratorExit:
+                prices.flush()
+                returns.flush()
+                with open(os.path.join(directory, "manifest.json"), "w") as f:
+                    json.dump(manifest, f)
+                with open(os.path.join(directory, "tickers.json"), "w") as f:
+                    json.dump(tickers, f)
+
+        writer = write()
+        next(writer)
+        return writer
+
+
+    """ READING """
+
+
+    def validate(self, csv_filepath: str, sources: Dict[str, str] | None = None, dtype: str | None = None,
+                 tickers: Collection[str] | None = None):
+        """
+        Checks the panel was built from the source files as they are now, so it is not run on stale data after a file
+        changes, and in the precision and universe asked for. Panels written before manifests were recorded, and
+        sources that no longer exist, cannot be checked against their sources, which is logged as a warning
+
+        Parameters:
+            - csv_filepath (str): Stock data CSV the panel should have been built from
+            - sources (Dict[str, str] | None): Other files it should have been built from, as given to `from_csv()`
+            - dtype (str | None): Precision prices and returns should be stored in, or None not to check it
+            - tickers (Collection[str] | None): Universe the panel should hold, as given to `from_csv()`, or None for
+                                                every ticker of the CSV. Only checked if the CSV exists
+
+        Raises:
+            - PanelMismatchError: If a source file changed (or was added or removed) since the panel was built, or it
+                                  is stored in another precision than dtype, or holds other tickers than the universe
+        """
+        # Read from the matrices themselves, so panels without a manifest are checked too
+        if dtype is not None and self.__prices.dtype != get_dtype(dtype):
+            raise PanelMismatchError(f"Panel {self.__directory} stores {self.__prices.dtype}, not the {dtype} asked "
+                                     f"for. Use a separate panel directory for each precision")
+        if os.path.exists(csv_filepath):
+            keep = set(tickers) if tickers is not None else None
+            expected = [ticker for ticker in csv_tickers(csv_filepath) if keep is None or ticker in keep]
+            if expected != self.__tickers:
+                extra = sorted(set(self.__tickers) - set(expected))
+                absent = sorted(set(expected) - set(self.__tickers))
+                raise PanelMismatchError(f"Panel {self.__directory} holds another universe than the one asked for "
+                                         f"({len(extra)} tickers not in it, e.g. {extra[:5]}, and {len(absent)} "
+                                         f"missing, e.g. {absent[:5]}). Use a separate panel directory for each "
+                                         f"universe")
+        if self.__manifest is None:
+            logging.warning(f"Panel {self.__directory} has no manifest, so cannot be checked against its sources. "
+                            f"Delete it to rebuild it with one")
+            return
+        expected = self.__manifest['sources']
+        actual = self.describe_sources({'data': csv_filepath, **(sources or {})})
+        # A panel can be run on without its sources, E.g., on a host that only has the panel
+        missing = sorted(role for role in expected if expected[role] is not None and actual.get(role) is None)
+        if missing:
+            logging.warning(f"Sources {missing} of panel {self.__directory} not found, so cannot be checked")
+        changed = sorted(role for role in set(expected) | set(actual) if role not in missing
+                         and Panel.__source_stamp(expected.get(role)) != Panel.__source_stamp(actual.get(role)))
+        if changed:
+            raise PanelMismatchError(f"Panel {self.__directory} is stale, {changed} changed since it was built. "
+                                     f"Delete it to rebuild it from the current files")
+
+    @staticmethod
+    def __source_stamp(source: dict | None) -> Tuple[int, int] | None:
+        """
+        Gets the size and modification time of a described source, ignoring its path, so a panel can be opened through
+        a different mount of the same files
+        """
+        return (source['size'], source['mtime_ns']) if source is not None else None
+
+
+    def iter_blocks(self, J: int = 0, chunk_months: int = CHUNK_MONTHS, chunk_tickers: int = CHUNK_TICKERS) -> \
+            Iterator[Tuple[int, int, int, int, int]]:
+        """
+        Splits the panel into (month x ticker) blocks for chunked computation. Each block is extended back by up to J
+        months, so that J-month look-backs of its first months can be computed from the block alone
+
+        Returns:
+            - Iterator[Tuple[int, int, int, int, int]]: (read_start, start, end, ticker_start, ticker_end) of each
+                                                         block, where rows read_start to end are read and rows start
+                                                         to end are written
+        """
+        for ticker_start in range(0, max(len(self.__tickers), 1), chunk_tickers):
+            ticker_end = min(ticker_start + chunk_tickers, len(self.__tickers))
+            for start in range(0, len(self.__dates), chunk_months):
+                end = min(start + chunk_months, len(self.__dates))
+                yield max(start - max(J, 0), 0), start, end, ticker_start, ticker_end
+
+    def row(self, month: int) -> pd.Series:
+        """
+        Gets the prices of one month as a Series indexed by ticker, like a row of the stock data DataFrame
+        """
+        return pd.Series(self.__prices[month], index=self.__tickers)
+
+
+    """ GETTERS """
+
+
+    def get_directory(self) -> str:
+        return self.__directory
+
+    def get_dates(self) -> pd.DatetimeIndex:
+        return self.__dates
+
+    def get_tickers(self) -> list:
+        return self.__tickers
+
+    def get_prices(self) -> np.ndarray:
+        return self.__prices
+
+    def get_returns(self) -> np.ndarray:
+        return self.__returns
+
+    def get_manifest(self) -> dict | None:
+        return self.__manifest
+
+    def get_key(self) -> str | None:
+        return self.__manifest['key'] if self.__manifest is not None else None
@@ -0,0 +1,190 @@
+import numpy as np
+import pandas as pd
+from typing import Collection, Tuple
+
+from utils.run_result import RunResult
+
+
+# Periods per year of monthly and daily (trading day) stock data, for annualising statistics
+MONTHS_PER_YEAR = 12
+TRADING_DAYS_PER_YEAR = 252
+
+
+def stack_results(results: Collection[RunResult], periods: int) -> np.ndarray:
+    """
+    Stacks the equity of every run into one (runs x periods) array, preallocated once rather than built from Python
+    lists. A run's equity is its cash plus its position tally, the market value of the stock it holds long less that
+    of the stock it has shorted and not yet bought back (see `kernels.value_positions()`). Periods without a cash tally
+    are NaN, as are periods where a stock held has no price
+
+    Parameters:
+        - results (Collection[RunResult]): Results of all runs
+        - periods (int): Number of periods (rows of the stock data)
+
+    Returns:
+        - np.ndarray: (runs x periods) float64 array of run equity
+    """
+    values = np.full((len(results), periods), np.nan, dtype=np.float64)
+    for i, result in enumerate(results):
+        cash = np.asarray(result.get_cash_tally(), dtype=np.float64)[:periods]
+        position = np.zeros(len(cash), dtype=np.float64)
+        tally = np.asarray(result.get_position_tally(), dtype=np.float64)[:len(cash)]
+        position[:len(tally)] = tally
+        if result.get_bankrupt():
+            # Bankrupt runs hold no position after they stop, while their cash is carried forward
+            valid = np.flatnonzero(~np.isnan(tally))
+            position[valid[-1] + 1 if len(valid) else 0:] = 0
+        values[i, :len(cash)] = cash + position
+    return values
+
+
+def period_returns(values: np.ndarray) -> np.ndarray:
+    """
+    Gets the simple return of each run over each period, NaN where either value is missing or the earlier value is
+    not positive (E.g., after going bankrupt)
+
+    Parameters:
+        - values (np.ndarray): (runs x periods) run values
+
+    Returns:
+        - np.ndarray: (runs x periods-1) returns
+    """
+    previous, current = values[:, :-1], values[:, 1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(previous > 0, current / previous - 1, np.nan)
+
+
+def max_drawdowns(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Gets the largest fall from a previous peak of each run, and the longest time spent below a previous peak
+
+    Returns:
+        - np.ndarray: Maximum drawdown of each run, as a negative fraction of the peak (0 if it never fell)
+        - np.ndarray: Longest drawdown of each run, in periods
+    """
+    # Missing values (E.g., where prices were missing) are carried forward from the last known value
+    periods = np.arange(values.shape[1])
+    last_known = np.maximum.accumulate(np.where(np.isnan(values), 0, periods), axis=1)
+    values = np.take_along_axis(values, last_known, axis=1)
+    peaks = np.fmax.accumulate(values, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdowns = np.where(peaks > 0, values / peaks - 1, np.nan)
+    drawdown = np.fmin.reduce(drawdowns, axis=1, initial=0)
+
+    # Length of the stretch below the peak ending at each period: the distance back to the last period at the peak
+    below = values < peaks
+    last_peak = np.maximum.accumulate(np.where(below, -1, periods), axis=1)
+    durations = np.where(below, periods - last_peak, 0)
+    return drawdown, durations.max(axis=1, initial=0)
+
+
+def newey_west_lags(observations: int) -> int:
+    """
+    Gets the Newey-West (1994) rule of thumb for the number of autocovariance lags, 4 (n / 100) ^ (2 / 9)
+    """
+    return int(np.floor(4 * (max(observations, 0) / 100) ** (2 / 9)))
+
+
+def newey_west_t(returns: np.ndarray, lags: int | None = None) -> np.ndarray:
+    """
+    Gets the t-statistic of each run's mean return with Newey-West (HAC) standard errors, which allow for the
+    autocorrelation that overlapping K-period positions give returns. Missing returns are skipped
+
+    Parameters:
+        - returns (np.ndarray): (runs x periods) returns, NaN where missing
+        - lags (int | None): Autocovariance lags, with Bartlett weights. Defaults to `newey_west_lags()` of the periods
+
+    Returns:
+        - np.ndarray: t-statistic of each run, NaN where the returns have no variance
+    """
+    valid = ~np.isnan(returns)
+    observations = valid.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.nansum(returns, axis=1) / observations
+        deviations = np.where(valid, returns - mean[:, None], 0)
+        if lags is None:
+            lags = newey_west_lags(returns.shape[1])
+        variance = (deviations * deviations).sum(axis=1)
+        for lag in range(1, min(lags, returns.shape[1] - 1) + 1):
+            weight = 1 - lag / (lags + 1)
+            variance += 2 * weight * (deviations[:, lag:] * deviations[:, :-lag]).sum(axis=1)
+        variance /= observations
+        return np.where(variance > 0, mean / np.sqrt(variance / observations), np.nan)
+
+
+def performance_statistics(values: np.ndarray, periods_per_year: int = MONTHS_PER_YEAR, risk_free: float = 0.0,
+                           lags: int | None = None) -> pd.DataFrame:
+    """
+    Computes performance statistics of every run at once from a (runs x periods) array of run values
+
+    Parameters:
+        - values (np.ndarray): (runs x periods) run values, as stacked by `stack_results()`
+        - periods_per_year (int): Periods per year, E.g., `MONTHS_PER_YEAR` or `TRADING_DAYS_PER_YEAR`
+        - risk_free (float): Annual risk free rate subtracted from returns for the Sharpe and Sortino ratios
+        - lags (int | None): Newey-West lags (see `newey_west_t()`)
+
+    Returns:
+        - pd.DataFrame: One row per run with 'final_equity' (its last known value), 'annual_return' (geometric),
+                        'annual_volatility', 'sharpe', 'sortino', 'max_drawdown', 'max_drawdown_periods', 'hit_rate'
+                        (share of periods where the value changed that had a positive return) and 'newey_west_t' (of
+                        the mean period return)
+    """
+    returns = period_returns(values)
+    valid = ~np.isnan(returns)
+    observations = valid.sum(axis=1)
+    excess = returns - risk_free / periods_per_year
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.exp(np.nansum(np.log1p(np.where(returns > -1, returns, np.nan)), axis=1))
+        # A run that lost everything has a return of -100% whatever its length
+        growth = np.where((returns <= -1).any(axis=1), 0, growth)
+        annual_return = np.where(observations > 0, growth ** (periods_per_year / observations) - 1, np.nan)
+
+        mean_excess = np.nansum(excess, axis=1) / observations
+        volatility = np.sqrt(np.nansum((returns - (np.nansum(returns, axis=1) / observations)[:, None]) ** 2, axis=1)
+                             / (observations - 1))
+        downside = np.sqrt(np.nansum(np.minimum(excess, 0) ** 2, axis=1) / observations)
+        sharpe = np.where(volatility > 0, mean_excess / volatility * np.sqrt(periods_per_year), np.nan)
+        sortino = np.where(downside > 0, mean_excess / downside * np.sqrt(periods_per_year), np.nan)
+
+        changed = valid & (returns != 0)
+        hit_rate = (changed & (returns > 0)).sum(axis=1) / changed.sum(axis=1)
+
+    drawdown, drawdown_periods = max_drawdowns(values)
+    known = ~np.isnan(values)
+    last_known = values.shape[1] - 1 - np.argmax(known[:, ::-1], axis=1)
+    final_equity = np.where(known.any(axis=1), values[np.arange(len(values)), last_known], np.nan)
+    return pd.DataFrame({
+        'final_equity': final_equity,
+        'annual_return': annual_return,
+        'annual_volatility': volatility * np.sqrt(periods_per_year),
+        'sharpe': sharpe,
+        'sortino': sortino,
+        'max_drawdown': drawdown,
+        'max_drawdown_periods': drawdown_periods,
+        'hit_rate': hit_rate,
+        'newey_west_t': newey_west_t(returns, lags),
+    })
+
+
+def performance_table(results: Collection[RunResult], periods: int, periods_per_year: int = MONTHS_PER_YEAR,
+                      risk_free: float = 0.0, lags: int | None = None) -> pd.DataFrame:
+    """
+    Tidy table of every run's parameters and final result joined to its performance statistics, one row per run
+
+    Parameters:
+        - results (Collection[RunResult]): Results of all runs
+        - periods (int): Number of periods (rows of the stock data)
+        - periods_per_year, risk_free, lags: See `performance_statistics()`
+
+    Returns:
+        - pd.DataFrame: 'J', 'K', 'ratio', 'final_cash' and 'bankrupt', followed by the statistics columns
+    """
+    parameters = pd.DataFrame({
+        "J": np.array([s.get_J() for s in results], dtype=np.int64),
+        "K": np.array([s.get_K() for s in results], dtype=np.int64),
+        "ratio": np.array([s.get_ratio() for s in results], dtype=np.float64),
+        "final_cash": np.array([s.get_cash() for s in results], dtype=np.float64),
+        "bankrupt": np.array([s.get_bankrupt() for s in results], dtype=bool),
+    })
+    statistics = performance_statistics(stack_results(results, periods), periods_per_year, risk_free, lags)
+    return pd.concat([parameters, statistics], axis=1)
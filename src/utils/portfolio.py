@@ -14,10 +14,11 @@ class Portfolio:
 
     Parameters:
         - stocks (list[Stock]): List of Stock objects forming the Portfolio
-        - date (datetime): Date when Portfolio is created
+        - date (int | datetime): Month when Portfolio is created, as a month index (see
+                                  `utils.month_calendar.MonthCalendar`) or a date
     """
 
-    def __init__(self, date: datetime, type: PortfolioType):
+    def __init__(self, date: int | datetime, type: PortfolioType):
         self.__stocks = []
         self.__date_created = date
         self.__type = type
@@ -29,7 +30,7 @@ class Portfolio:
         value = 0
         original_value = 0
         for stock in self.__stocks:
-            value += current_stock_prices[stock.get_ticker_code()] * stock.get_amount()
+            value += float(current_stock_prices[stock.get_ticker_code()]) * stock.get_amount()
             original_value += stock.get_price() * stock.get_amount()
         if self.__type == PortfolioType.LONG:
             return value
@@ -37,13 +38,24 @@ class Portfolio:
             difference = original_value - value
             return difference
 
+    def get_market_value(self, current_stock_prices) -> float:
+        """
+        Gets the market value of the stock held at current prices, whether it was longed or shorted. Stocks of which
+        no amount is held are skipped
+        """
+        value = 0.0
+        for stock in self.__stocks:
+            if stock.get_amount() != 0:
+                value += float(current_stock_prices[stock.get_ticker_code()]) * stock.get_amount()
+        return value
+
     def add_stock(self, stock: Stock):
         self.__stocks.append(stock)
 
     def get_stocks(self) -> Collection[Stock]:
         return self.__stocks
 
-    def get_date(self) -> datetime:
+    def get_date(self) -> int | datetime:
         return self.__date_created
 
     def get_type(self) -> PortfolioType:
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+from typing import Collection
+
+
+# Precisions prices and returns can be stored in. Cash is always accounted in float64
+DTYPES = {'float64': np.float64, 'float32': np.float32}
+
+
+def get_dtype(name: str) -> np.dtype:
+    """
+    Gets the numpy dtype of a precision name
+
+    Raises:
+        - ValueError: If name is not one of `DTYPES`
+    """
+    if name not in DTYPES:
+        raise ValueError(f"Precision {name} invalid. Must be one of {tuple(DTYPES)}")
+    return np.dtype(DTYPES[name])
+
+
+def cast_stock_data(df: pd.DataFrame, dtype: str) -> pd.DataFrame:
+    """
+    Casts every price and returns column of the stock data to a precision, leaving 'Date' as it is
+
+    Parameters:
+        - df (pd.DataFrame): Stock data with a 'Date' column, price columns and '<ticker>Returns' columns
+        - dtype (str): One of `DTYPES`
+
+    Returns:
+        - pd.DataFrame: Stock data in the given precision (df itself if already in it)
+    """
+    dtype = get_dtype(dtype)
+    columns = [col for col in df.columns if col != 'Date']
+    if all(df[col].dtype == dtype for col in columns):
+        return df
+    return df.astype({col: dtype for col in columns})
+
+
+def infer_dtype(df: pd.DataFrame, columns: Collection[str]) -> np.dtype:
+    """
+    Gets the precision to compute signals of stock data in: float32 if every column is already float32, so that
+    float32 data is never silently widened, and float64 otherwise
+    """
+    if len(columns) and all(df[col].dtype == np.float32 for col in columns):
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
@@ -0,0 +1,36 @@
+import sys
+import time
+
+
+class ProgressReporter:
+    """
+    Prints a single, updating progress line with the number of finished runs, elapsed time and estimated time left
+
+    Parameters:
+        - total (int): Total number of runs
+        - stream: Stream to write to, stdout by default
+    """
+
+    def __init__(self, total: int, stream=None):
+        self.__total = total
+        self.__done = 0
+        self.__start = time.perf_counter()
+        self.__stream = stream if stream is not None else sys.stdout
+
+    def update(self, count: int = 1):
+        self.__done += count
+        self.__stream.write(f"\r{self.format()}")
+        if self.__done >= self.__total:
+            self.__stream.write("\n")
+        self.__stream.flush()
+
+    def format(self) -> str:
+        elapsed = time.perf_counter() - self.__start
+        if self.__done:
+            eta = f"{elapsed / self.__done * (self.__total - self.__done):.1f}s"
+        else:
+            eta = "unknown"
+        return f"Completed {self.__done}/{self.__total} runs, elapsed {elapsed:.1f}s, ETA {eta}"
+
+    def get_done(self) -> int:
+        return self.__done
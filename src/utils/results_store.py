@@ -0,0 +1,198 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+from typing import Collection
+
+from utils.run_result import RunResult
+
+
+class ResultsStore:
+    """
+    SQLite store that results are written to as runs finish, so a crash part way through a grid search keeps every
+    run completed before it. Results are buffered and written in batches, each batch in one transaction.
+
+    Tables:
+        - runs: One row per run with its parameters and outcome
+        - months: Date of each month index
+        - cash_series / position_series: (run_id, month, value) rows for each run's tallies
+
+    Parameters:
+        - filepath (str): Path to the SQLite file, created if it does not exist
+        - batch_size (int): Number of results buffered before they are written
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            J INTEGER NOT NULL,
+            K INTEGER NOT NULL,
+            ratio REAL NOT NULL,
+            starting_cash REAL NOT NULL,
+            final_cash REAL,
+            bankrupt INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS months (
+            month INTEGER PRIMARY KEY,
+            date TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS cash_series (
+            run_id INTEGER NOT NULL REFERENCES runs(run_id),
+            month INTEGER NOT NULL,
+            value REAL,
+            PRIMARY KEY (run_id, month)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS position_series (
+            run_id INTEGER NOT NULL REFERENCES runs(run_id),
+            month INTEGER NOT NULL,
+            value REAL,
+            PRIMARY KEY (run_id, month)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS runs_final_cash ON runs(final_cash);
+    """
+
+    def __init__(self, filepath: str, batch_size: int = 50):
+        self.__connection = sqlite3.connect(filepath, timeout=60)
+        self.__connection.executescript(ResultsStore.SCHEMA)
+        self.__batch_size = batch_size
+        self.__pending = []
+
+    def __enter__(self) -> 'ResultsStore':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    """ WRITING """
+
+
+    def set_dates(self, dates: Collection[pd.Timestamp]):
+        """
+        Saves the date of each month index, so series can be joined back to dates
+        """
+        rows = [(i, pd.Timestamp(date).strftime("%Y-%m-%d")) for i, date in enumerate(dates)]
+        with self.__connection:
+            self.__connection.executemany("INSERT OR REPLACE INTO months (month, date) VALUES (?, ?)", rows)
+
+    def add(self, result: RunResult):
+        """
+        Buffers a result, writing the buffer once it reaches the batch size
+        """
+        self.__pending.append(result)
+        if len(self.__pending) >= self.__batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all buffered results in one transaction
+        """
+        if not self.__pending:
+            return
+        with self.__connection:
+            for result in self.__pending:
+                ResultsStore.write_result(self.__connection, result)
+        self.__pending = []
+
+    @staticmethod
+    def write_result(connection: sqlite3.Connection, result: RunResult) -> int:
+        """
+        Inserts a result into the runs and series tables, within whatever transaction the connection is in
+
+        Returns:
+            - int: run_id of the inserted run
+        """
+        cursor = connection.execute(
+            "INSERT INTO runs (J, K, ratio, starting_cash, final_cash, bankrupt) VALUES (?, ?, ?, ?, ?, ?)",
+            (result.get_J(), result.get_K(), result.get_ratio(), result.get_starting_cash(),
+             ResultsStore.to_sql_float(result.get_cash()), int(result.get_bankrupt())))
+        run_id = cursor.lastrowid
+        for table, tally in (("cash_series", result.get_cash_tally()), ("position_series", result.get_position_tally())):
+            connection.executemany(
+                f"INSERT INTO {table} (run_id, month, value) VALUES (?, ?, ?)",
+                [(run_id, month, ResultsStore.to_sql_float(value)) for month, value in enumerate(tally)])
+        return run_id
+
+    def close(self):
+        self.flush()
+        self.__connection.close()
+
+
+    """ QUERYING """
+
+
+    def query(self, sql: str, params: Collection = ()) -> pd.DataFrame:
+        """
+        Runs a SQL query against the store
+
+        Parameters:
+            - sql (str): Query to run
+            - params (Collection): Parameters for '?' placeholders in the query
+        """
+        self.flush()
+        return pd.read_sql_query(sql, self.__connection, params=params)
+
+    def top_runs(self, n: int = 20, where: str | None = None, params: Collection = ()) -> pd.DataFrame:
+        """
+        Gets the n runs with the highest final cash, E.g., `top_runs(20, "J <= ?", (3,))`
+
+        Parameters:
+            - n (int): Number of runs
+            - where (str | None): Optional SQL condition on the runs table
+            - params (Collection): Parameters for '?' placeholders in the condition
+        """
+        condition = f"WHERE final_cash IS NOT NULL AND ({where})" if where else "WHERE final_cash IS NOT NULL"
+        return self.query(f"SELECT * FROM runs {condition} ORDER BY final_cash DESC LIMIT ?", (*params, n))
+
+    def get_series(self, run_id: int, tally_type: str = 'cash') -> pd.Series:
+        """
+        Gets the cash or position tally of a run, indexed by date
+
+        Raises:
+            - ValueError: If tally_type is not 'cash' or 'position'
+        """
+        if tally_type not in ('cash', 'position'):
+            raise ValueError(f"Tally type {tally_type} invalid. Must be 'cash' or 'position")
+        series = self.query(f"SELECT m.date, s.value FROM {tally_type}_series s LEFT JOIN months m "
+                            f"ON m.month = s.month WHERE s.run_id = ? ORDER BY s.month", (run_id,))
+        return series.set_index('date')['value']
+
+    def load_results(self, run_ids: Collection[int] | None = None) -> Collection[RunResult]:
+        """
+        Loads runs back into RunResult records, E.g., to report or plot runs written by other processes
+
+        Parameters:
+            - run_ids (Collection[int] | None): Runs to load, or None for every run
+        """
+        runs = self.query("SELECT * FROM runs ORDER BY run_id")
+        if run_ids is not None:
+            runs = runs[runs['run_id'].isin(list(run_ids))]
+        months = int(self.query("SELECT COUNT(*) AS n FROM months")['n'].iloc[0])
+        tallies = {}
+        for tally_type in ('cash', 'position'):
+            series = self.query(f"SELECT run_id, month, value FROM {tally_type}_series")
+            months = max(months, int(series['month'].max()) + 1) if len(series) else months
+            tallies[tally_type] = series
+
+        # Pivots each series table into a (runs x months) array in one step
+        row_of_run = {run_id: i for i, run_id in enumerate(runs['run_id'])}
+        arrays = {}
+        for tally_type, series in tallies.items():
+            array = np.full((len(runs), months), np.nan)
+            series = series[series['run_id'].isin(row_of_run)]
+            # Typed explicitly, as an empty selection (E.g., no run finished) comes back as floats
+            rows = series['run_id'].map(row_of_run).to_numpy(dtype=np.int64)
+            array[rows, series['month'].to_numpy(dtype=np.int64)] = series['value'].to_numpy(dtype=np.float64)
+            arrays[tally_type] = array
+
+        return [RunResult(int(run.J), int(run.K), float(run.ratio), float(run.starting_cash),
+                          np.nan if pd.isna(run.final_cash) else float(run.final_cash), bool(run.bankrupt),
+                          arrays['cash'][i], arrays['position'][i])
+                for i, run in enumerate(runs.itertuples())]
+
+    @staticmethod
+    def to_sql_float(value: float) -> float | None:
+        """
+        Converts a value to a float SQLite can store, with NaN stored as NULL
+        """
+        value = float(value)
+        return None if np.isnan(value) else value
@@ -0,0 +1,92 @@
+import numpy as np
+
+from utils.checkpoint import save_checkpoint, load_checkpoint
+
+
+class RunResult:
+    """
+    Compact record of a finished run, returned from workers in place of the whole StrategyController. Holds only the
+    parameters, the outcome and the cash and position tallies as float64 arrays, so its size does not grow with the
+    number of portfolios and stocks traded.
+
+    Parameters:
+        - J (int): J months (look-back period)
+        - K (int): K months (holding period)
+        - ratio (float): Investment ratio
+        - starting_cash (float): Cash at the start of the run
+        - final_cash (float): Cash at the end of the run
+        - bankrupt (bool): Whether the run went bankrupt
+        - cash_tally (np.ndarray): Cash at each month
+        - position_tally (np.ndarray): Market value of open long less open short positions at each month, NaN after
+                                       the run stopped
+    """
+
+    def __init__(self, J: int, K: int, ratio: float, starting_cash: float, final_cash: float, bankrupt: bool,
+                 cash_tally: np.ndarray, position_tally: np.ndarray):
+        self.__J = J
+        self.__K = K
+        self.__ratio = ratio
+        self.__starting_cash = starting_cash
+        self.__final_cash = final_cash
+        self.__bankrupt = bankrupt
+        self.__cash_tally = cash_tally
+        self.__position_tally = position_tally
+        # Memory profile of the task that ran it, when profiled (see `utils.memory_profile`). Not saved
+        self.__memory_profile = None
+
+    def save(self, filepath: str):
+        """
+        Saves the result to a compressed binary file, E.g., so a resumed grid search can skip finished runs
+        """
+        save_checkpoint(filepath, {'J': self.__J, 'K': self.__K, 'ratio': self.__ratio,
+                                   'starting_cash': self.__starting_cash, 'final_cash': self.__final_cash,
+                                   'bankrupt': self.__bankrupt, 'cash_tally': self.__cash_tally,
+                                   'position_tally': self.__position_tally})
+
+    @classmethod
+    def load(cls, filepath: str) -> 'RunResult':
+        """
+        Loads a result saved with `save()`
+        """
+        state = load_checkpoint(filepath)
+        return cls(int(state['J']), int(state['K']), float(state['ratio']), state['starting_cash'],
+                   float(state['final_cash']), bool(state['bankrupt']), state['cash_tally'], state['position_tally'])
+
+    @staticmethod
+    def to_array(tally, months: int) -> np.ndarray:
+        """
+        Copies a tally into a preallocated float64 array of length months, padding with NaN
+        """
+        array = np.full(months, np.nan, dtype=np.float64)
+        array[:len(tally)] = tally
+        return array
+
+    def get_J(self) -> int:
+        return self.__J
+
+    def get_K(self) -> int:
+        return self.__K
+
+    def get_ratio(self) -> float:
+        return self.__ratio
+
+    def get_starting_cash(self) -> float:
+        return self.__starting_cash
+
+    def get_cash(self) -> float:
+        return self.__final_cash
+
+    def get_bankrupt(self) -> bool:
+        return self.__bankrupt
+
+    def get_cash_tally(self) -> np.ndarray:
+        return self.__cash_tally
+
+    def get_position_tally(self) -> np.ndarray:
+        return self.__position_tally
+
+    def get_memory_profile(self):
+        return self.__memory_profile
+
+    def set_memory_profile(self, profile):
+        self.__memory_profile = profile
@@ -0,0 +1,52 @@
+import os
+import glob
+import pandas as pd
+from typing import Collection, Dict
+
+
+# Columns of the NASDAQ screener that tickers can be grouped by for neutral ranking
+GROUP_COLUMNS = ('Sector', 'Industry', 'Country')
+
+
+def find_screener(data_dir: str = "../data") -> str | None:
+    """
+    Finds the most recent NASDAQ screener export ('nasdaq_screener_<timestamp>.csv') in data_dir, or None if there
+    is none
+    """
+    filepaths = sorted(glob.glob(os.path.join(data_dir, "nasdaq_screener_*.csv")))
+    return filepaths[-1] if filepaths else None
+
+
+def load_screener(filepath: str, columns: Collection[str]) -> pd.DataFrame:
+    """
+    Loads only the given columns of a NASDAQ screener export, indexed by symbol
+
+    Parameters:
+        - filepath (str): Screener CSV with a 'Symbol' column
+        - columns (Collection[str]): Columns to load, E.g., 'Sector' or 'Market Cap'
+
+    Returns:
+        - pd.DataFrame: The columns, indexed by 'Symbol'
+    """
+    df = pd.read_csv(filepath, usecols=['Symbol', *columns])
+    df['Symbol'] = df['Symbol'].astype(str).str.strip()
+    return df.drop_duplicates('Symbol').set_index('Symbol')
+
+
+def load_groups(filepath: str, column: str) -> Dict[str, str]:
+    """
+    Loads the group (E.g., sector or country) of every symbol in a NASDAQ screener export
+
+    Parameters:
+        - filepath (str): Screener CSV
+        - column (str): Column to group by, one of `GROUP_COLUMNS`
+
+    Returns:
+        - Dict[str, str]: Mapping from symbol to group label, leaving out symbols without one
+
+    Raises:
+        - ValueError: If column is not one of `GROUP_COLUMNS`
+    """
+    if column not in GROUP_COLUMNS:
+        raise ValueError(f"Group column {column} invalid. Must be one of {GROUP_COLUMNS}")
+    return load_screener(filepath, [column])[column].dropna().to_dict()
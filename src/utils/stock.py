@@ -1,14 +1,28 @@
+import operator
+import numpy as np
+from typing import Collection
+
+
 class Stock:
     """
     Stock class which enables easy comparison of average stock returns over last J months for strategy
     It is also used to hold stock price of when stock is longed/shorted
 
+    Thousands are created every month and kept in portfolios, so attributes are slots rather than a per-object
+    __dict__. Lists of stocks are best sorted with `key=Stock.sort_key`, which reads each return once in C rather than
+    calling `__lt__` for every comparison. Either way ties keep their order, as Python's sort is stable.
+
     Parameters:
         - ticker_code (str): Ticker code for the stock
         - average_J_returns (float): Average returns over the last J months
         - price (float): Current price of stock when objet is created
     """
 
+    __slots__ = ('__ticker_code', '__J_returns', '__price', '__amount')
+
+    # Sort key of a Stock, its average J-month returns, read in C without a Python call per stock
+    sort_key = operator.attrgetter('_Stock__J_returns')
+
     def __init__(self, ticker_code: str, average_J_returns: float, price: float):
         self.__ticker_code = ticker_code
         self.__J_returns = average_J_returns
@@ -18,20 +32,53 @@ class Stock:
             raise ValueError(f"Price less than 0 for Stock {ticker_code}")
         self.__amount = 0
 
+    @classmethod
+    def from_arrays(cls, ticker_codes: Collection[str], average_J_returns: np.ndarray,
+                    prices: np.ndarray) -> list['Stock']:
+        """
+        Creates the Stock objects of a month at once from arrays, E.g., the selected columns of a `SignalTable`.
+        Prices are checked in one vectorised comparison and values converted to Python floats in bulk
+
+        Parameters:
+            - ticker_codes (Collection[str]): Ticker code of each stock
+            - average_J_returns (np.ndarray): Average returns over the last J months of each stock
+            - prices (np.ndarray): Current price of each stock
+
+        Returns:
+            - list[Stock]: Stocks, in the order given
+
+        Raises:
+            - ValueError: If a price is not above 0
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        invalid = ~(prices > 0)
+        if invalid.any():
+            raise ValueError(f"Price less than 0 for Stock {list(ticker_codes)[int(np.argmax(invalid))]}")
+        stocks = []
+        for ticker_code, J_returns, price in zip(ticker_codes, np.asarray(average_J_returns).tolist(),
+                                                 prices.tolist()):
+            stock = cls.__new__(cls)
+            stock.__ticker_code = ticker_code
+            stock.__J_returns = J_returns
+            stock.__price = price
+            stock.__amount = 0
+            stocks.append(stock)
+        return stocks
+
     def __lt__(self, obj: 'Stock') -> bool:
-        return self.__J_returns < obj.get_J_returns()
+        return self.__J_returns < obj.__J_returns
 
     def __gt__(self, obj: 'Stock') -> bool:
-        return self.__J_returns > obj.get_J_returns()
+        return self.__J_returns > obj.__J_returns
 
     def __le__(self, obj: 'Stock') -> bool:
-        return self.__J_returns <= obj.get_J_returns()
+        return self.__J_returns <= obj.__J_returns
 
     def __ge__(self, obj: 'Stock') -> bool:
-        return self.__J_returns >= obj.get_J_returns()
+        return self.__J_returns >= obj.__J_returns
 
     def __eq__(self, obj: 'Stock') -> bool:
-        return self.__J_returns == obj.get_J_returns()
+        return self.__J_returns == obj.__J_returns
 
     def __str__(self) -> str:
         return self.__ticker_code
@@ -65,4 +112,4 @@ class Stock:
         return self.__J_returns
 
     def get_amount(self) -> float:
-        return self.__amount
\ No newline at end of file
+        return self.__amount
@@ -0,0 +1,176 @@
+"""
+Per-task telemetry of a grid search: when each task was submitted, started and ended, on which worker, and how many
+bytes its arguments and result take pickled. Aggregated into a utilization report, it shows whether a search is
+limited by compute, by sending data to and from workers, or by the pool sitting idle behind a few slow tasks, and it
+can be exported as a Chrome trace (open in chrome://tracing or https://ui.perfetto.dev) to see this on a timeline.
+
+Times are wall clock (`time.time()`), so they can be compared between processes.
+"""
+import os
+import json
+import time
+import pickle
+import threading
+import numpy as np
+import pandas as pd
+from typing import Callable, Collection, Tuple
+
+
+def pickled_size(obj) -> int:
+    """
+    Gets the number of bytes obj takes pickled, as it would be sent to or from a process pool worker
+    """
+    return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def timed_task(fn: Callable, pickled: bool, *args, **kwargs) -> Tuple[object, dict]:
+    """
+    Runs a task on a worker, timing it. Submitted in place of fn when telemetry is on
+
+    Parameters:
+        - fn (Callable): Task to run with args and kwargs
+        - pickled (bool): Whether the result is pickled to be sent back (from a process pool), so its size is measured
+
+    Returns:
+        - object: Result of fn
+        - dict: 'pid' and 'thread' of the worker, 'start' and 'end' times, and the pickled size of the result (0 if
+                it is not pickled)
+    """
+    start = time.time()
+    result = fn(*args, **kwargs)
+    end = time.time()
+    return result, {'pid': os.getpid(), 'thread': threading.get_ident(), 'start': start, 'end': end,
+                    'result_bytes': pickled_size(result) if pickled else 0}
+
+
+class Telemetry:
+    """
+    Collects the telemetry of every task of a grid search, from the parent process's side (submit and receive times
+    and pickled argument sizes) and the worker's (see `timed_task()`)
+    """
+
+    def __init__(self):
+        self.__records = []
+        # Workers of the pool the tasks ran on, set by the grid search once it has picked its backend
+        self.__workers = 1
+
+    def submit(self, name: str, args: tuple | None = None) -> dict:
+        """
+        Records a task being submitted
+
+        Parameters:
+            - name (str): Name of the task, E.g., the runs it holds
+            - args (tuple | None): Arguments it is submitted with if they are pickled (to a process pool), or None
+
+        Returns:
+            - dict: Record of the task, to pass to `receive()` once it finishes
+        """
+        return {'name': name, 'submit': time.time(), 'args_bytes': pickled_size(args) if args is not None else 0}
+
+    def receive(self, record: dict, worker: dict):
+        """
+        Records a finished task, with the worker's side of its telemetry from `timed_task()`
+        """
+        record.update(worker)
+        record['receive'] = time.time()
+        self.__records.append(record)
+
+    def get_records(self) -> list:
+        return self.__records
+
+    def set_workers(self, workers: int):
+        self.__workers = workers
+
+    def get_workers(self) -> int:
+        return self.__workers
+
+
+def task_table(records: Collection[dict]) -> pd.DataFrame:
+    """
+    Gets a table of every task's telemetry, with times in seconds since the first submit, and how long each task
+    waited in the queue, computed, and took to be received once done
+
+    Returns:
+        - pd.DataFrame: One row per task, in order of start
+    """
+    columns = ['name', 'pid', 'thread', 'submit', 'start', 'end', 'receive', 'args_bytes', 'result_bytes']
+    table = pd.DataFrame(list(records), columns=columns)
+    if len(table):
+        origin = table['submit'].min()
+        for column in ('submit', 'start', 'end', 'receive'):
+            table[column] -= origin
+    table['queue_wait'] = table['start'] - table['submit']
+    table['compute'] = table['end'] - table['start']
+    table['return_wait'] = table['receive'] - table['end']
+    return table.sort_values('start', kind='stable').reset_index(drop=True)
+
+
+def utilization_report(records: Collection[dict], workers: int, straggler_factor: float = 3.0) -> dict:
+    """
+    Aggregates task telemetry into a utilization report
+
+    Parameters:
+        - records (Collection[dict]): Records from `Telemetry.get_records()`
+        - workers (int): Workers of the pool
+        - straggler_factor (float): Tasks computing for longer than this many times the median task are stragglers
+
+    Returns:
+        - dict: 'tasks', 'wall_time' (first submit to last receive), 'busy_time' (summed compute), 'utilization'
+                (busy time over workers x wall time), 'idle_time' (the rest of workers x wall time), mean
+                'queue_wait', 'compute' and 'return_wait', total 'args_bytes' and 'result_bytes', the 'stragglers'
+                (names of tasks), and 'workers', a table of each worker's tasks, busy time and utilization
+    """
+    table = task_table(records)
+    wall_time = float(table['receive'].max()) if len(table) else 0.0
+    busy_time = float(table['compute'].sum())
+    capacity = max(workers, 1) * wall_time
+    median = table['compute'].median() if len(table) else np.nan
+    by_worker = table.groupby(['pid', 'thread']).agg(tasks=('name', 'size'), busy_time=('compute', 'sum'))
+    by_worker['utilization'] = by_worker['busy_time'] / wall_time if wall_time > 0 else np.nan
+    return {
+        'tasks': len(table),
+        'wall_time': wall_time,
+        'busy_time': busy_time,
+        'utilization': busy_time / capacity if capacity > 0 else np.nan,
+        'idle_time': max(capacity - busy_time, 0.0),
+        'queue_wait': float(table['queue_wait'].mean()) if len(table) else np.nan,
+        'compute': float(table['compute'].mean()) if len(table) else np.nan,
+        'return_wait': float(table['return_wait'].mean()) if len(table) else np.nan,
+        'args_bytes': int(table['args_bytes'].sum()),
+        'result_bytes': int(table['result_bytes'].sum()),
+        'stragglers': table.loc[table['compute'] > straggler_factor * median, 'name'].tolist(),
+        'workers': by_worker.reset_index(),
+    }
+
+
+def chrome_trace(records: Collection[dict]) -> dict:
+    """
+    Builds a Chrome trace-event document of the tasks: one lane per worker thread with a slice for each task's
+    compute, and a lane per task in the parent process (numbered by order of start) for the time it waited in the
+    queue
+
+    Returns:
+        - dict: Trace with 'traceEvents', in microseconds since the first submit
+    """
+    table = task_table(records)
+    events = []
+    parent = os.getpid()
+    events.append({'name': 'process_name', 'ph': 'M', 'pid': parent, 'args': {'name': 'queue'}})
+    for pid in table['pid'].unique():
+        if pid != parent:
+            events.append({'name': 'process_name', 'ph': 'M', 'pid': int(pid), 'args': {'name': f'worker {pid}'}})
+    for row in table.itertuples():
+        args = {'args_bytes': int(row.args_bytes), 'result_bytes': int(row.result_bytes)}
+        events.append({'name': row.name, 'cat': 'queue', 'ph': 'X', 'pid': parent, 'tid': row.Index,
+                       'ts': row.submit * 1e6, 'dur': row.queue_wait * 1e6})
+        events.append({'name': row.name, 'cat': 'compute', 'ph': 'X', 'pid': int(row.pid), 'tid': int(row.thread),
+                       'ts': row.start * 1e6, 'dur': row.compute * 1e6, 'args': args})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def save_chrome_trace(records: Collection[dict], filepath: str):
+    """
+    Saves a Chrome trace of the tasks (see `chrome_trace()`) as JSON
+    """
+    with open(filepath, "w") as f:
+        json.dump(chrome_trace(records), f)
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+from typing import Collection
+
+from utils.month_calendar import MonthCalendar
+
+
+# How often positions can be created. Look-back and holding periods are counted in rows of the data either way, so
+# on daily data J and K are in trading days
+REBALANCE_FREQUENCIES = ('daily', 'weekly', 'monthly')
+
+
+class TradingCalendar:
+    """
+    Maps every trading day of daily stock data to a dense integer index (the row of that day), like `MonthCalendar`
+    does for monthly data. Days without trading are simply absent, so unlike months, gaps are not errors.
+
+    Parameters:
+        - dates (Collection[pd.Timestamp]): Date of each row of the stock data, in ascending order
+
+    Raises:
+        - ValueError: If dates are not in strictly ascending order
+    """
+
+    def __init__(self, dates: Collection[pd.Timestamp]):
+        self.__dates = pd.DatetimeIndex(dates)
+        if len(self.__dates) and not (self.__dates.is_monotonic_increasing and self.__dates.is_unique):
+            raise ValueError("Dates in stock data are not in strictly ascending order")
+
+    def __len__(self) -> int:
+        return len(self.__dates)
+
+    def index_of(self, date: pd.Timestamp) -> int:
+        """
+        Gets the index of a trading day
+
+        Raises:
+            - KeyError: If the day is not in the stock data
+        """
+        day = pd.Timestamp(date).normalize()
+        index = int(self.__dates.searchsorted(day))
+        if index >= len(self.__dates) or self.__dates[index].normalize() != day:
+            raise KeyError(f"Day {date} not found in stock data")
+        return index
+
+    def date_of(self, day: int) -> pd.Timestamp:
+        """
+        Gets the date of the row of a day index
+        """
+        return self.__dates[day]
+
+    def get_dates(self) -> pd.DatetimeIndex:
+        return self.__dates
+
+
+def make_calendar(dates: Collection[pd.Timestamp]) -> MonthCalendar | TradingCalendar:
+    """
+    Creates the calendar for stock data: a `MonthCalendar` (which checks for missing months) for monthly data, or a
+    `TradingCalendar` for daily data, told apart by the typical spacing of the dates
+    """
+    dates = pd.DatetimeIndex(dates)
+    if len(dates) > 1 and pd.Series(dates).diff().median() < pd.Timedelta(days=20):
+        return TradingCalendar(dates)
+    return MonthCalendar(dates)
+
+
+def rebalance_mask(dates: Collection[pd.Timestamp], frequency: str) -> np.ndarray:
+    """
+    Marks the rows positions are created on: every row for 'daily', or the first row of each week or month. On
+    monthly data, 'monthly' (and 'weekly') marks every row
+
+    Parameters:
+        - dates (Collection[pd.Timestamp]): Date of each row of the stock data
+        - frequency (str): One of `REBALANCE_FREQUENCIES`
+
+    Returns:
+        - np.ndarray: Boolean mask of rebalance rows
+
+    Raises:
+        - ValueError: If frequency is not one of `REBALANCE_FREQUENCIES`
+    """
+    if frequency not in REBALANCE_FREQUENCIES:
+        raise ValueError(f"Rebalance frequency {frequency} invalid. Must be one of {REBALANCE_FREQUENCIES}")
+    dates = pd.DatetimeIndex(dates)
+    mask = np.ones(len(dates), dtype=bool)
+    if frequency != 'daily' and len(dates):
+        periods = dates.to_period('W' if frequency == 'weekly' else 'M')
+        mask[1:] = periods[1:] != periods[:-1]
+    return mask
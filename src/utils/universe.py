@@ -0,0 +1,146 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Collection
+
+from utils.screener import find_screener, load_screener
+
+
+# Screener columns the universe can be filtered on
+FILTER_COLUMNS = ('Volume', 'Market Cap', 'IPO Year', 'Industry')
+
+
+def load_excluded_codes(filepath: str) -> set:
+    """
+    Loads ticker codes to leave out of the universe from a file of codes separated by commas or new lines (E.g.,
+    'data/excluded_codes.txt'). A missing file excludes nothing
+    """
+    if not os.path.exists(filepath):
+        return set()
+    with open(filepath, "r") as f:
+        return {code.strip() for code in f.read().replace("\n", ",").split(",") if code.strip()}
+
+
+def universe_mask(screener: pd.DataFrame, min_volume: float | None = None, min_market_cap: float | None = None,
+                  min_ipo_year: int | None = None, max_ipo_year: int | None = None,
+                  excluded_industries: Collection[str] = ()) -> pd.Series:
+    """
+    Builds a mask of the screener's symbols that pass every filter, with one vectorised comparison per column.
+    Symbols missing a value a filter needs (E.g., no IPO year when filtering on it) fail that filter
+
+    Parameters:
+        - screener (pd.DataFrame): Screener columns from `utils.screener.load_screener()`, indexed by symbol
+        - min_volume (float | None): Lowest daily share volume
+        - min_market_cap (float | None): Lowest market capitalisation, in USD
+        - min_ipo_year (int | None): Earliest IPO year
+        - max_ipo_year (int | None): Latest IPO year, E.g., to leave out listings too recent to have J months of data
+        - excluded_industries (Collection[str]): Industries to leave out, E.g., 'Blank Checks' for SPAC shells
+
+    Returns:
+        - pd.Series: Boolean mask indexed by symbol
+    """
+    mask = pd.Series(True, index=screener.index)
+    bounds = (('Volume', min_volume, np.greater_equal), ('Market Cap', min_market_cap, np.greater_equal),
+              ('IPO Year', min_ipo_year, np.greater_equal), ('IPO Year', max_ipo_year, np.less_equal))
+    for column, bound, compare in bounds:
+        if bound is not None:
+            values = pd.to_numeric(screener[column], errors='coerce')
+            mask &= compare(values, bound)
+    if excluded_industries:
+        mask &= ~screener['Industry'].isin(list(excluded_industries))
+    return mask
+
+
+def select_tickers(tickers: Collection[str], mask: pd.Series | None = None,
+                   excluded_codes: Collection[str] = ()) -> list:
+    """
+    Filters tickers of the stock data by a screener mask and an exclusion list. Tickers the screener does not list
+    (E.g., stocks on other exchanges) cannot be judged by it, so are kept unless excluded by code
+
+    Parameters:
+        - tickers (Collection[str]): Tickers of the stock data, in column order
+        - mask (pd.Series | None): Mask from `universe_mask()`, or None to only apply the exclusion list
+        - excluded_codes (Collection[str]): Codes to leave out
+
+    Returns:
+        - list: Tickers kept, in column order
+    """
+    excluded = set(excluded_codes)
+    if mask is not None:
+        excluded |= set(mask.index[~mask.to_numpy()])
+    return [ticker for ticker in tickers if ticker not in excluded]
+
+
+def filter_columns(columns: Collection[str], tickers: Collection[str]) -> list:
+    """
+    Gets the columns of stock data to load for a universe of tickers: 'Date', and the price and returns column of
+    each ticker, in their original order
+    """
+    keep = set(tickers)
+    return [col for col in columns if col == 'Date' or col in keep or (col.endswith('Returns') and col[:-7] in keep)]
+
+
+def csv_tickers(csv_filepath: str) -> list:
+    """
+    Gets the tickers of a stock data CSV from its header alone
+    """
+    columns = pd.read_csv(csv_filepath, nrows=0).columns
+    return [col[:-7] for col in columns if col != 'Date' and col.endswith('Returns')]
+
+
+""" COMMAND LINE """
+
+
+def add_universe_args(parser: argparse.ArgumentParser):
+    """
+    Adds the universe filter options shared by main.py and worker.py to a parser
+    """
+    parser.add_argument("--min-volume", type=float, default=None, help="Leave out screener symbols below this volume")
+    parser.add_argument("--min-market-cap", type=float, default=None,
+                        help="Leave out screener symbols below this market cap (USD)")
+    parser.add_argument("--min-ipo-year", type=int, default=None, help="Leave out symbols listed before this year")
+    parser.add_argument("--max-ipo-year", type=int, default=None, help="Leave out symbols listed after this year")
+    parser.add_argument("--exclude-industries", default="",
+                        help="Comma separated screener industries to leave out, E.g., 'Blank Checks'")
+    parser.add_argument("--excluded-codes", default="../data/excluded_codes.txt",
+                        help="File of comma separated ticker codes to leave out")
+    parser.add_argument("--universe-screener", default=None,
+                        help="NASDAQ screener CSV to filter on. Defaults to the latest data/nasdaq_screener_*.csv")
+
+
+def universe_args(args: argparse.Namespace) -> list:
+    """
+    Turns parsed universe options back into command line arguments, E.g., to start workers with the same universe
+    """
+    values = {"--min-volume": args.min_volume, "--min-market-cap": args.min_market_cap,
+              "--min-ipo-year": args.min_ipo_year, "--max-ipo-year": args.max_ipo_year,
+              "--exclude-industries": args.exclude_industries, "--excluded-codes": args.excluded_codes,
+              "--universe-screener": args.universe_screener}
+    return [part for name, value in values.items() if value not in (None, "") for part in (name, str(value))]
+
+
+def universe_from_args(args: argparse.Namespace, data_filepath: str) -> list | None:
+    """
+    Builds the universe of tickers to load from parsed universe options, once, from the stock data's header, the
+    screener and the exclusion list
+
+    Returns:
+        - list | None: Tickers to load, or None to load every ticker when no filter is set
+    """
+    if not os.path.exists(data_filepath):
+        # Nothing to filter, E.g., when running on a panel that was built (with its universe) before
+        return None
+    excluded_codes = load_excluded_codes(args.excluded_codes)
+    industries = [industry.strip() for industry in args.exclude_industries.split(",") if industry.strip()]
+    bounds = (args.min_volume, args.min_market_cap, args.min_ipo_year, args.max_ipo_year)
+    mask = None
+    if industries or any(bound is not None for bound in bounds):
+        screener_filepath = args.universe_screener if args.universe_screener is not None else find_screener()
+        if screener_filepath is None:
+            raise FileNotFoundError("No NASDAQ screener CSV found to filter the universe with")
+        screener = load_screener(screener_filepath, FILTER_COLUMNS)
+        mask = universe_mask(screener, *bounds, excluded_industries=industries)
+    elif not excluded_codes:
+        return None
+    return select_tickers(csv_tickers(data_filepath), mask, excluded_codes)
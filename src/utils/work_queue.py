@@ -0,0 +1,222 @@
+import sqlite3
+import time
+from typing import Collection, Tuple
+
+from utils.results_store import ResultsStore
+from utils.run_result import RunResult
+
+
+class WorkQueue:
+    """
+    Work queue of grid search runs kept in a SQLite file, so that worker processes on any host that can open the file
+    can take runs from it. A coordinator enqueues (J, K, ratio, cash) tasks, and each worker leases a task, runs it and
+    writes the result back into the same file (readable with `ResultsStore`).
+
+    Leases expire after lease_timeout seconds unless renewed with `renew()`, so tasks held by a worker that crashed are
+    handed to another worker, and only the worker holding a task's lease can complete it. A task that fails
+    max_attempts times is marked as failed.
+
+    SQLite relies on file locks, so the file must be on a filesystem with working locks (a local disk, or a network
+    filesystem with locking enabled).
+
+    Parameters:
+        - filepath (str): Path to the queue file, created if it does not exist
+        - lease_timeout (float): Seconds a lease lasts before the task can be taken by another worker
+        - max_attempts (int): Number of times a task is tried before it is marked as failed
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            J INTEGER NOT NULL,
+            K INTEGER NOT NULL,
+            ratio REAL NOT NULL,
+            cash REAL NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            worker TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            run_id INTEGER REFERENCES runs(run_id),
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS tasks_status ON tasks(status, lease_expires);
+    """
+
+    def __init__(self, filepath: str, lease_timeout: float = 600, max_attempts: int = 3):
+        # Autocommit mode, so transactions are started explicitly with BEGIN IMMEDIATE
+        self.__connection = sqlite3.connect(filepath, timeout=60, isolation_level=None)
+        self.__connection.executescript(ResultsStore.SCHEMA + WorkQueue.SCHEMA)
+        self.__lease_timeout = lease_timeout
+        self.__max_attempts = max_attempts
+
+    def __enter__(self) -> 'WorkQueue':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.__connection.close()
+
+
+    """ COORDINATOR """
+
+
+    def enqueue(self, tasks: Collection[Tuple[int, int, float, float]]) -> Collection[int]:
+        """
+        Adds tasks to the queue
+
+        Parameters:
+            - tasks (Collection[Tuple[int, int, float, float]]): (J, K, ratio, cash) of each run
+
+        Returns:
+            - Collection[int]: task_id of each task added
+        """
+        task_ids = []
+        self.__connection.execute("BEGIN IMMEDIATE")
+        try:
+            for J, K, ratio, cash in tasks:
+                cursor = self.__connection.execute("INSERT INTO tasks (J, K, ratio, cash) VALUES (?, ?, ?, ?)",
+                                                   (J, K, ratio, cash))
+                task_ids.append(cursor.lastrowid)
+            self.__connection.execute("COMMIT")
+        except BaseException:
+            self.__connection.execute("ROLLBACK")
+            raise
+        return task_ids
+
+    def get_counts(self, task_ids: Collection[int] | None = None) -> dict:
+        """
+        Gets the number of tasks in each status ('pending', 'leased', 'done', 'failed')
+
+        Parameters:
+            - task_ids (Collection[int] | None): Tasks to count, or None for every task
+        """
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        sql = "SELECT status, COUNT(*) FROM tasks"
+        params = ()
+        if task_ids is not None:
+            task_ids = list(task_ids)
+            sql += f" WHERE task_id IN ({','.join('?' * len(task_ids))})"
+            params = task_ids
+        for status, count in self.__connection.execute(sql + " GROUP BY status", params):
+            counts[status] = count
+        return counts
+
+    def get_run_ids(self, task_ids: Collection[int] | None = None) -> Collection[int]:
+        """
+        Gets the run_id of the result of each finished task, for loading with `ResultsStore.load_results()`
+        """
+        rows = self.__connection.execute("SELECT task_id, run_id FROM tasks WHERE status = 'done'").fetchall()
+        task_ids = set(task_ids) if task_ids is not None else None
+        return [run_id for task_id, run_id in rows if task_ids is None or task_id in task_ids]
+
+    def expire_leases(self) -> int:
+        """
+        Marks tasks whose last allowed attempt's lease expired as failed. Workers do this whenever they lease a task,
+        and the coordinator does it too, so such tasks are failed even when no worker is left to lease
+
+        Returns:
+            - int: Number of tasks marked as failed
+        """
+        self.__connection.execute("BEGIN IMMEDIATE")
+        try:
+            expired = self.__fail_expired(time.time())
+            self.__connection.execute("COMMIT")
+        except BaseException:
+            self.__connection.execute("ROLLBACK")
+            raise
+        return expired
+
+    def __fail_expired(self, now: float) -> int:
+        """
+        Marks leased tasks that expired before now on their last allowed attempt as failed, so they are not handed out
+        again. Must be called inside a transaction
+        """
+        cursor = self.__connection.execute(
+            "UPDATE tasks SET status = 'failed', error = 'Lease expired' "
+            "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?", (now, self.__max_attempts))
+        return cursor.rowcount
+
+
+    """ WORKER """
+
+
+    def lease(self, worker: str) -> Tuple[int, int, int, float, float] | None:
+        """
+        Takes the oldest pending task, or a task whose lease has expired
+
+        Parameters:
+            - worker (str): Identifier of the worker taking the task
+
+        Returns:
+            - Tuple[int, int, int, float, float] | None: (task_id, J, K, ratio, cash), or None if no task is available
+        """
+        now = time.time()
+        self.__connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.__fail_expired(now)
+            task = self.__connection.execute(
+                "SELECT task_id, J, K, ratio, cash FROM tasks WHERE status = 'pending' "
+                "OR (status = 'leased' AND lease_expires < ?) ORDER BY task_id LIMIT 1", (now,)).fetchone()
+            if task is not None:
+                self.__connection.execute(
+                    "UPDATE tasks SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                    "WHERE task_id = ?", (worker, now + self.__lease_timeout, task[0]))
+            self.__connection.execute("COMMIT")
+        except BaseException:
+            self.__connection.execute("ROLLBACK")
+            raise
+        return task
+
+    def renew(self, task_id: int, worker: str) -> bool:
+        """
+        Extends the lease on a task
+
+        Returns:
+            - bool: False if the worker no longer holds the lease
+        """
+        cursor = self.__connection.execute(
+            "UPDATE tasks SET lease_expires = ? WHERE task_id = ? AND worker = ? AND status = 'leased'",
+            (time.time() + self.__lease_timeout, task_id, worker))
+        return cursor.rowcount == 1
+
+    def complete(self, task_id: int, worker: str, result: RunResult) -> bool:
+        """
+        Writes a task's result and marks it as done, in one transaction. The result is discarded if the worker no
+        longer holds the lease: the task was leased again by another worker (which may still be running it), finished,
+        or failed.
+
+        Returns:
+            - bool: Whether the result was saved
+        """
+        self.__connection.execute("BEGIN IMMEDIATE")
+        try:
+            task = self.__connection.execute("SELECT status, worker FROM tasks WHERE task_id = ?",
+                                             (task_id,)).fetchone()
+            saved = task is not None and task[0] == 'leased' and task[1] == worker
+            if saved:
+                run_id = ResultsStore.write_result(self.__connection, result)
+                self.__connection.execute(
+                    "UPDATE tasks SET status = 'done', run_id = ?, error = NULL WHERE task_id = ?", (run_id, task_id))
+            self.__connection.execute("COMMIT")
+        except BaseException:
+            self.__connection.execute("ROLLBACK")
+            raise
+        return saved
+
+    def fail(self, task_id: int, worker: str, error: str):
+        """
+        Releases a task that raised an error, so it is retried, or marks it as failed after max_attempts
+        """
+        self.__connection.execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "worker = NULL, lease_expires = NULL, error = ? WHERE task_id = ? AND worker = ? AND status = 'leased'",
+            (self.__max_attempts, error, task_id, worker))
+
+    def is_finished(self) -> bool:
+        """
+        Whether every task is done or failed
+        """
+        counts = self.get_counts()
+        return counts['pending'] == 0 and counts['leased'] == 0
@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+
+def make_data(months=40, tickers=30, seed=0) -> pd.DataFrame:
+    """ Random stock data with no missing prices, so runs do not end in NaN cash """
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.05, (months, tickers))
+    prices = 50 * np.exp(np.cumsum(returns, axis=0))
+    returns[rng.random(returns.shape) < 0.05] = np.nan
+    tickers = [f"S{i}" for i in range(tickers)]
+    df = pd.DataFrame(prices, columns=tickers)
+    df = pd.concat([df, pd.DataFrame(returns, columns=[f"{t}Returns" for t in tickers])], axis=1)
+    df.insert(0, 'Date', pd.date_range("2000-01-01", periods=months, freq="MS"))
+    return df
+
+
+def make_daily_data(days=300, tickers=30, seed=0) -> pd.DataFrame:
+    """ Random stock data with one row per business day """
+    df = make_data(months=days, tickers=tickers, seed=seed)
+    df['Date'] = pd.bdate_range("2020-01-01", periods=days)
+    return df
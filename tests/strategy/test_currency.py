@@ -0,0 +1,51 @@
+from unittest import TestCase
+import pandas as pd
+import numpy as np
+import json
+from utils.currency import convert_prices_to_usd
+
+
+class CurrencyTest(TestCase):
+
+    def setUp(self):
+        self.df = pd.read_csv("data/dummy_data.csv")
+        self.df['Date'] = pd.to_datetime(self.df['Date'], format="%d/%m/%Y")
+
+        with open("data/code_to_currency_test.json", "r") as f:
+            self.code_to_currency = json.load(f)
+
+        # Daily rates, so each month has to be aligned to the last rate on or before it
+        self.fx_rates = pd.DataFrame({
+            "Date": pd.date_range("1999-12-31", "2000-06-30", freq="D"),
+        })
+        self.fx_rates["GBP"] = 2.0
+        self.fx_rates.loc[self.fx_rates["Date"] >= "2000-03-15", "GBP"] = 1.5
+
+    def test_all_usd_unchanged(self):
+        converted = convert_prices_to_usd(self.df, self.code_to_currency, self.fx_rates)
+        pd.testing.assert_frame_equal(converted, self.df)
+
+    def test_non_usd_converted(self):
+        self.code_to_currency["B"] = "GBP"
+        converted = convert_prices_to_usd(self.df, self.code_to_currency, self.fx_rates)
+
+        expected = self.df["B"].to_numpy() * np.array([2.0, 2.0, 2.0, 1.5, 1.5, 1.5])
+        np.testing.assert_array_equal(converted["B"].to_numpy(), expected)
+        # Returns and other tickers are not touched
+        pd.testing.assert_series_equal(converted["BReturns"], self.df["BReturns"])
+        pd.testing.assert_series_equal(converted["A"], self.df["A"])
+
+    def test_missing_currency_left_unconverted(self):
+        self.code_to_currency["B"] = "JPY"
+        converted = convert_prices_to_usd(self.df, self.code_to_currency, self.fx_rates)
+        pd.testing.assert_series_equal(converted["B"], self.df["B"])
+
+    def test_fx_rates_starting_after_stock_data(self):
+        self.code_to_currency["B"] = "GBP"
+        late_rates = self.fx_rates[self.fx_rates["Date"] >= "2000-03-15"]
+        with self.assertLogs(level='WARNING') as logs:
+            converted = convert_prices_to_usd(self.df, self.code_to_currency, late_rates)
+        assert "GBP" in logs.output[0] and "2000-03-15" in logs.output[0]
+        # Months before the first rate are NaN rather than silently left in GBP
+        assert converted["B"][:3].isna().all()
+        np.testing.assert_array_equal(converted["B"].to_numpy()[3:], self.df["B"].to_numpy()[3:] * 1.5)
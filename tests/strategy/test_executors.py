@@ -0,0 +1,57 @@
+from unittest import TestCase
+import os
+import random
+import tempfile
+from src.strategy.main import Main
+from utils.executors import (TASK_CELLS, SerialExecutor, make_executor, choose_backend, choose_chunk_size,
+                             chunked)
+from utils.grid import Grid
+from tests.strategy.helpers import make_data
+
+
+class ExecutorTest(TestCase):
+
+    def test_serial_executor(self):
+        executor = SerialExecutor()
+        assert executor.submit(pow, 2, 10).result() == 1024
+        with self.assertRaises(ZeroDivisionError):
+            executor.submit(divmod, 1, 0).result()
+        with self.assertRaises(ValueError):
+            make_executor('gpu', 2)
+
+    def test_choose_backend(self):
+        big = TASK_CELLS
+        assert choose_backend(100, big, 1, releases_gil=True) == 'serial'
+        assert choose_backend(1, big, 8, releases_gil=True) == 'serial'
+        # Less work in total than one task is worth
+        assert choose_backend(10, 100, 8, releases_gil=False) == 'serial'
+        assert choose_backend(100, big, 8, releases_gil=True) == 'thread'
+        assert choose_backend(100, big, 8, releases_gil=False) == 'process'
+        assert choose_backend(100, big, 8, releases_gil=True, profile=True) == 'process'
+
+    def test_choose_chunk_size(self):
+        assert choose_chunk_size('thread', 1000, 100, 4) == 1
+        # Small runs are batched, but every worker still gets several tasks
+        assert choose_chunk_size('process', 1000, TASK_CELLS // 50, 4) == 50
+        assert choose_chunk_size('process', 1000, 100, 4) == 63
+        assert choose_chunk_size('process', 1000, TASK_CELLS * 2, 4) == 1
+        assert [len(chunk) for chunk in chunked(range(7), 3)] == [3, 3, 1]
+
+    def test_backends_give_same_results(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "stock_data.csv")
+            make_data(months=40, tickers=30).to_csv(filepath, index=False)
+            missing = os.path.join(directory, "missing.json")
+            m = Main(filepath, missing, missing)
+            tallies = {}
+            for backend, chunk_size in (('serial', None), ('thread', None), ('process', 3)):
+                random.seed(0)
+                results = m.run_grid_parameters(iterations=7, cash=1000, grid=Grid({"J": [2, 3], "K": [1, 2],
+                                                                                    "ratio": [0.1, 0.5]}),
+                                                max_workers=2, plot=False, engine='array', executor=backend,
+                                                chunk_size=chunk_size)
+                tallies[backend] = sorted((r.get_J(), r.get_K(), r.get_ratio(), tuple(r.get_cash_tally()))
+                                          for r in results)
+            assert len(tallies['serial']) == 7
+            assert tallies['thread'] == tallies['serial']
+            assert tallies['process'] == tallies['serial']
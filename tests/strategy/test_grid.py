@@ -0,0 +1,44 @@
+from unittest import TestCase
+import random
+from src.strategy.main import DEFAULT_GRID, parse_args
+from utils.grid import Grid
+
+
+class GridTest(TestCase):
+
+    def test_integer_specs(self):
+        assert Grid.parse_spec("1:13") == list(range(1, 13))
+        assert Grid.parse_spec("1:10:3") == [1, 4, 7]
+        assert Grid.parse_spec("5:1:-2") == [5, 3]
+        assert all(isinstance(value, int) for value in Grid.parse_spec("1:4"))
+
+    def test_float_specs(self):
+        # Stop is excluded, and values that land a rounding error short of it are kept
+        assert Grid.parse_spec("0:1:0.3") == [0.0, 0.3, 0.6, 0.9]
+        assert Grid.parse_spec("0.1:0.4:0.1") == [0.1, 0.2, 0.3]
+        assert Grid.parse_spec("0:1:0.25") == [0.0, 0.25, 0.5, 0.75]
+        ratios = Grid.parse_spec(DEFAULT_GRID["ratio"])
+        assert len(ratios) == 20 and ratios[7] == 0.07 and ratios[-1] == 0.19
+
+    def test_list_specs(self):
+        assert Grid.parse_spec("1,3,6") == [1, 3, 6]
+        assert Grid.parse_spec("0.1,0.25") == [0.1, 0.25]
+        assert Grid.parse_spec("4") == [4]
+
+    def test_malformed_specs(self):
+        for spec in ("", "a", "1,,2", "1:b", "1:2:3:4", "1:5:0", "0:1:0.0"):
+            with self.assertRaises(ValueError):
+                Grid.parse_spec(spec)
+
+    def test_from_specs(self):
+        grid = Grid.from_specs({"J": "3:5", "K": "2", "ratio": "0.1,0.2"})
+        assert grid.get_grid() == {"J": [3, 4], "K": [2], "ratio": [0.1, 0.2]}
+        random.seed(0)
+        assert grid.get_J() in (3, 4) and grid.get_K() == 2 and grid.get_ratio() in (0.1, 0.2)
+
+    def test_grid_arguments(self):
+        args = parse_args(["--J", "3:9:3", "--K", "1,2", "--ratio", "0:0.3:0.1"])
+        grid = Grid.from_specs({"J": args.J, "K": args.K, "ratio": args.ratio})
+        assert grid.get_grid() == {"J": [3, 6], "K": [1, 2], "ratio": [0.0, 0.1, 0.2]}
+        args = parse_args([])
+        assert Grid.from_specs({"J": args.J, "K": args.K, "ratio": args.ratio}).get_grid()["J"] == list(range(1, 13))
@@ -0,0 +1,109 @@
+from unittest import TestCase
+import os
+import tempfile
+import numpy as np
+from src.strategy.grouping import MIN_GROUP_SIZE, group_codes, group_selection_counts, select_grouped
+from src.strategy.signals import SignalTable
+from src.strategy.strategy import JKStrategy
+from src.strategy.strategy_controller import StrategyController
+from utils.screener import load_groups
+from tests.strategy.helpers import make_data
+
+
+class GroupingTest(TestCase):
+
+    def setUp(self):
+        self.df = make_data(months=40, tickers=60)
+        tickers = [f"S{i}" for i in range(60)]
+        # Uneven groups, one smaller than a decile needs, and a few tickers without a group
+        sectors = ['Tech'] * 25 + ['Health'] * 20 + ['Energy'] * 7 + [None] * 8
+        np.random.default_rng(1).shuffle(sectors)
+        self.groups = {ticker: sector for ticker, sector in zip(tickers, sectors) if sector is not None}
+
+    def test_group_codes(self):
+        codes = group_codes(['A', 'B', 'C', 'D'], {'A': 'Tech', 'B': 'Energy', 'D': 'Tech'})
+        np.testing.assert_array_equal(codes, [0, 1, 2, 0])
+
+    def test_one_group_matches_whole_universe(self):
+        signals = SignalTable(self.df, J=3)
+        scores, eligible = signals.get_scores(), signals.get_eligible()
+        winners, losers, counts = select_grouped(scores, eligible, np.zeros(scores.shape[1], dtype=np.int64))
+        expected = signals.calculate_selections()
+        np.testing.assert_array_equal(counts, expected[2])
+        np.testing.assert_array_equal(winners, expected[0])
+        np.testing.assert_array_equal(losers, expected[1])
+
+    def test_deciles_within_each_group(self):
+        signals = SignalTable(self.df, J=3, groups=self.groups)
+        winners, losers, counts = signals.calculate_selections()
+        codes = signals.get_groups()
+        plain = SignalTable(self.df, J=3)
+
+        for month in range(len(self.df)):
+            # Reference: rank each group's stocks on their own and take their deciles, skipping groups too small
+            expected_winners, expected_losers = [], []
+            ranked = plain.ranked_stocks(month)
+            for code in range(codes.max() + 1):
+                group = [stock for stock in ranked if codes[plain.get_tickers().index(str(stock))] == code]
+                if len(group) < MIN_GROUP_SIZE:
+                    continue
+                group_winners, group_losers = JKStrategy.get_winners_and_losers(group)
+                expected_winners += [str(stock) for stock in group_winners]
+                expected_losers += [str(stock) for stock in group_losers]
+            assert counts[month] == len(expected_winners)
+            assert [str(s) for s in signals.selected_stocks(month, winners[month])] == expected_winners
+            assert [str(s) for s in signals.selected_stocks(month, losers[month])] == expected_losers
+
+    def test_small_groups_are_skipped(self):
+        signals = SignalTable(self.df, J=3)
+        scores, eligible = signals.get_scores(), signals.get_eligible()
+        # A group of one, a group of five and one large group of everything else
+        codes = np.full(scores.shape[1], 2, dtype=np.int64)
+        codes[0] = 0
+        codes[1:6] = 1
+        winners, losers, counts = select_grouped(scores, eligible, codes)
+        for month in range(len(self.df)):
+            selected = set(winners[month, :counts[month]]) | set(losers[month, :counts[month]])
+            # Never bought and shorted at once, nor selected from the small groups
+            assert not set(winners[month, :counts[month]]) & set(losers[month, :counts[month]])
+            assert not selected & set(range(6))
+            assert counts[month] == eligible[month, 6:].sum() // 10
+
+        # Below a decile, a group still needs two eligible tickers for its best and worst stock
+        sizes, group_counts = group_selection_counts(eligible, codes, min_group_size=2)
+        assert (group_counts[:, 0] == 0).all()
+        np.testing.assert_array_equal(group_counts[:, 1], sizes[:, 1] >= 2)
+        with self.assertRaises(ValueError):
+            select_grouped(scores, eligible, codes, min_group_size=1)
+
+    def test_neutral_run(self):
+        tallies = []
+        for engine in StrategyController.ENGINES:
+            controller = StrategyController(3, 2, 0.5, 1000, engine=engine, groups=self.groups)
+            controller.run(self.df)
+            tallies.append(controller.get_result().get_cash_tally())
+        np.testing.assert_array_equal(tallies[0], tallies[1])
+
+        plain = StrategyController(3, 2, 0.5, 1000, engine='array')
+        plain.run(self.df)
+        assert not np.array_equal(plain.get_result().get_cash_tally(), tallies[1])
+
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "run.npz")
+            controller = StrategyController(3, 2, 0.5, 1000, groups=self.groups)
+            controller.run(self.df, checkpoint_filepath=filepath, stop_month=10)
+            restored = StrategyController.load_checkpoint(filepath)
+            assert restored.get_groups() == self.groups
+            restored.run(self.df)
+            np.testing.assert_array_equal(restored.get_result().get_cash_tally(), tallies[0])
+
+    def test_load_groups(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "nasdaq_screener_1.csv")
+            with open(filepath, "w") as f:
+                f.write("Symbol,Name,Country,Sector\nAAA,A Inc,United States,Technology\n"
+                        "BBB,B Inc,China,\nCCC,C Inc,,Energy\n")
+            assert load_groups(filepath, 'Sector') == {'AAA': 'Technology', 'CCC': 'Energy'}
+            assert load_groups(filepath, 'Country') == {'AAA': 'United States', 'BBB': 'China'}
+            with self.assertRaises(ValueError):
+                load_groups(filepath, 'Name')
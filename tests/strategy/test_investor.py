@@ -2,7 +2,6 @@ import unittest
 from unittest.mock import Mock
 from datetime import datetime
 import pandas as pd
-from pandas.tseries.offsets import DateOffset
 from src.strategy.investor import Investor
 from utils.portfolio_type import PortfolioType
 
@@ -83,16 +82,15 @@ class TestInvestor(unittest.TestCase):
         print("BEGIN")
         winners = [self.winner_stock]
         losers = [self.loser_stock]
-        date = datetime.now()
+        current_month = 1
 
         # Create a position K months ago
-        self.investor.create_position(winners, losers, date - DateOffset(months=1))
+        self.investor.create_position(winners, losers, current_month - 1)
 
         current_stocks = pd.Series({'WIN': 120, 'LOS': 40})
-        current_date = date
 
         initial_cash = self.investor.get_cash()
-        self.investor.settle_position(current_date, current_stocks, 1)
+        self.investor.settle_position(current_month, current_stocks, 1)
 
         # Ensure portfolio is settled and cash is updated correctly
         expected_cash = initial_cash + (25 * 120) - (50 * 40)
@@ -86,23 +86,22 @@ class TestInvestorEdgeCases(unittest.TestCase):
 
         # No portfolios created, but settle_position is called
         with self.assertRaises(KeyError):
-            self.investor.settle_position(datetime.now(), current_stocks, K=1)
+            self.investor.settle_position(1, current_stocks, K=1)
 
     def test_date_mismatch_on_settle(self):
         """ Test settling position with a date mismatch """
         winners = [self.winner_stock]
         losers = [self.loser_stock]
-        date = datetime.now()
+        month = 0
 
-        # Create a position today
-        self.investor.create_position(winners, losers, date)
+        # Create a position this month
+        self.investor.create_position(winners, losers, month)
 
         current_stocks = pd.Series({'WIN': 120, 'LOS': 40})
-        future_date = date + DateOffset(months=2)
 
         # Attempt to settle a position from 2 months in the future
         with self.assertRaises(KeyError):
-            self.investor.settle_position(future_date, current_stocks, 1)
+            self.investor.settle_position(month + 2, current_stocks, 1)
 
     def test_non_numeric_cash_values(self):
         """ Test with non-numeric cash values """
@@ -0,0 +1,50 @@
+from unittest import TestCase, skipUnless
+import numpy as np
+from src.strategy.kernels import simulate, monthly_settle_from, NUMBA_AVAILABLE
+from src.strategy.signals import SignalTable
+from src.strategy.strategy_controller import StrategyController
+from tests.strategy.helpers import make_data
+
+
+class KernelTest(TestCase):
+
+    def setUp(self):
+        self.df = make_data()
+
+    def simulate(self, J, K, ratio, use_numba):
+        signals = SignalTable(self.df, J)
+        winners, losers, counts = signals.calculate_selections()
+        counts = np.where(np.arange(len(self.df)) >= J, counts, 0)
+        return simulate(signals.get_prices(), winners, losers, counts, monthly_settle_from(len(self.df), J, K),
+                        ratio, 1000, use_numba=use_numba)
+
+    @skipUnless(NUMBA_AVAILABLE, "numba not installed")
+    def test_numba_matches_python(self):
+        for J, K, ratio in [(1, 1, 0.1), (3, 6, 0.5), (6, 2, 2.0)]:
+            compiled = self.simulate(J, K, ratio, use_numba=True)
+            interpreted = self.simulate(J, K, ratio, use_numba=False)
+            np.testing.assert_array_equal(compiled[1], interpreted[1])
+            np.testing.assert_array_equal(compiled[2], interpreted[2])
+            assert compiled[0] == interpreted[0] and compiled[3] == interpreted[3]
+
+    def test_array_engine_matches_object_engine(self):
+        for J, K, ratio in [(1, 1, 0.1), (3, 6, 0.5), (6, 2, 2.0)]:
+            controllers = [StrategyController(J, K, ratio, 1000, engine=engine) for engine in ('object', 'array')]
+            for controller in controllers:
+                controller.run(self.df)
+            object_result, array_result = [c.get_result() for c in controllers]
+            # Cash is bit-identical, position value is summed in a different order
+            np.testing.assert_array_equal(object_result.get_cash_tally(), array_result.get_cash_tally())
+            np.testing.assert_allclose(object_result.get_position_tally(), array_result.get_position_tally(),
+                                       rtol=1e-12, atol=1e-9)
+            assert object_result.get_bankrupt() == array_result.get_bankrupt()
+
+    def test_selections_match_ranking(self):
+        signals = SignalTable(self.df, 2)
+        winners, losers, counts = signals.calculate_selections()
+        for month in range(len(self.df)):
+            ranked = [str(s) for s in signals.ranked_stocks(month)]
+            n = counts[month]
+            tickers = signals.get_tickers()
+            assert [tickers[i] for i in losers[month, :n]] == ranked[:n]
+            assert [tickers[i] for i in winners[month, :n]] == ranked[len(ranked) - n:]
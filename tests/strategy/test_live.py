@@ -0,0 +1,61 @@
+from unittest import TestCase
+import os
+import tempfile
+import numpy as np
+from src.strategy.live import LiveStrategy
+from src.strategy.signals import SignalTable
+from src.strategy.strategy_controller import StrategyController
+from utils.exceptions import MissingMonthsError
+from tests.strategy.helpers import make_data
+
+
+class LiveStrategyTest(TestCase):
+
+    def setUp(self):
+        self.df = make_data(months=60, tickers=40)
+
+    def test_matches_backtest(self):
+        for J, K, ratio in [(1, 1, 0.1), (3, 6, 0.5), (7, 2, 2.0)]:
+            live = LiveStrategy.from_history(self.df, J, K, ratio, 1000)
+            controller = StrategyController(J, K, ratio, 1000, engine='array')
+            controller.run(self.df)
+            expected = controller.get_result()
+            result = live.get_result()
+            np.testing.assert_array_equal(result.get_cash_tally(), expected.get_cash_tally())
+            np.testing.assert_array_equal(result.get_position_tally(), expected.get_position_tally())
+            assert result.get_bankrupt() == expected.get_bankrupt()
+
+    def test_selections_match_signals(self):
+        J = 4
+        signals = SignalTable(self.df, J)
+        winners, losers, counts = signals.calculate_selections()
+        tickers = signals.get_tickers()
+        live = LiveStrategy(tickers, J, 3, 0.5, 1000)
+        for month, (_, row) in enumerate(self.df.iterrows()):
+            month_winners, month_losers = live.append_row(row)
+            if month < J:
+                assert month_winners == [] and month_losers == []
+                continue
+            assert month_winners == [tickers[i] for i in winners[month, :counts[month]]]
+            assert month_losers == [tickers[i] for i in losers[month, :counts[month]]]
+
+    def test_save_and_load(self):
+        groups = {f"S{i}": ('Tech', 'Energy')[i % 2] for i in range(30)}
+        live = LiveStrategy.from_history(self.df.iloc[:30], 3, 4, 0.5, 1000, groups=groups)
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "live.npz")
+            live.save(filepath)
+            live = LiveStrategy.load(filepath)
+        for _, row in self.df.iloc[30:].iterrows():
+            live.append_row(row)
+
+        expected = LiveStrategy.from_history(self.df, 3, 4, 0.5, 1000, groups=groups)
+        np.testing.assert_array_equal(live.get_cash_tally(), expected.get_cash_tally())
+        assert live.get_dates() == expected.get_dates()
+
+    def test_months_must_follow_on(self):
+        live = LiveStrategy.from_history(self.df.iloc[:10], 3, 2, 0.5, 1000)
+        with self.assertRaises(MissingMonthsError):
+            live.append_row(self.df.iloc[11])
+        with self.assertRaises(ValueError):
+            live.append_row(self.df.iloc[9])
@@ -0,0 +1,93 @@
+from unittest import TestCase
+import tracemalloc
+from src.strategy.strategy_controller import StrategyController
+from utils.memory_profile import MemoryProfile, ConcurrencyLimiter, memory_table, count_instances
+from utils.stock import Stock
+from tests.strategy.helpers import make_data
+
+
+class FixedProfile:
+
+    def __init__(self, peak_rss: int):
+        self.peak_rss = peak_rss
+
+    def get_peak_rss(self) -> int:
+        return self.peak_rss
+
+
+class MemoryProfileTest(TestCase):
+
+    def test_snapshots_at_chosen_months(self):
+        df = make_data()
+        controller = StrategyController(2, 2, 0.5, 1000)
+        profile = MemoryProfile(snapshot_months=[3, 6])
+        profile.start()
+        controller.run(df, profile=profile)
+        profile.stop()
+
+        assert [snapshot['month'] for snapshot in profile.get_snapshots()] == [3, 6]
+        assert not tracemalloc.is_tracing()
+        later = profile.get_snapshots()[1]
+        # Portfolios from every month so far are still held by the Investor
+        assert later['Portfolio'] > 0 and later['Stock'] > 0
+        assert later['traced'] > 0 and len(later['top']) > 0
+        assert profile.get_peak_rss() > 0
+
+    def test_peak_only_without_months(self):
+        df = make_data()
+        profile = MemoryProfile()
+        profile.start()
+        assert not tracemalloc.is_tracing()
+        StrategyController(2, 2, 0.5, 1000, engine='array').run(df, profile=profile)
+        profile.stop()
+        assert profile.get_snapshots() == []
+        assert profile.get_peak_rss() > 0
+
+    def test_array_engine_snapshots_once(self):
+        profile = MemoryProfile(snapshot_months=[1, 2])
+        profile.start()
+        StrategyController(2, 2, 0.5, 1000, engine='array').run(make_data(), profile=profile)
+        profile.stop()
+        assert len(profile.get_snapshots()) == 1
+
+    def test_count_instances(self):
+        before = count_instances()['Stock']
+        stocks = [Stock(str(i), 0.1, 1.0) for i in range(5)]
+        assert count_instances()['Stock'] == before + len(stocks)
+
+    def test_memory_table(self):
+        df = make_data()
+        controller = StrategyController(2, 2, 0.5, 1000)
+        profile = MemoryProfile(snapshot_months=[4])
+        profile.start()
+        controller.run(df, profile=profile)
+        profile.stop()
+        result = controller.get_result()
+        result.set_memory_profile(profile)
+        unprofiled = StrategyController(1, 1, 0.5, 1000)
+        unprofiled.run(df)
+
+        table = memory_table([result, unprofiled.get_result()])
+        assert len(table) == 1
+        assert table['J'][0] == 2 and table['month'][0] == 4
+        assert {'peak_rss', 'Stock', 'Portfolio', 'top_allocation'} <= set(table.columns)
+
+    def test_concurrency_limiter(self):
+        # No budget, no cap below the workers
+        limiter = ConcurrencyLimiter(8)
+        limiter.update(FixedProfile(10 ** 9))
+        assert limiter.get_limit() == 8
+
+        limiter = ConcurrencyLimiter(8, memory_budget=1000)
+        # One run at a time until a peak is known
+        assert limiter.get_limit() == 1
+        limiter.update(FixedProfile(300))
+        assert limiter.get_limit() == 3
+        # Smaller peaks do not raise the cap again
+        limiter.update(FixedProfile(100))
+        assert limiter.get_limit() == 3
+        limiter.update(FixedProfile(600))
+        assert limiter.get_limit() == 1
+        limiter.update(FixedProfile(5000))
+        assert limiter.get_limit() == 1
+        assert ConcurrencyLimiter(4, memory_budget=10 ** 6).get_limit() == 1
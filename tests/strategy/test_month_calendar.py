@@ -0,0 +1,53 @@
+from unittest import TestCase
+import pandas as pd
+from utils.month_calendar import MonthCalendar
+from utils.exceptions import MissingMonthsError
+from src.strategy.strategy_controller import StrategyController
+
+
+class MonthCalendarTest(TestCase):
+
+    def setUp(self):
+        self.df = pd.read_csv("data/dummy_data.csv")
+        self.df['Date'] = pd.to_datetime(self.df['Date'], format="%d/%m/%Y")
+
+    def test_index_of(self):
+        calendar = MonthCalendar(self.df['Date'])
+        assert len(calendar) == 6
+        assert calendar.index_of(pd.Timestamp("2000-01-01")) == 0
+        # Any day in a month maps to that month's index
+        assert calendar.index_of(pd.Timestamp("2000-04-17")) == 3
+        assert calendar.date_of(5) == pd.Timestamp("2000-06-01")
+
+    def test_index_of_outside_data(self):
+        calendar = MonthCalendar(self.df['Date'])
+        with self.assertRaises(KeyError):
+            calendar.index_of(pd.Timestamp("1999-12-01"))
+        with self.assertRaises(KeyError):
+            calendar.index_of(pd.Timestamp("2000-07-01"))
+
+    def test_missing_month(self):
+        with self.assertRaises(MissingMonthsError) as context:
+            MonthCalendar(self.df['Date'].drop(index=2))
+        assert "2000-03" in str(context.exception)
+
+    def test_unordered_or_duplicated_months(self):
+        with self.assertRaises(ValueError):
+            MonthCalendar(self.df['Date'].iloc[::-1])
+        with self.assertRaises(ValueError):
+            MonthCalendar(pd.concat([self.df['Date'], self.df['Date'].iloc[-1:]]))
+
+    def test_run_detects_missing_month_before_running(self):
+        controller = StrategyController(J=1, K=1, ratio=0.1, cash=1000)
+        with self.assertRaises(MissingMonthsError):
+            controller.run(self.df.drop(index=2))
+        # Nothing was run
+        assert controller.get_cash_tally() == []
+
+    def test_run_ignores_index_labels(self):
+        df = self.df.iloc[:5]
+        controller = StrategyController(J=1, K=1, ratio=0.1, cash=1000)
+        controller.run(df)
+        relabelled = StrategyController(J=1, K=1, ratio=0.1, cash=1000)
+        relabelled.run(df.set_axis(range(100, 105)))
+        assert relabelled.get_cash_tally() == controller.get_cash_tally()
@@ -0,0 +1,117 @@
+from unittest import TestCase
+import os
+import pickle
+import tempfile
+import numpy as np
+import pandas as pd
+from src.strategy.signals import SignalTable
+from src.strategy.strategy_controller import StrategyController
+from src.strategy.main import Main
+from utils.panel import Panel
+from utils.exceptions import PanelMismatchError
+from tests.strategy.helpers import make_data
+
+
+class PanelTest(TestCase):
+
+    def setUp(self):
+        self.df = make_data(months=50, tickers=37)
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory = temporary.name
+        self.panel = Panel.from_frame(self.df, self.directory, chunk_months=7)
+
+    def test_from_frame(self):
+        assert Panel.exists(self.directory)
+        assert len(self.panel) == 50
+        np.testing.assert_array_equal(self.panel.get_prices(), self.df[self.panel.get_tickers()].to_numpy())
+        assert isinstance(self.panel.get_prices(), np.memmap)
+
+    def test_from_csv(self):
+        csv_filepath = os.path.join(self.directory, "data.csv")
+        self.df.to_csv(csv_filepath, index=False)
+        panel = Panel.from_csv(csv_filepath, os.path.join(self.directory, "from_csv"), chunk_months=11)
+        df = pd.read_csv(csv_filepath)
+        np.testing.assert_array_equal(panel.get_returns(), df[[f"{t}Returns" for t in panel.get_tickers()]].to_numpy())
+        assert (panel.get_dates() == self.panel.get_dates()).all()
+
+    def test_pickles_as_directory(self):
+        restored = pickle.loads(pickle.dumps(self.panel))
+        assert len(pickle.dumps(self.panel)) < 1000
+        np.testing.assert_array_equal(restored.get_prices(), self.panel.get_prices())
+
+    def test_chunked_signals_match_in_memory(self):
+        for J in (1, 3, 12):
+            expected = SignalTable(self.df, J)
+            # Blocks smaller than J check that look-backs reach across block boundaries
+            actual = SignalTable.from_panel(self.panel, J, shards=2, chunk_months=9, chunk_tickers=5)
+            np.testing.assert_array_equal(expected.get_scores(), actual.get_scores())
+            np.testing.assert_array_equal(expected.get_eligible(), actual.get_eligible())
+            for x, y in zip(expected.calculate_selections(), actual.calculate_selections()):
+                np.testing.assert_array_equal(x, y)
+            assert expected.get_exclusions().equals(actual.get_exclusions())
+            assert os.path.exists(os.path.join(self.directory, f"scores_J{J}_{self.panel.get_key()}.npy"))
+
+    def test_run_on_panel(self):
+        for engine in StrategyController.ENGINES:
+            tallies = []
+            for data in (self.df, self.panel):
+                controller = StrategyController(3, 2, 0.5, 1000, engine=engine)
+                controller.run(data)
+                tallies.append(controller.get_result().get_cash_tally())
+            np.testing.assert_array_equal(*tallies)
+
+    def test_manifest(self):
+        csv_filepath = os.path.join(self.directory, "data.csv")
+        self.df.to_csv(csv_filepath, index=False)
+        fx_filepath = os.path.join(self.directory, "fx.csv")
+        with open(fx_filepath, "w") as f:
+            f.write("Date,GBP\n2000-01-01,1.5\n")
+        sources = {'fx': fx_filepath}
+        panel = Panel.from_csv(csv_filepath, os.path.join(self.directory, "from_csv"), sources=sources)
+        manifest = panel.get_manifest()
+        assert manifest['dtype'] == 'float64' and manifest['tickers'] is None
+        assert manifest['sources']['data']['size'] == os.path.getsize(csv_filepath)
+        panel.validate(csv_filepath, sources)
+
+        # Rewriting a source makes the panel stale
+        os.utime(fx_filepath, ns=(0, 0))
+        with self.assertRaises(PanelMismatchError):
+            panel.validate(csv_filepath, sources)
+        # A source that is gone cannot be checked, so only warns
+        os.remove(fx_filepath)
+        with self.assertLogs(level='WARNING'):
+            panel.validate(csv_filepath, sources)
+
+    def test_stale_panel_is_not_reused(self):
+        csv_filepath = os.path.join(self.directory, "data.csv")
+        self.df.to_csv(csv_filepath, index=False)
+        missing = os.path.join(self.directory, "missing.json")
+        panel_dir = os.path.join(self.directory, "main_panel")
+        Main(csv_filepath, missing, missing, panel_dir)
+        # Reused while the CSV is unchanged
+        Main(csv_filepath, missing, missing, panel_dir)
+        self.df.iloc[:40].to_csv(csv_filepath, index=False)
+        with self.assertRaises(PanelMismatchError):
+            Main(csv_filepath, missing, missing, panel_dir)
+
+    def test_panel_dtype_must_match(self):
+        csv_filepath = os.path.join(self.directory, "data.csv")
+        self.df.to_csv(csv_filepath, index=False)
+        missing = os.path.join(self.directory, "missing.json")
+        panel_dir = os.path.join(self.directory, "float32_panel")
+        m = Main(csv_filepath, missing, missing, panel_dir, dtype='float32')
+        assert m.get_data().get_prices().dtype == np.float32
+        Main(csv_filepath, missing, missing, panel_dir, dtype='float32')
+        with self.assertRaises(PanelMismatchError):
+            Main(csv_filepath, missing, missing, panel_dir, dtype='float64')
+        with self.assertRaises(PanelMismatchError):
+            self.panel.validate(csv_filepath, dtype='float32')
+
+    def test_signal_caches_keyed_to_manifest(self):
+        SignalTable.from_panel(self.panel, 3)
+        # Rebuilt in place from other data, so the old caches must not be picked up
+        df = make_data(months=50, tickers=37, seed=1)
+        rebuilt = Panel.from_frame(df, self.directory)
+        assert rebuilt.get_key() != self.panel.get_key()
+        np.testing.assert_array_equal(SignalTable.from_panel(rebuilt, 3).get_scores(), SignalTable(df, 3).get_scores())
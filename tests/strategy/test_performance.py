@@ -0,0 +1,133 @@
+from unittest import TestCase
+import numpy as np
+from src.strategy.signals import SignalTable
+from src.strategy.strategy_controller import StrategyController
+from utils.performance import (performance_statistics, performance_table, max_drawdowns, newey_west_t, period_returns,
+                               stack_results)
+from utils.run_result import RunResult
+from tests.strategy.helpers import make_data
+
+
+class PerformanceTest(TestCase):
+
+    def test_statistics_of_known_series(self):
+        values = np.array([[100, 110, 99, 121, 121],
+                           [100, 100, 100, 100, 100]], dtype=np.float64)
+        table = performance_statistics(values, periods_per_year=12)
+        returns = np.diff(values[0]) / values[0, :-1]
+
+        assert np.isclose(table['annual_return'][0], 1.21 ** (12 / 4) - 1)
+        assert np.isclose(table['annual_volatility'][0], returns.std(ddof=1) * np.sqrt(12))
+        assert np.isclose(table['sharpe'][0], returns.mean() / returns.std(ddof=1) * np.sqrt(12))
+        assert np.isclose(table['sortino'][0], returns.mean() / np.sqrt((np.minimum(returns, 0) ** 2).mean()) *
+                          np.sqrt(12))
+        assert np.isclose(table['max_drawdown'][0], 99 / 110 - 1)
+        # Below the peak of 110 at 99 only, then a new peak
+        assert table['max_drawdown_periods'][0] == 1
+        # The unchanged final month is not counted
+        assert np.isclose(table['hit_rate'][0], 2 / 3)
+
+        # A flat run has no risk, so no ratios
+        assert table['annual_return'][1] == 0
+        assert np.isnan(table['sharpe'][1]) and np.isnan(table['newey_west_t'][1])
+        assert table['max_drawdown'][1] == 0 and table['max_drawdown_periods'][1] == 0
+
+    def test_bankrupt_run(self):
+        values = np.array([[100, 120, 60, -5, -5]], dtype=np.float64)
+        table = performance_statistics(values)
+        assert table['annual_return'][0] == -1
+        assert np.isclose(table['max_drawdown'][0], -5 / 120 - 1)
+        assert table['max_drawdown_periods'][0] == 3
+        # Returns are undefined once the value is not positive
+        assert np.isnan(period_returns(values)[0, 3])
+
+    def test_drawdown_duration_is_longest_stretch(self):
+        values = np.array([[1, 0.9, 1.1, 1, 0.9, 1, 1.05, 1.2, np.nan, 1.3]])
+        drawdown, durations = max_drawdowns(values)
+        # 1.1 is regained after 4 months below it; the missing value is carried forward from the peak of 1.2
+        assert durations[0] == 4
+        assert np.isclose(drawdown[0], 0.9 / 1.1 - 1)
+
+        # Missing values after a fall are still below the peak
+        _, durations = max_drawdowns(np.array([[1, 0.5, np.nan, np.nan, 1]]))
+        assert durations[0] == 3
+
+    def test_newey_west_without_lags_is_plain_t(self):
+        returns = np.random.default_rng(0).normal(0.01, 0.05, size=(3, 60))
+        expected = returns.mean(axis=1) / (returns.std(axis=1) / np.sqrt(60))
+        assert np.allclose(newey_west_t(returns, lags=0), expected)
+
+        # Positively autocorrelated returns have wider HAC errors, so a smaller t-statistic
+        trending = np.cumsum(returns, axis=1) / 10 + 0.01
+        assert (np.abs(newey_west_t(trending, lags=4)) < np.abs(newey_west_t(trending, lags=0))).all()
+
+        # Missing returns are skipped
+        gaps = returns.copy()
+        gaps[:, 30:] = np.nan
+        assert np.allclose(newey_west_t(gaps, lags=0), newey_west_t(returns[:, :30], lags=0))
+
+    def test_table_is_joined_to_parameters(self):
+        df = make_data()
+        results = []
+        for J, K, ratio in ((1, 1, 0.5), (2, 3, 0.2), (3, 2, 0.8)):
+            controller = StrategyController(J, K, ratio, 1000, engine='array')
+            controller.run(df)
+            results.append(controller.get_result())
+
+        table = performance_table(results, len(df))
+        assert list(table['J']) == [1, 2, 3] and list(table['K']) == [1, 3, 2]
+        assert list(table.columns[:5]) == ['J', 'K', 'ratio', 'final_cash', 'bankrupt']
+        assert len(table) == 3
+
+        values = stack_results(results, len(df))
+        assert values.shape == (3, len(df))
+        expected = results[1].get_cash_tally() + np.nan_to_num(results[1].get_position_tally())
+        assert np.array_equal(values[1], expected, equal_nan=True)
+        # Statistics of one run do not depend on the others stacked with it
+        alone = performance_table(results[1:2], len(df))
+        assert np.allclose(alone.iloc[0, 5:].astype(float), table.iloc[1, 5:].astype(float), equal_nan=True)
+
+    def test_equity_of_a_real_run(self):
+        """ A run's equity is its cash plus the long less the short market value of the positions not yet settled """
+        df = make_data(months=60, tickers=40)
+        J, K, ratio = 3, 1, 0.5
+        signals = SignalTable(df, J)
+        winners, losers, counts = signals.calculate_selections()
+        prices = signals.get_prices()
+
+        # Replays the run one position at a time, valuing only the positions still open
+        cash, positions, expected = 1000.0, {}, []
+        for t in range(len(df)):
+            n = counts[t] if t >= J else 0
+            if n > 0:
+                cash_per_stock = cash * ratio / (n + n)
+                longs = {w: cash_per_stock // prices[t, w] for w in winners[t, :n]}
+                shorts = {l: cash_per_stock // prices[t, l] for l in losers[t, :n]}
+                cash += sum(prices[t, l] * a for l, a in shorts.items())
+                cash -= sum(prices[t, w] * a for w, a in longs.items())
+                positions[t] = (longs, shorts)
+            if t > J + K and t - K in positions:
+                longs, shorts = positions.pop(t - K)
+                cash += sum(prices[t, w] * a for w, a in longs.items())
+                cash -= sum(prices[t, l] * a for l, a in shorts.items())
+            expected.append(cash + sum(prices[t, w] * a - prices[t, l] * b for longs, shorts in positions.values()
+                                       for (w, a), (l, b) in zip(longs.items(), shorts.items())))
+        expected = np.array([expected])
+
+        for engine in StrategyController.ENGINES:
+            controller = StrategyController(J, K, ratio, 1000, engine=engine)
+            controller.run(df)
+            result = controller.get_result()
+            assert not result.get_bankrupt()
+            values = stack_results([result], len(df))
+            np.testing.assert_allclose(values, expected, rtol=1e-9)
+            # The hit rate is left out, as rounding can turn the replay's unchanged months into tiny returns
+            columns = ['final_equity', 'annual_return', 'annual_volatility', 'sharpe', 'sortino', 'max_drawdown',
+                       'newey_west_t']
+            np.testing.assert_allclose(performance_table([result], len(df))[columns].iloc[0],
+                                       performance_statistics(expected)[columns].iloc[0], rtol=1e-6)
+
+    def test_stack_results_pads_short_tallies(self):
+        result = RunResult(1, 1, 0.5, 100, 50, True, np.array([100.0, 80.0, 50.0]), np.array([10.0]))
+        values = stack_results([result], 5)
+        assert np.array_equal(values[0], [110, 80, 50, np.nan, np.nan], equal_nan=True)
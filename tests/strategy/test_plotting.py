@@ -0,0 +1,57 @@
+from unittest import TestCase
+import os
+import random
+import tempfile
+import numpy as np
+from src.strategy.main import Main
+from utils.grid import Grid
+from tests.strategy.helpers import make_data
+from src.strategy.plotting import lttb_downsample, stack_tallies, top_n_runs, resolve_mode
+
+
+class PlottingTest(TestCase):
+
+    def test_lttb_keeps_endpoints_and_peaks(self):
+        x = np.arange(1000)
+        y = np.zeros(1000)
+        y[500] = 10
+        x_down, y_down = lttb_downsample(x, y, 50)
+        assert len(x_down) == 50
+        assert x_down[0] == 0 and x_down[-1] == 999
+        assert 500 in x_down
+        assert (np.diff(x_down) > 0).all()
+
+    def test_lttb_short_series_unchanged(self):
+        x, y = np.arange(10), np.arange(10.0)
+        x_down, y_down = lttb_downsample(x, y, 20)
+        np.testing.assert_array_equal(x_down, x)
+        np.testing.assert_array_equal(y_down, y)
+
+    def test_stack_tallies_pads_short_runs(self):
+        stacked = stack_tallies([[1, 2, 3], [4]], 3)
+        np.testing.assert_array_equal(stacked, [[1, 2, 3], [4, np.nan, np.nan]])
+
+    def test_top_n_runs(self):
+        stacked = np.array([[0, 1], [0, np.nan], [0, 3], [0, 2]], dtype=float)
+        assert top_n_runs(stacked, 2).tolist() == [2, 3]
+        assert top_n_runs(stacked, 4).tolist()[-1] == 1
+
+    def test_resolve_mode(self):
+        assert resolve_mode('auto', 5) == 'lines'
+        assert resolve_mode('auto', 500) == 'fan'
+        with self.assertRaises(ValueError):
+            resolve_mode('scatter', 5)
+
+    def test_grid_search_waits_for_saved_figures(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "stock_data.csv")
+            make_data(months=20, tickers=10).to_csv(filepath, index=False)
+            missing = os.path.join(directory, "missing.json")
+            output_dir = os.path.join(directory, "output")
+            random.seed(0)
+            Main(filepath, missing, missing).run_grid_parameters(
+                iterations=2, cash=1000, grid=Grid({"J": [2], "K": [1], "ratio": [0.1]}), max_workers=1,
+                output_dir=output_dir, plot=True, engine='array')
+            # Rendered in a background process, but saved before the search returns
+            assert os.path.exists(os.path.join(output_dir, "cash.png"))
+            assert os.path.exists(os.path.join(output_dir, "position.png"))
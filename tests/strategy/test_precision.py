@@ -0,0 +1,58 @@
+from unittest import TestCase
+import numpy as np
+from src.strategy.signals import SignalTable
+from src.strategy.strategy_controller import StrategyController
+from src.strategy.precision_report import compare_precisions, summarise
+from utils.precision import cast_stock_data, get_dtype
+from tests.strategy.helpers import make_data
+
+
+class PrecisionTest(TestCase):
+
+    def setUp(self):
+        self.df = make_data()
+        self.single = cast_stock_data(self.df, 'float32')
+
+    def test_cast_stock_data(self):
+        assert self.single['Date'].dtype == self.df['Date'].dtype
+        assert (self.single.drop(columns='Date').dtypes == np.float32).all()
+        # Already in the precision, so not copied
+        assert cast_stock_data(self.df, 'float64') is self.df
+        with self.assertRaises(ValueError):
+            get_dtype('float16')
+
+    def test_signals_keep_float32(self):
+        signals = SignalTable(self.single, J=3)
+        assert signals.get_scores().dtype == np.float32
+        assert signals.get_prices().dtype == np.float32
+
+    def test_cash_stays_float64(self):
+        for engine in StrategyController.ENGINES:
+            controller = StrategyController(3, 2, 0.5, 1000, engine=engine)
+            controller.run(self.single)
+            assert isinstance(controller.get_cash(), float)
+            assert controller.get_result().get_cash_tally().dtype == np.float64
+
+    def test_engines_match_in_float32(self):
+        tallies = []
+        for engine in StrategyController.ENGINES:
+            controller = StrategyController(3, 2, 0.5, 1000, engine=engine)
+            controller.run(self.single)
+            tallies.append(controller.get_result().get_cash_tally())
+        np.testing.assert_array_equal(*tallies)
+
+    def test_compare_precisions(self):
+        report = compare_precisions(self.df, [1, 3])
+        assert len(report) == 2 * len(self.df)
+        assert report['winners_differ'].sum() == 0 and report['losers_differ'].sum() == 0
+
+        # S0 is the single winner in float64, but ties with S1 in float32, where column order makes S1 the winner
+        df = make_data(months=20, tickers=10)
+        for t in range(2, 10):
+            df[f'S{t}Returns'] = 0.01 * t
+        df['S0Returns'] = 0.5 + 1e-12
+        df['S1Returns'] = 0.5
+        summary = summarise(compare_precisions(df, [1]))
+        # Every month after the first has one winner swapped, which is two differing memberships
+        assert summary.loc[1, 'months_differ'] == 19
+        assert summary.loc[1, 'memberships_differ'] == 38
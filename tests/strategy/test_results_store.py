@@ -0,0 +1,44 @@
+from unittest import TestCase
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from utils.results_store import ResultsStore
+from utils.run_result import RunResult
+
+
+class ResultsStoreTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.directory.name, "results.db")
+        self.dates = pd.date_range("2000-01-01", periods=3, freq="MS")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_result(self, J, final_cash):
+        return RunResult(J, 1, 0.1, 1000, final_cash, False, np.array([1000, 1000, final_cash], dtype=float),
+                         np.array([0, 5, np.nan]))
+
+    def test_top_runs(self):
+        with ResultsStore(self.filepath, batch_size=2) as store:
+            store.set_dates(self.dates)
+            for J, final_cash in [(1, 900), (2, 1100), (3, 1050), (4, 2000), (5, np.nan)]:
+                store.add(self.make_result(J, final_cash))
+
+        # Reopened to check everything was written on close
+        with ResultsStore(self.filepath) as store:
+            top = store.top_runs(2, "J <= ?", (3,))
+            assert top['J'].tolist() == [2, 3]
+            assert store.top_runs(10)['J'].tolist() == [4, 2, 3, 1]
+
+    def test_series(self):
+        with ResultsStore(self.filepath) as store:
+            store.set_dates(self.dates)
+            store.add(self.make_result(1, 1200))
+            cash = store.get_series(1, 'cash')
+            position = store.get_series(1, 'position')
+        assert cash.tolist() == [1000, 1000, 1200]
+        assert cash.index.tolist() == ['2000-01-01', '2000-02-01', '2000-03-01']
+        assert position.iloc[:2].tolist() == [0, 5] and pd.isna(position.iloc[2])
@@ -0,0 +1,72 @@
+from unittest import TestCase
+import numpy as np
+from src.strategy.robustness import (subset_masks, universe_order, select_subsets, run_subsets, robustness_table,
+                                     summarise)
+from src.strategy.signals import SignalTable
+from src.strategy.strategy_controller import StrategyController
+from utils.performance import performance_table
+from utils.universe import filter_columns
+from tests.strategy.helpers import make_data
+
+
+class RobustnessTest(TestCase):
+
+    def setUp(self):
+        self.df = make_data(months=50, tickers=60)
+        self.tickers = [f"S{i}" for i in range(60)]
+
+    def test_subset_masks(self):
+        masks = subset_masks(60, 200, 0.5, 0.8, seed=3)
+        assert masks.shape == (200, 60)
+        assert masks.sum(axis=1).min() >= 30 and masks.sum(axis=1).max() <= 48
+        np.testing.assert_array_equal(masks, subset_masks(60, 200, 0.5, 0.8, seed=3))
+        assert not np.array_equal(masks, subset_masks(60, 200, 0.5, 0.8, seed=4))
+        with self.assertRaises(ValueError):
+            subset_masks(60, 10, 0.8, 0.5)
+
+    def test_subsets_match_runs_on_filtered_data(self):
+        masks = subset_masks(60, 12, seed=1)
+        # Small batches, so subsets are split over several
+        results = run_subsets(self.df, 3, 2, 0.5, 1000, masks, batch_size=5, workers=2)
+        assert len(results) == 12
+        for mask, result in zip(masks, results):
+            tickers = [ticker for ticker, keep in zip(self.tickers, mask) if keep]
+            controller = StrategyController(3, 2, 0.5, 1000, engine='array')
+            controller.run(self.df[filter_columns(self.df.columns, tickers)])
+            expected = controller.get_result()
+            np.testing.assert_array_equal(result.get_cash_tally(), expected.get_cash_tally())
+            np.testing.assert_array_equal(result.get_position_tally(), expected.get_position_tally())
+            assert result.get_cash() == expected.get_cash()
+
+    def test_numba_matches_numpy(self):
+        order, eligible = universe_order(SignalTable(self.df, 3))
+        masks = subset_masks(60, 9, 0.2, 0.9, seed=5)
+        for compiled, interpreted in zip(select_subsets(order, eligible, masks),
+                                         select_subsets(order, eligible, masks, use_numba=False)):
+            np.testing.assert_array_equal(compiled, interpreted)
+
+    def test_robustness_table(self):
+        masks = subset_masks(60, 20, seed=2)
+        table = robustness_table(run_subsets(self.df, 3, 2, 0.5, 1000, masks), masks, len(self.df))
+        assert list(table['subset']) == list(range(20))
+        np.testing.assert_allclose(table['fraction'], masks.mean(axis=1))
+        summary = summarise(table)
+        assert summary.loc['sharpe', 'count'] == 20
+        assert '50%' in summary.columns
+
+    def test_robustness_table_matches_runs_on_filtered_data(self):
+        masks = subset_masks(60, 6, seed=4)
+        table = robustness_table(run_subsets(self.df, 3, 2, 0.5, 1000, masks), masks, len(self.df))
+        expected = []
+        for mask in masks:
+            tickers = [ticker for ticker, keep in zip(self.tickers, mask) if keep]
+            controller = StrategyController(3, 2, 0.5, 1000, engine='array')
+            controller.run(self.df[filter_columns(self.df.columns, tickers)])
+            expected.append(controller.get_result())
+        expected = performance_table(expected, len(self.df))
+        columns = expected.columns[3:]
+        np.testing.assert_array_equal(table[columns].astype(float), expected[columns].astype(float))
+        # Statistics are of equity, which counts the positions still open at the end
+        final = [r.get_cash_tally()[-1] + r.get_position_tally()[-1]
+                 for r in run_subsets(self.df, 3, 2, 0.5, 1000, masks)]
+        np.testing.assert_allclose(table['final_equity'], final)
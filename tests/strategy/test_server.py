@@ -0,0 +1,91 @@
+from unittest import TestCase
+import json
+import threading
+import urllib.error
+import urllib.request
+from unittest import mock
+import numpy as np
+from src.strategy import server
+from src.strategy.server import BacktestService, make_server
+from src.strategy.strategy_controller import StrategyController
+from utils.run_result import RunResult
+from tests.strategy.helpers import make_data
+
+
+class ServerTest(TestCase):
+
+    def setUp(self):
+        self.df = make_data(months=40, tickers=30)
+        self.service = BacktestService(self.df, workers=0, cache_size=2, warm_J=[3])
+        self.server = make_server(self.service, port=0)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.close()
+
+    def get(self, path: str) -> dict:
+        with urllib.request.urlopen(self.url + path) as response:
+            return json.loads(response.read())
+
+    def test_backtest_matches_run(self):
+        body = self.get("/backtest?J=3&K=2&ratio=0.5&cash=1000")
+        controller = StrategyController(3, 2, 0.5, 1000, engine='array')
+        controller.run(self.df)
+        expected = controller.get_result()
+
+        assert not body['cached']
+        assert body['final_cash'] == expected.get_cash()
+        assert len(body['dates']) == len(self.df)
+        cash = np.array([np.nan if value is None else value for value in body['cash']])
+        np.testing.assert_array_equal(cash, RunResult.to_array(expected.get_cash_tally(), len(self.df)))
+
+        # The same query is answered from the cache
+        assert self.get("/backtest?J=3&K=2&ratio=0.5&cash=1000")['cached']
+        assert self.get("/health")['hits'] == 1
+
+    def test_cache_evicts_least_recent(self):
+        for K in (1, 2, 3):
+            self.service.backtest(3, K, 0.5)
+        assert not self.service.backtest(3, 1, 0.5)[1]
+        assert self.service.backtest(3, 3, 0.5)[1]
+
+    def test_selections_made_once_per_J(self):
+        # The SignalTable class the server itself imported
+        signal_table = server.SignalTable
+        with mock.patch.object(signal_table, 'calculate_selections', autospec=True,
+                               side_effect=signal_table.calculate_selections) as calculate_selections:
+            for K, rebalance in ((1, 'monthly'), (2, 'monthly'), (2, 'weekly')):
+                self.service.backtest(4, K, 0.5, rebalance=rebalance)
+            # Warm J=3 was selected at start up
+            self.service.backtest(3, 1, 0.5)
+        assert calculate_selections.call_count == 1
+
+    def test_process_pool_matches_in_process(self):
+        service = BacktestService(self.df, workers=2, warm_J=[3])
+        try:
+            for J, K in ((3, 2), (5, 1)):
+                expected, _ = self.service.backtest(J, K, 0.5)
+                actual, cached = service.backtest(J, K, 0.5)
+                assert not cached
+                np.testing.assert_array_equal(actual.get_cash_tally(), expected.get_cash_tally())
+                np.testing.assert_array_equal(actual.get_position_tally(), expected.get_position_tally())
+            assert service.backtest(3, 2, 0.5)[1]
+        finally:
+            service.close()
+
+    def test_failed_backtest(self):
+        with mock.patch.object(self.service, 'backtest', side_effect=RuntimeError("out of memory")):
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                self.get("/backtest?J=3&K=2&ratio=0.5")
+        assert context.exception.code == 500
+        assert "out of memory" in json.loads(context.exception.read())['error']
+
+    def test_bad_query(self):
+        for query in ("J=3&K=2", "J=3&K=2&ratio=0.5&engine=gpu", "J=0&K=2&ratio=0.5", "J=x&K=2&ratio=0.5",
+                      "J=3&K=2&ratio=nan", "J=3&K=2&ratio=inf", "J=3&K=2&ratio=0.5&cash=-Infinity"):
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                self.get(f"/backtest?{query}")
+            assert context.exception.code == 400
@@ -0,0 +1,44 @@
+from unittest import TestCase
+import numpy as np
+from src.strategy.sharding import shard_slices
+from src.strategy.signals import SignalTable
+from src.strategy.strategy_controller import StrategyController
+from tests.strategy.helpers import make_data
+
+
+class ShardingTest(TestCase):
+
+    def test_shard_slices(self):
+        slices = shard_slices(10, 3)
+        assert [(s.start, s.stop) for s in slices] == [(0, 3), (3, 6), (6, 10)]
+        # Never more shards than tickers
+        assert len(shard_slices(2, 8)) == 2
+
+    def test_sharded_selections_match_single_ranking(self):
+        df = make_data(months=30, tickers=137)
+        for J in (1, 3, 12):
+            single = SignalTable(df, J).calculate_selections()
+            for shards in (2, 3, 7, 200):
+                sharded = SignalTable(df, J, shards=shards)
+                np.testing.assert_array_equal(sharded.get_scores(), SignalTable(df, J).get_scores())
+                for expected, actual in zip(single, sharded.calculate_selections()):
+                    np.testing.assert_array_equal(expected, actual)
+
+    def test_ties_across_shards(self):
+        # Rounded returns give many equal scores, which must keep column order across shard boundaries
+        df = make_data(months=20, tickers=60)
+        returns = [col for col in df.columns if col.endswith('Returns')]
+        df[returns] = df[returns].round(1)
+        single = SignalTable(df, 2).calculate_selections()
+        for expected, actual in zip(single, SignalTable(df, 2, shards=4).calculate_selections()):
+            np.testing.assert_array_equal(expected, actual)
+
+    def test_sharded_run_matches(self):
+        df = make_data()
+        for engine in StrategyController.ENGINES:
+            results = []
+            for shards in (1, 4):
+                controller = StrategyController(3, 2, 0.5, 1000, engine=engine, shards=shards)
+                controller.run(df)
+                results.append(controller.get_result())
+            np.testing.assert_array_equal(results[0].get_cash_tally(), results[1].get_cash_tally())
@@ -0,0 +1,69 @@
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from src.strategy.signals import SignalTable
+from src.strategy.strategy import JKStrategy
+from tests.strategy.helpers import make_data
+
+
+class SignalTableTest(TestCase):
+
+    def setUp(self):
+        self.df = pd.read_csv("data/dummy_data.csv")
+        self.df['Date'] = pd.to_datetime(self.df['Date'], format="%d/%m/%Y")
+
+    def test_scores_J_2(self):
+        signals = SignalTable(self.df, J=2)
+        # Month 4 averages the returns of months 2 and 3
+        expected = self.df[['AReturns', 'BReturns', 'CReturns', 'DReturns', 'EReturns']].iloc[2:4].mean()
+        np.testing.assert_allclose(signals.get_scores()[4], expected.to_numpy())
+        # No look-back window before month 2
+        assert np.isnan(signals.get_scores()[:2]).all()
+
+    def test_eligible_J_1(self):
+        signals = SignalTable(self.df, J=1)
+        eligible = signals.get_eligible()
+        # Month 0 has no history, month 1 only has month 0's missing returns, and month 5 has no prices
+        assert not eligible[[0, 1, 5]].any()
+        assert eligible[2:5].all()
+
+    def test_exclusions(self):
+        exclusions = SignalTable(self.df, J=3).get_exclusions()
+        assert exclusions['eligible'].tolist() == [0, 0, 0, 0, 5, 0]
+        assert exclusions['insufficient_history'].tolist() == [5, 5, 5, 0, 0, 0]
+        assert exclusions['missing_returns'].tolist() == [0, 0, 0, 5, 0, 0]
+        assert exclusions['missing_price'].tolist() == [0, 0, 0, 0, 0, 5]
+
+    def test_exclusions_J_negative(self):
+        exclusions = SignalTable(self.df, J=-1).get_exclusions()
+        assert (exclusions['eligible'] == 0).all()
+        assert (exclusions['insufficient_history'] == 5).all()
+
+    def test_invalid_price(self):
+        self.df.loc[4, 'A'] = 0
+        signals = SignalTable(self.df, J=1)
+        assert signals.get_exclusions()['invalid_price'].tolist() == [0, 0, 0, 0, 1, 0]
+        assert 'A' not in [str(s) for s in signals.ranked_stocks(4)]
+
+    def test_selections_match_reference_ranking(self):
+        """
+        Both engines trade `calculate_selections()`, so it is checked month by month against the reference path of
+        ranking Stock objects with `JKStrategy.rank_stocks()` and taking deciles with `get_winners_and_losers()`
+        """
+        df = make_data(months=30, tickers=45)
+        # Tied scores, and months with fewer than 10 eligible tickers
+        df[[f"S{i}Returns" for i in range(5)]] = 0.01
+        df.loc[20:, [f"S{i}Returns" for i in range(8, 45)]] = np.nan
+        for J in (1, 3, 6):
+            strategy = JKStrategy(J)
+            for shards, workers in ((1, 1), (1, 4), (3, 1)):
+                signals = SignalTable(df, J, shards)
+                winners, losers, counts = signals.calculate_selections(workers)
+                for month, row in df.iterrows():
+                    expected_winners, expected_losers = JKStrategy.get_winners_and_losers(
+                        strategy.rank_stocks(df, month, row))
+                    assert counts[month] == len(expected_winners) == len(expected_losers)
+                    assert [str(s) for s in signals.selected_stocks(month, winners[month])] == \
+                           [str(s) for s in expected_winners]
+                    assert [str(s) for s in signals.selected_stocks(month, losers[month])] == \
+                           [str(s) for s in expected_losers]
@@ -1,4 +1,5 @@
 from unittest import TestCase
+import numpy as np
 from utils.stock import Stock
 
 class StockTest(TestCase):
@@ -20,4 +21,26 @@ class StockTest(TestCase):
 
     def test_sorted_edge(self):
         assert sorted(self.stocks_equal) == [self.stock4, self.stock5, self.stock6]
-        assert sorted(self.stocks_equal, reverse=True) == [self.stock6, self.stock5, self.stock4]
\ No newline at end of file
+        assert sorted(self.stocks_equal, reverse=True) == [self.stock6, self.stock5, self.stock4]
+
+    def test_sort_key(self):
+        assert sorted(self.stocks, key=Stock.sort_key) == [self.stock3, self.stock2, self.stock1]
+        # Ties keep their order either way, like sorting on the comparison methods
+        ordered = sorted(self.stocks_equal + self.stocks, key=Stock.sort_key)
+        assert [str(s) for s in ordered] == ['low', 'med', 'equal1', 'equal2', 'equal3', 'high']
+        ordered = sorted(self.stocks_equal, key=Stock.sort_key, reverse=True)
+        assert [str(s) for s in ordered] == [str(s) for s in sorted(self.stocks_equal, reverse=True)]
+
+    def test_slots(self):
+        assert not hasattr(self.stock1, '__dict__')
+        with self.assertRaises(AttributeError):
+            self.stock1.extra = 1
+
+    def test_from_arrays(self):
+        stocks = Stock.from_arrays(['a', 'b'], np.array([0.5, -0.1], dtype=np.float32), np.array([2.0, 3.0]))
+        assert [str(s) for s in stocks] == ['a', 'b']
+        assert stocks[0].get_J_returns() == float(np.float32(0.5)) and stocks[1].get_price() == 3.0
+        assert stocks[0].get_amount() == 0
+        assert type(stocks[0].get_J_returns()) is float
+        with self.assertRaises(ValueError):
+            Stock.from_arrays(['a', 'b'], np.zeros(2), np.array([1.0, np.nan]))
@@ -68,7 +68,7 @@ class StrategyTest(TestCase):
 
         for i, row in self.df.iterrows():
             t = row['Date']
-            ranked_stocks = s.rank_stocks(self.df, t, row, self.code_to_currency)
+            ranked_stocks = s.rank_stocks(self.df, t, row)
             ranked_stocks = [str(s) for s in ranked_stocks]
             if i < J + 1:
                 # While i less than J plus one, because we discount the first row as the first row has no returns,
@@ -95,7 +95,7 @@ class StrategyTest(TestCase):
 
         for i, row in self.df.iterrows():
             t = row['Date']
-            ranked_stocks = s.rank_stocks(self.df, t, row, self.code_to_currency)
+            ranked_stocks = s.rank_stocks(self.df, t, row)
             ranked_stocks = [str(s) for s in ranked_stocks]
             if i < J + 1:
                 # While i less than J plus one, because we discount the first row as the first row has no returns,
@@ -117,7 +117,7 @@ class StrategyTest(TestCase):
 
         for i, row in self.df.iterrows():
             t = row['Date']
-            ranked_stocks = s.rank_stocks(self.df, t, row, self.code_to_currency)
+            ranked_stocks = s.rank_stocks(self.df, t, row)
             # Will never return stocks, as the last J months will always include a NaN value, or we get to the final
             # month which has NaN values in its adjusted returns column, so nothing is returned
             assert ranked_stocks == []
@@ -133,7 +133,7 @@ class StrategyTest(TestCase):
 
         for i, row in self.df.iterrows():
             t = row['Date']
-            ranked_stocks = s.rank_stocks(self.df, t, row, self.code_to_currency)
+            ranked_stocks = s.rank_stocks(self.df, t, row)
             assert ranked_stocks == []
 
     def test_rank_stocks_J_negative(self):
@@ -145,7 +145,7 @@ class StrategyTest(TestCase):
 
         for i, row in self.df.iterrows():
             t = row['Date']
-            ranked_stocks = s.rank_stocks(self.df, t, row, self.code_to_currency)
+            ranked_stocks = s.rank_stocks(self.df, t, row)
             assert ranked_stocks == []
 
 
@@ -203,7 +203,7 @@ class StrategyTest(TestCase):
 
         for i, row in self.df.iterrows():
             t = row['Date']
-            ranked_stocks = s.rank_stocks(self.df, t, row, self.code_to_currency)
+            ranked_stocks = s.rank_stocks(self.df, t, row)
             winners, losers = JKStrategy.get_winners_and_losers(ranked_stocks)
             winners = [str(w) for w in winners]
             losers = [str(l) for l in losers]
@@ -230,7 +230,7 @@ class StrategyTest(TestCase):
 
         for i, row in self.df.iterrows():
             t = row['Date']
-            ranked_stocks = s.rank_stocks(self.df, t, row, self.code_to_currency)
+            ranked_stocks = s.rank_stocks(self.df, t, row)
             winners, losers = JKStrategy.get_winners_and_losers(ranked_stocks)
             winners = [str(w) for w in winners]
             losers = [str(l) for l in losers]
@@ -254,7 +254,7 @@ class StrategyTest(TestCase):
 
         for i, row in self.df.iterrows():
             t = row['Date']
-            ranked_stocks = s.rank_stocks(self.df, t, row, self.code_to_currency)
+            ranked_stocks = s.rank_stocks(self.df, t, row)
             winners, losers = JKStrategy.get_winners_and_losers(ranked_stocks)
             assert not winners and not losers
 
@@ -264,7 +264,7 @@ class StrategyTest(TestCase):
 
         for i, row in self.df.iterrows():
             t = row['Date']
-            ranked_stocks = s.rank_stocks(self.df, t, row, self.code_to_currency)
+            ranked_stocks = s.rank_stocks(self.df, t, row)
             winners, losers = JKStrategy.get_winners_and_losers(ranked_stocks)
             assert not winners and not losers
 
@@ -0,0 +1,121 @@
+from unittest import TestCase
+import io
+import os
+import json
+import random
+import contextlib
+import tempfile
+import numpy as np
+import pandas as pd
+from src.strategy.signals import SignalTable
+from src.strategy.strategy_controller import StrategyController
+from src.strategy.main import Main, parse_args
+from utils.grid import Grid
+from utils.exceptions import GridMismatchError
+from tests.strategy.helpers import make_data
+
+
+class StrategyControllerTest(TestCase):
+
+    def setUp(self):
+        self.df = pd.read_csv("data/dummy_data.csv")
+        self.df['Date'] = pd.to_datetime(self.df['Date'], format="%d/%m/%Y")
+        # Drops the last month, which has no prices to settle with
+        self.df = self.df.iloc[:5]
+
+    def test_get_result(self):
+        controller = StrategyController(J=1, K=1, ratio=0.5, cash=1000)
+        controller.run(self.df)
+        result = controller.get_result()
+
+        assert (result.get_J(), result.get_K(), result.get_ratio()) == (1, 1, 0.5)
+        assert result.get_starting_cash() == 1000
+        assert result.get_bankrupt() == controller.get_bankrupt()
+        assert result.get_cash_tally().dtype == np.float64
+        assert len(result.get_cash_tally()) == len(self.df)
+        assert len(result.get_position_tally()) == len(self.df)
+        np.testing.assert_array_equal(result.get_cash_tally(), controller.get_cash_tally())
+
+    def test_checkpoint_resume(self):
+        full = StrategyController(J=1, K=1, ratio=0.5, cash=1000)
+        full.run(self.df)
+
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "run.npz")
+            partial = StrategyController(J=1, K=1, ratio=0.5, cash=1000)
+            partial.run(self.df, checkpoint_filepath=filepath, stop_month=3)
+            assert not partial.is_finished()
+
+            restored = StrategyController.load_checkpoint(filepath)
+            assert len(restored.get_cash_tally()) == 3
+            restored.run(self.df)
+
+        assert restored.is_finished()
+        assert restored.get_cash_tally() == full.get_cash_tally()
+        assert restored.get_position_tally() == full.get_position_tally()
+        assert restored.get_cash() == full.get_cash()
+
+    def test_checkpoint_interval_must_be_positive(self):
+        for checkpoint_every in (0, -1):
+            with self.assertRaises(ValueError):
+                StrategyController(J=1, K=1, ratio=0.5, cash=1000).run(self.df, checkpoint_every=checkpoint_every)
+            with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                parse_args(["--checkpoint-every", str(checkpoint_every)])
+        assert parse_args(["--checkpoint-every", "3"]).checkpoint_every == 3
+
+    def test_parallel_selections_match(self):
+        df = make_data(months=60)
+        signals = SignalTable(df, J=3)
+        serial = signals.calculate_selections()
+        for workers in (2, 4, 7):
+            parallel = signals.calculate_selections(workers)
+            assert len(signals.month_chunks(workers)) >= workers
+            for expected, actual in zip(serial, parallel):
+                np.testing.assert_array_equal(expected, actual)
+
+        for engine in StrategyController.ENGINES:
+            single = StrategyController(J=3, K=2, ratio=0.5, cash=1000, engine=engine)
+            single.run(df)
+            threaded = StrategyController(J=3, K=2, ratio=0.5, cash=1000, engine=engine, workers=4)
+            threaded.run(df)
+            np.testing.assert_array_equal(single.get_result().get_cash_tally(),
+                                          threaded.get_result().get_cash_tally())
+
+    def test_checkpoint_keeps_workers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "run.npz")
+            controller = StrategyController(J=1, K=1, ratio=0.5, cash=1000, workers=3)
+            controller.run(self.df, checkpoint_filepath=filepath, stop_month=2)
+            assert StrategyController.load_checkpoint(filepath).get_workers() == 3
+
+    def test_grid_resume_requires_same_settings(self):
+        grid = Grid({"J": [2], "K": [1], "ratio": [0.1]})
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "stock_data.csv")
+            make_data(months=20, tickers=10).to_csv(filepath, index=False)
+            missing = os.path.join(directory, "missing.json")
+            checkpoint_dir = os.path.join(directory, "checkpoints")
+            m = Main(filepath, missing, missing)
+            kwargs = dict(iterations=2, cash=1000, grid=grid, max_workers=1, plot=False, engine='array',
+                          executor='serial', checkpoint_dir=checkpoint_dir)
+            random.seed(0)
+            first = m.run_grid_parameters(**kwargs)
+            # Resumed with the same settings, every run is already finished
+            assert [r.get_cash() for r in m.run_grid_parameters(**kwargs)] == [r.get_cash() for r in first]
+
+            groups = {f"S{i}": ('Tech', 'Energy')[i % 2] for i in range(10)}
+            for main, changes in ((Main(filepath, missing, missing, dtype='float32'), {}),
+                                  (Main(filepath, missing, missing, tickers=["S1", "S2"]), {}),
+                                  (m, {"rebalance": 'weekly'}), (m, {"groups": groups})):
+                with self.assertRaises(GridMismatchError):
+                    main.run_grid_parameters(**{**kwargs, **changes})
+
+            # Manifests from before settings were recorded are resumed with a warning
+            manifest_filepath = os.path.join(checkpoint_dir, "grid.json")
+            with open(manifest_filepath) as f:
+                runs = json.load(f)["runs"]
+            with open(manifest_filepath, "w") as f:
+                json.dump(runs, f)
+            with self.assertLogs(level='WARNING') as logs:
+                m.run_grid_parameters(**kwargs)
+            assert any("no recorded settings" in message for message in logs.output)
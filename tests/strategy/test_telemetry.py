@@ -0,0 +1,100 @@
+from unittest import TestCase
+import io
+import os
+import contextlib
+import json
+import random
+import tempfile
+from src.strategy.main import Main, parse_args
+from utils.grid import Grid
+from utils.telemetry import Telemetry, timed_task, task_table, utilization_report, chrome_trace, save_chrome_trace
+from tests.strategy.helpers import make_data
+
+
+def record(name, pid, submit, start, end, receive):
+    return {'name': name, 'pid': pid, 'thread': 1, 'submit': 100 + submit, 'start': 100 + start, 'end': 100 + end,
+            'receive': 100 + receive, 'args_bytes': 10, 'result_bytes': 20}
+
+
+class TelemetryTest(TestCase):
+
+    def setUp(self):
+        # Two workers: one runs two short tasks, the other a straggler that leaves the first idle
+        self.records = [record('a', 1, 0, 0, 1, 1), record('b', 2, 0, 0, 8, 8), record('c', 1, 0, 1, 2, 2),
+                        record('d', 1, 0, 2, 3, 3), record('e', 1, 0, 3, 4, 4)]
+
+    def test_task_table(self):
+        table = task_table(self.records)
+        assert table['submit'].min() == 0
+        assert list(table['name']) == ['a', 'b', 'c', 'd', 'e']
+        assert list(table['queue_wait']) == [0, 0, 1, 2, 3]
+        assert list(table['compute']) == [1, 8, 1, 1, 1]
+
+    def test_utilization_report(self):
+        report = utilization_report(self.records, workers=2)
+        assert report['tasks'] == 5
+        assert report['wall_time'] == 8
+        assert report['busy_time'] == 12
+        assert report['utilization'] == 12 / 16
+        assert report['idle_time'] == 4
+        assert report['stragglers'] == ['b']
+        assert report['args_bytes'] == 50 and report['result_bytes'] == 100
+        assert list(report['workers']['tasks']) == [4, 1]
+
+    def test_chrome_trace(self):
+        events = chrome_trace(self.records)['traceEvents']
+        compute = [event for event in events if event.get('cat') == 'compute']
+        assert [event['dur'] for event in compute] == [1e6, 8e6, 1e6, 1e6, 1e6]
+        assert compute[1]['ts'] == 0 and compute[1]['pid'] == 2
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "trace.json")
+            save_chrome_trace(self.records, filepath)
+            with open(filepath) as f:
+                assert len(json.load(f)['traceEvents']) == len(events)
+
+    def test_timed_task(self):
+        result, worker = timed_task(sum, True, [1, 2, 3])
+        assert result == 6
+        assert worker['pid'] == os.getpid() and worker['end'] >= worker['start'] and worker['result_bytes'] > 0
+
+    def test_grid_search_telemetry(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "stock_data.csv")
+            make_data(months=30, tickers=20).to_csv(filepath, index=False)
+            missing = os.path.join(directory, "missing.json")
+            telemetry = Telemetry()
+            random.seed(0)
+            Main(filepath, missing, missing).run_grid_parameters(
+                iterations=5, cash=1000, grid=Grid({"J": [2, 3], "K": [1, 2], "ratio": [0.1]}), max_workers=2,
+                plot=False, engine='array', executor='thread', telemetry=telemetry)
+            table = task_table(telemetry.get_records())
+            assert len(table) == 5
+            assert telemetry.get_workers() == 2
+            # Threads are sent nothing pickled
+            assert (table['args_bytes'] == 0).all()
+            assert (table['compute'] >= 0).all() and (table['queue_wait'] >= 0).all()
+
+    def test_process_pool_telemetry(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "stock_data.csv")
+            make_data(months=30, tickers=20).to_csv(filepath, index=False)
+            missing = os.path.join(directory, "missing.json")
+            telemetry = Telemetry()
+            random.seed(0)
+            Main(filepath, missing, missing).run_grid_parameters(
+                iterations=6, cash=1000, grid=Grid({"J": [2, 3], "K": [1, 2], "ratio": [0.1]}), max_workers=2,
+                plot=False, engine='array', executor='process', chunk_size=2, telemetry=telemetry)
+            table = task_table(telemetry.get_records())
+            # One record per batch of two runs, run in the pool's worker processes
+            assert len(table) == 3
+            assert os.getpid() not in set(table['pid'])
+            # Arguments and results are pickled between processes, so their sizes are measured
+            assert (table['args_bytes'] > 0).all() and (table['result_bytes'] > 0).all()
+            assert (table['compute'] >= 0).all() and (table['return_wait'] >= 0).all()
+            report = utilization_report(telemetry.get_records(), telemetry.get_workers())
+            assert report['tasks'] == 3 and telemetry.get_workers() == 2
+
+    def test_queue_rejects_telemetry(self):
+        for flags in (["--telemetry"], ["--trace", "trace.json"]):
+            with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                parse_args(["--queue", "grid.db", *flags])
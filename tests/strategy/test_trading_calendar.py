@@ -0,0 +1,62 @@
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from src.strategy.kernels import monthly_settle_from, rebalance_settle_from
+from src.strategy.strategy_controller import StrategyController
+from utils.month_calendar import MonthCalendar
+from utils.trading_calendar import TradingCalendar, make_calendar, rebalance_mask
+from tests.strategy.helpers import make_data, make_daily_data
+
+
+class TradingCalendarTest(TestCase):
+
+    def setUp(self):
+        self.df = make_daily_data()
+
+    def test_make_calendar(self):
+        assert isinstance(make_calendar(self.df['Date']), TradingCalendar)
+        assert isinstance(make_calendar(make_data()['Date']), MonthCalendar)
+
+    def test_index_of(self):
+        calendar = TradingCalendar(self.df['Date'])
+        assert calendar.index_of(pd.Timestamp("2020-01-01")) == 0
+        assert calendar.index_of(pd.Timestamp("2020-01-06")) == 3
+        # Weekends are not trading days
+        with self.assertRaises(KeyError):
+            calendar.index_of(pd.Timestamp("2020-01-04"))
+        with self.assertRaises(ValueError):
+            TradingCalendar(self.df['Date'].iloc[::-1])
+
+    def test_rebalance_mask(self):
+        dates = self.df['Date']
+        assert rebalance_mask(dates, 'daily').all()
+        weekly = rebalance_mask(dates, 'weekly')
+        # The first row, then every Monday
+        assert weekly[0] and (dates[weekly].iloc[1:].dt.dayofweek == 0).all()
+        monthly = rebalance_mask(dates, 'monthly')
+        assert monthly.sum() == dates.dt.to_period('M').nunique()
+        # Every row of monthly data is a rebalance row
+        assert rebalance_mask(make_data()['Date'], 'monthly').all()
+        with self.assertRaises(ValueError):
+            rebalance_mask(dates, 'yearly')
+
+    def test_rebalance_settle_from(self):
+        for J, K in ((1, 1), (3, 6), (12, 2)):
+            np.testing.assert_array_equal(rebalance_settle_from(np.ones(40, dtype=bool), J, K),
+                                          monthly_settle_from(40, J, K))
+        rebalance = np.zeros(20, dtype=bool)
+        rebalance[::5] = True
+        settle_from = rebalance_settle_from(rebalance, 2, 3)
+        # Only positions from rebalance rows are settled, K rows later
+        assert np.flatnonzero(settle_from >= 0).tolist() == [8, 13, 18]
+        assert settle_from[[8, 13, 18]].tolist() == [5, 10, 15]
+
+    def test_engines_match_on_daily_data(self):
+        for rebalance in ('daily', 'weekly', 'monthly'):
+            tallies = []
+            for engine in StrategyController.ENGINES:
+                controller = StrategyController(21, 10, 0.5, 1000, engine=engine, rebalance=rebalance)
+                controller.run(self.df)
+                tallies.append(controller.get_result().get_cash_tally())
+            assert len(tallies[0]) == len(self.df)
+            np.testing.assert_array_equal(*tallies)
@@ -0,0 +1,90 @@
+from unittest import TestCase
+import os
+import tempfile
+import numpy as np
+from src.strategy.main import Main, parse_args
+from utils.panel import Panel
+from utils.exceptions import PanelMismatchError
+from utils.screener import load_screener
+from utils.universe import (FILTER_COLUMNS, load_excluded_codes, universe_mask, select_tickers, filter_columns,
+                            universe_from_args, universe_args)
+from tests.strategy.helpers import make_data
+
+
+SCREENER = """Symbol,Name,Last Sale,Net Change,% Change,Market Cap,Country,IPO Year,Volume,Sector,Industry
+S0,Zero Inc,$1.00,0,0%,5000000000.00,United States,1999,900000,Technology,Software
+S1,One Corp,$1.00,0,0%,0.00,United States,2021,4195,Finance,Blank Checks
+S2,Two Ltd,$1.00,0,0%,250000000.00,China,,120000,Health Care,Biotechnology
+S3,Three plc,$1.00,0,0%,80000000.00,United Kingdom,2015,800,Energy,Oil
+S4,Four Inc,$1.00,0,0%,,United States,2010,50000,Technology,Software
+"""
+
+
+class UniverseTest(TestCase):
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory = temporary.name
+        self.screener_filepath = os.path.join(self.directory, "nasdaq_screener_1.csv")
+        with open(self.screener_filepath, "w") as f:
+            f.write(SCREENER)
+        self.screener = load_screener(self.screener_filepath, FILTER_COLUMNS)
+
+    def test_universe_mask(self):
+        assert universe_mask(self.screener).all()
+        assert list(universe_mask(self.screener, min_volume=1000)) == [True, True, True, False, True]
+        # Missing market caps and IPO years fail filters on them
+        assert list(universe_mask(self.screener, min_market_cap=1e8)) == [True, False, True, False, False]
+        assert list(universe_mask(self.screener, min_ipo_year=2000, max_ipo_year=2016)) == \
+               [False, False, False, True, True]
+        assert list(universe_mask(self.screener, excluded_industries=['Blank Checks'])) == \
+               [True, False, True, True, True]
+
+    def test_select_tickers(self):
+        mask = universe_mask(self.screener, min_volume=1000)
+        # S9 is not in the screener, so is kept unless excluded by code
+        assert select_tickers(['S0', 'S3', 'S4', 'S9'], mask) == ['S0', 'S4', 'S9']
+        assert select_tickers(['S0', 'S3', 'S4', 'S9'], mask, {'S0', 'S9'}) == ['S4']
+        assert filter_columns(['Date', 'S0', 'S1', 'S0Returns', 'S1Returns'], ['S1']) == ['Date', 'S1', 'S1Returns']
+
+    def test_load_excluded_codes(self):
+        filepath = os.path.join(self.directory, "excluded_codes.txt")
+        with open(filepath, "w") as f:
+            f.write("IPA,ABVC\nITRN, CHRD\n")
+        assert load_excluded_codes(filepath) == {'IPA', 'ABVC', 'ITRN', 'CHRD'}
+        assert load_excluded_codes(os.path.join(self.directory, "missing.txt")) == set()
+
+    def test_filtered_columns_are_never_loaded(self):
+        df = make_data(months=30, tickers=8)
+        data_filepath = os.path.join(self.directory, "stock_data.csv")
+        df.to_csv(data_filepath, index=False)
+        excluded_filepath = os.path.join(self.directory, "excluded_codes.txt")
+        with open(excluded_filepath, "w") as f:
+            f.write("S7")
+
+        args = parse_args(["--min-volume", "1000", "--exclude-industries", "Blank Checks",
+                           "--excluded-codes", excluded_filepath, "--universe-screener", self.screener_filepath])
+        tickers = universe_from_args(args, data_filepath)
+        assert tickers == ['S0', 'S2', 'S4', 'S5', 'S6']
+        assert parse_args(universe_args(args)).min_volume == 1000
+
+        missing = os.path.join(self.directory, "missing.json")
+        data = Main(data_filepath, missing, missing, tickers=tickers).get_data()
+        assert list(data.columns) == ['Date'] + tickers + [f"{t}Returns" for t in tickers]
+
+        panel = Main(data_filepath, missing, missing, panel_dir=os.path.join(self.directory, "panel"),
+                     tickers=tickers).get_data()
+        assert isinstance(panel, Panel)
+        assert panel.get_tickers() == tickers
+        np.testing.assert_array_equal(panel.get_prices(), data[tickers].to_numpy())
+        # The panel is only reused with the universe it was built with
+        Main(data_filepath, missing, missing, panel_dir=os.path.join(self.directory, "panel"), tickers=tickers)
+        for other in (None, tickers[:-1]):
+            with self.assertRaises(PanelMismatchError):
+                Main(data_filepath, missing, missing, panel_dir=os.path.join(self.directory, "panel"), tickers=other)
+
+        # Without filters or exclusions, every ticker is loaded
+        empty = os.path.join(self.directory, "empty.txt")
+        open(empty, "w").close()
+        assert universe_from_args(parse_args(["--excluded-codes", empty]), data_filepath) is None
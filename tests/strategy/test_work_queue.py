@@ -0,0 +1,128 @@
+from unittest import TestCase
+import os
+import time
+import tempfile
+import multiprocessing
+import numpy as np
+import pandas as pd
+from utils.work_queue import WorkQueue
+from utils.results_store import ResultsStore
+from utils.run_result import RunResult
+from src.strategy.worker import run_worker
+from src.strategy.main import Main
+from tests.strategy.helpers import make_data
+
+
+class WorkQueueTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.directory.name, "queue.db")
+        self.result = RunResult(1, 1, 0.1, 1000, 1100, False, np.array([1000.0, 1100.0]), np.array([0.0, 0.0]))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_lease_and_complete(self):
+        with WorkQueue(self.filepath) as queue:
+            task_ids = queue.enqueue([(1, 2, 0.1, 1000), (3, 4, 0.2, 1000)])
+            first = queue.lease("a")
+            second = queue.lease("b")
+            assert first == (task_ids[0], 1, 2, 0.1, 1000) and second[0] == task_ids[1]
+            # Nothing left to lease while both leases are live
+            assert queue.lease("c") is None
+
+            assert queue.complete(first[0], "a", self.result)
+            assert queue.get_counts() == {'pending': 0, 'leased': 1, 'done': 1, 'failed': 0}
+            assert not queue.is_finished()
+
+        with ResultsStore(self.filepath) as store:
+            assert store.top_runs()['final_cash'].tolist() == [1100]
+
+    def test_expired_lease_is_taken_over(self):
+        with WorkQueue(self.filepath, lease_timeout=0.05) as queue:
+            task_id = queue.enqueue([(1, 2, 0.1, 1000)])[0]
+            assert queue.lease("crashed")[0] == task_id
+            time.sleep(0.1)
+            assert queue.lease("b")[0] == task_id
+            # The crashed worker's late result is ignored once the task is done
+            assert queue.complete(task_id, "b", self.result)
+            assert not queue.complete(task_id, "crashed", self.result)
+            assert len(queue.get_run_ids()) == 1
+
+    def test_stale_worker_cannot_complete_released_task(self):
+        with WorkQueue(self.filepath, lease_timeout=0.05) as queue:
+            task_id = queue.enqueue([(1, 2, 0.1, 1000)])[0]
+            queue.lease("stale")
+            time.sleep(0.1)
+            assert queue.lease("b")[0] == task_id
+            # b still holds the lease, so the stale worker's result does not take its place
+            assert not queue.complete(task_id, "stale", self.result)
+            assert queue.get_counts()['leased'] == 1
+            assert queue.complete(task_id, "b", self.result)
+
+    def test_coordinator_expires_leases(self):
+        with WorkQueue(self.filepath, lease_timeout=0.05, max_attempts=1) as queue:
+            task_id = queue.enqueue([(1, 2, 0.1, 1000)])[0]
+            queue.lease("crashed")
+            assert queue.expire_leases() == 0
+            time.sleep(0.1)
+            assert queue.expire_leases() == 1
+            assert queue.get_counts()['failed'] == 1 and queue.is_finished()
+            assert not queue.complete(task_id, "crashed", self.result)
+
+    def test_fail_retries_then_gives_up(self):
+        with WorkQueue(self.filepath, max_attempts=2) as queue:
+            task_id = queue.enqueue([(1, 2, 0.1, 1000)])[0]
+            queue.lease("a")
+            queue.fail(task_id, "a", "error")
+            assert queue.get_counts()['pending'] == 1
+            queue.lease("a")
+            queue.fail(task_id, "a", "error")
+            assert queue.get_counts()['failed'] == 1
+            assert queue.is_finished()
+
+    def test_several_local_workers(self):
+        df = pd.read_csv("data/dummy_data.csv")
+        df['Date'] = pd.to_datetime(df['Date'], format="%d/%m/%Y")
+        df = df.iloc[:5]
+        tasks = [(J, K, 0.1, 1000) for J in (1, 2) for K in (1, 2, 3)]
+        with WorkQueue(self.filepath) as queue:
+            queue.enqueue(tasks)
+
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=run_worker, args=(self.filepath, df, f"worker{i}"),
+                                   kwargs={"poll_interval": 0.01}) for i in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=60)
+            assert worker.exitcode == 0
+
+        with WorkQueue(self.filepath) as queue:
+            assert queue.get_counts()['done'] == len(tasks)
+        with ResultsStore(self.filepath) as store:
+            results = store.load_results()
+        assert sorted((r.get_J(), r.get_K()) for r in results) == sorted((J, K) for J, K, _, _ in tasks)
+
+    def test_coordinator_stops_when_workers_die(self):
+        filepath = os.path.join(self.directory.name, "stock_data.csv")
+        make_data(months=10, tickers=5).to_csv(filepath, index=False)
+        missing = os.path.join(self.directory.name, "missing.json")
+        m = Main(filepath, missing, missing)
+        start = time.time()
+        # Workers exit straight away as they have no data to load
+        results = m.run_grid_queue(self.filepath, iterations=2, cash=1000, local_workers=2, poll_interval=0.1,
+                                   worker_args=["--data", os.path.join(self.directory.name, "missing.csv")],
+                                   plot=False)
+        assert results == [] and time.time() - start < 60
+        with WorkQueue(self.filepath) as queue:
+            assert queue.get_counts()['pending'] == 2
+
+    def test_coordinator_timeout(self):
+        filepath = os.path.join(self.directory.name, "stock_data.csv")
+        make_data(months=10, tickers=5).to_csv(filepath, index=False)
+        missing = os.path.join(self.directory.name, "missing.json")
+        results = Main(filepath, missing, missing).run_grid_queue(self.filepath, iterations=2, cash=1000,
+                                                                   poll_interval=0.05, timeout=0.2, plot=False)
+        assert results == []